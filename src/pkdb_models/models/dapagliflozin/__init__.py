@@ -8,6 +8,7 @@ MODEL_PATH = MODEL_BASE_PATH / "dapagliflozin_body_flat.xml"
 RESULTS_PATH = DAPAGLIFLOZIN_PATH / "results"
 RESULTS_PATH_SIMULATION = RESULTS_PATH / "simulation"
 RESULTS_PATH_FIT = RESULTS_PATH / "fit"
+RESULTS_PATH_CACHE = RESULTS_PATH / "cache"
 
 # DATA_PATH_BASE = DAPAGLIFLOZIN_PATH.parents[3] / "pkdb_data" / "studies"
 
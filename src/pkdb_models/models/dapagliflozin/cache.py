@@ -0,0 +1,381 @@
+"""Content-addressed on-disk cache of simulation results.
+
+Results of timecourse simulations are stored under a key computed from
+
+- the hash of the flattened model file,
+- the time grid (`start`, `end`, `steps`) and changes of all timecourses,
+- the integrator settings (tolerances, ...),
+- the versions of sbmlsim and roadrunner.
+
+The `XResult` of a task is created from the cached timecourse frames, so
+that scans share cached entries with single timecourses. Least recently
+used entries are evicted if the cache exceeds its size limit.
+"""
+import hashlib
+import os
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulator.simulation_serial import SimulatorSerial
+from sbmlutils import log
+from sbmlutils.console import console
+
+logger = log.get_logger(__name__)
+
+
+def _canonical(value: Any) -> Any:
+    """Canonical, hashable representation of a change value."""
+    if hasattr(value, "magnitude") and hasattr(value, "units"):
+        return _canonical(value.magnitude), str(value.units)
+    if isinstance(value, np.ndarray):
+        return tuple(_canonical(v) for v in value.tolist())
+    if isinstance(value, (list, tuple)):
+        return tuple(_canonical(v) for v in value)
+    if isinstance(value, (float, np.floating)):
+        # repr of floats is exact
+        return repr(float(value))
+    if isinstance(value, (int, np.integer)):
+        return repr(float(value))
+    return repr(value)
+
+
+def canonical_timecourse(tc: Timecourse) -> Tuple:
+    """Canonical representation of a timecourse: time grid and changes."""
+    return (
+        _canonical(tc.start),
+        _canonical(tc.end),
+        int(tc.steps),
+        tuple(sorted((k, _canonical(v)) for k, v in tc.changes.items())),
+        tuple(
+            sorted(
+                (k, _canonical(v))
+                for k, v in (getattr(tc, "model_changes", None) or {}).items()
+            )
+        ),
+        bool(getattr(tc, "discard", False)),
+    )
+
+
+def canonical_simulation(simulation: TimecourseSim) -> Tuple:
+    """Canonical representation of a (normalized) timecourse simulation."""
+    return (
+        _canonical(getattr(simulation, "time_offset", 0.0)),
+        bool(getattr(simulation, "reset", True)),
+        tuple(canonical_timecourse(tc) for tc in simulation.timecourses),
+    )
+
+
+def simulation_key(simulation: TimecourseSim) -> str:
+    """Hash of the canonical representation of a timecourse simulation."""
+    return hashlib.sha256(
+        repr(canonical_simulation(simulation)).encode("utf-8")
+    ).hexdigest()
+
+
+def file_hash(path: Union[str, Path]) -> str:
+    """SHA256 hash of the content of a file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _version(package: str) -> str:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def select_columns(df: pd.DataFrame, selections: Optional[List[str]]) -> Optional[pd.DataFrame]:
+    """Columns of the frame in order of the selections.
+
+    Returns None if not all selections are available.
+    """
+    if selections is None or list(df.columns) == selections:
+        return df
+    if not set(selections).issubset(df.columns):
+        return None
+    return df[selections]
+
+
+class SimulationCache:
+    """On-disk cache of timecourse results with least recently used eviction."""
+
+    def __init__(self, cache_dir: Path, max_size: float = 10 * 1024**3):
+        """
+        :param cache_dir: directory for the cached results
+        :param max_size: maximal size of the cache in bytes
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self._size: int = sum(p.stat().st_size for p in self._files())
+
+    def _files(self) -> Iterable[Path]:
+        return self.cache_dir.glob("*/*.pkl")
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.pkl"
+
+    @staticmethod
+    def key(
+        model_hash: str,
+        simulation: TimecourseSim,
+        integrator_settings: Dict[str, Any],
+    ) -> str:
+        """Cache key of a normalized timecourse simulation."""
+        info = (
+            model_hash,
+            canonical_simulation(simulation),
+            tuple(sorted((k, _canonical(v)) for k, v in integrator_settings.items())),
+            _version("sbmlsim"),
+            _version("libroadrunner"),
+        )
+        return hashlib.sha256(repr(info).encode("utf-8")).hexdigest()
+
+    def contains(self, key: str) -> bool:
+        """Check if an entry for key exists."""
+        return self._path(key).exists()
+
+    def get(self, key: str, selections: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """Cached result for key if it contains the selections, otherwise None."""
+        path = self._path(key)
+        df: Optional[pd.DataFrame] = None
+        if path.exists():
+            try:
+                df = pd.read_pickle(path)
+                if selections is not None and not set(selections).issubset(df.columns):
+                    df = None
+            except Exception as err:
+                logger.warning(f"Cache entry '{path.name}' could not be read: {err}")
+        if df is None:
+            self.misses += 1
+            return None
+
+        # mark entry as recently used
+        os.utime(path)
+        self.hits += 1
+        return df
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        """Store result for key, evicts entries if the cache is full."""
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        if path.exists():
+            self._size -= path.stat().st_size
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        self._size += path.stat().st_size
+        if self._size > self.max_size:
+            self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits its size."""
+        entries = []
+        for p in self._files():
+            stat = p.stat()
+            entries.append((stat.st_mtime, stat.st_size, p))
+        entries.sort()
+
+        self._size = sum(e[1] for e in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            self._size -= size
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        for p in self._files():
+            p.unlink(missing_ok=True)
+        self._size = 0
+
+    def report(self) -> None:
+        """Print cache statistics."""
+        console.print(
+            f"Simulation cache: {self.hits} hits, {self.misses} misses, "
+            f"{self._size / 1024**2:.1f} MB in '{self.cache_dir}'"
+        )
+
+
+class SimulatorCached(SimulatorSerial):
+    """Serial simulator which reuses timecourse results.
+
+    Results are taken from the results shared between the tasks of a
+    `SimulationPlan` and from the on-disk cache. Without plan and cache the
+    simulator behaves like the `SimulatorSerial`. With `fast_forward` chains of
+    identical timecourses are fast-forwarded to the periodic steady state
+    (see `steady_state`). With `output_grid` the results are reduced to the
+    error-controlled output grid (see `output_grid`).
+    """
+
+    def __init__(
+        self,
+        model: Union[str, Path],
+        cache: Optional[SimulationCache] = None,
+        fast_forward: Optional["FastForward"] = None,
+        output_grid: Optional["OutputGrid"] = None,
+        **kwargs,
+    ):
+        self.cache = cache
+        self.fast_forward = fast_forward
+        self.output_grid = output_grid
+        self.n_points: int = 0
+        self.n_points_full: int = 0
+        self.plan: Optional["SimulationPlan"] = None
+        self.n_shared: int = 0
+        self.model_path: str = str(model)
+        self.settings: Dict[str, Any] = dict(kwargs)
+        self._model_hash: Optional[str] = None
+        self._selections: Optional[List[str]] = None
+        self._shared: Dict[str, pd.DataFrame] = {}
+        super(SimulatorCached, self).__init__(model=model, **kwargs)
+
+    @property
+    def model_hash(self) -> str:
+        """Hash of the model file."""
+        if self._model_hash is None:
+            self._model_hash = file_hash(self.model_path)
+        return self._model_hash
+
+    def set_model(self, model) -> None:
+        super(SimulatorCached, self).set_model(model)
+        source = getattr(getattr(model, "source", None), "path", model)
+        if isinstance(source, (str, Path)) and (
+            Path(source).resolve() != Path(self.model_path).resolve()
+        ):
+            self.model_path = str(source)
+            self._model_hash = None
+            self._shared.clear()
+
+    def set_integrator_settings(self, **kwargs) -> None:
+        super(SimulatorCached, self).set_integrator_settings(**kwargs)
+        settings = {**self.settings, **kwargs}
+        if settings != self.settings:
+            self.settings = settings
+            self._shared.clear()
+
+    def set_timecourse_selections(self, selections: Iterable[str]) -> None:
+        super(SimulatorCached, self).set_timecourse_selections(selections)
+        self._selections = list(selections) if selections is not None else None
+
+    def set_plan(self, plan: "SimulationPlan") -> None:
+        """Share results of simulations which are required by multiple tasks."""
+        self.plan = plan
+        self.n_shared = 0
+        self._shared.clear()
+
+    def cache_key(self, simulation: TimecourseSim) -> str:
+        """Cache key of a normalized timecourse simulation."""
+        settings = self.settings
+        if self.fast_forward is not None:
+            settings = {**settings, "fast_forward": self.fast_forward}
+        return SimulationCache.key(
+            model_hash=self.model_hash,
+            simulation=simulation,
+            integrator_settings=settings,
+        )
+
+    def run_selections(self, key: str) -> Optional[List[str]]:
+        """Selections for simulating the timecourse with given key.
+
+        Planned simulations record the union of the selections of all tasks
+        of the plan which require the simulation, i.e., only the selections
+        which are accessed by the tasks instead of the selections of the model.
+        """
+        if (
+            self._selections is None
+            or self.plan is None
+            or key not in self.plan.selections
+        ):
+            return self._selections
+        return sorted(self.plan.selections[key])
+
+    def _timecourses(self, simulations: List[TimecourseSim]) -> List[pd.DataFrame]:
+        """Run timecourse simulations.
+
+        Shared and cached results are not simulated and every unique
+        simulation is only solved once.
+        """
+        keys = [simulation_key(sim) for sim in simulations]
+        dfs: List[Optional[pd.DataFrame]] = [None] * len(simulations)
+        for k, key in enumerate(keys):
+            selections = self.run_selections(key)
+            df = self._shared.get(key)
+            if df is not None and select_columns(df, selections) is not None:
+                self.n_shared += 1
+            elif self.cache is not None:
+                df = self.cache.get(self.cache_key(simulations[k]), selections=selections)
+            else:
+                df = None
+            dfs[k] = df
+
+        # simulate every missing unique simulation once
+        missing: Dict[str, int] = {}
+        for k, key in enumerate(keys):
+            if dfs[k] is None and key not in missing:
+                missing[key] = k
+        if missing:
+            results = self._run_timecourses(
+                [simulations[k] for k in missing.values()], list(missing.keys())
+            )
+            computed = dict(zip(missing.keys(), results))
+            for key, k in missing.items():
+                if self.cache is not None:
+                    self.cache.put(self.cache_key(simulations[k]), computed[key])
+            for k, key in enumerate(keys):
+                if dfs[k] is None:
+                    dfs[k] = computed[key]
+
+        if self.plan is not None:
+            for k, key in enumerate(keys):
+                if self.plan.consume(key) > 0:
+                    self._shared[key] = dfs[k]
+                else:
+                    self._shared.pop(key, None)
+
+        results = []
+        for df, key in zip(dfs, keys):
+            df_selected = select_columns(df, self.run_selections(key))
+            results.append(df_selected if df_selected is not None else df)
+        if self.output_grid is not None:
+            from pkdb_models.models.dapagliflozin.output_grid import reduce_timecourses
+
+            self.n_points_full += sum(len(df) for df in results)
+            results = reduce_timecourses(results, grid=self.output_grid)
+            self.n_points += sum(len(df) for df in results)
+        return results
+
+    def _timecourse(self, simulation: TimecourseSim) -> pd.DataFrame:
+        """Timecourse simulation, optionally with fast-forward."""
+        if self.fast_forward is None:
+            return super(SimulatorCached, self)._timecourse(simulation)
+        from pkdb_models.models.dapagliflozin.steady_state import (
+            timecourse_fast_forward,
+        )
+
+        return timecourse_fast_forward(self, simulation, settings=self.fast_forward)
+
+    def _run_timecourses(
+        self, simulations: List[TimecourseSim], keys: List[str]
+    ) -> List[pd.DataFrame]:
+        """Simulate the timecourses."""
+        dfs = []
+        for sim, key in zip(simulations, keys):
+            selections = self.run_selections(key)
+            if selections != self._selections:
+                super(SimulatorCached, self).set_timecourse_selections(selections)
+                dfs.append(self._timecourse(sim))
+                super(SimulatorCached, self).set_timecourse_selections(self._selections)
+            else:
+                dfs.append(self._timecourse(sim))
+        return dfs
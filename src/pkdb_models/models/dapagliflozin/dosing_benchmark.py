@@ -0,0 +1,120 @@
+"""Benchmark of event-based dosing against chained timecourses.
+
+Multiple dosing is simulated either as a chain of timecourses with one dose
+per timecourse (default) or as a single timecourse with the dosing events of
+the model (`event_dosing`). The benchmark simulates the multiple dosing
+simulations of the studies in both variants and reports the runtime and the
+maximal relative difference of the plasma concentrations and the urinary
+glucose excretion.
+"""
+import time
+from copy import deepcopy
+from typing import Dict, List, Type
+
+import numpy as np
+import pandas as pd
+from sbmlsim.simulation import TimecourseSim
+from sbmlsim.simulator.simulation_serial import SimulatorSerial
+from sbmlutils.console import console
+
+from pkdb_models.models.dapagliflozin import (
+    DAPAGLIFLOZIN_PATH,
+    DATA_PATHS,
+    MODEL_PATH,
+    RESULTS_PATH,
+)
+from pkdb_models.models.dapagliflozin.experiments.base_experiment import (
+    DapagliflozinSimulationExperiment,
+)
+from pkdb_models.models.dapagliflozin.experiments.studies.kasichayanula2011a import (
+    Kasichayanula2011a,
+)
+from pkdb_models.models.dapagliflozin.experiments.studies.komoroski2009 import (
+    Komoroski2009,
+)
+
+RESULTS_PATH_BENCHMARK = RESULTS_PATH / "benchmark"
+
+SELECTIONS = ["time", "[Cve_dap]", "[Cve_d3g]", "KI__UGE"]
+
+
+def multiple_dosing_simulations(
+    experiment_class: Type[DapagliflozinSimulationExperiment], event_dosing: bool
+) -> Dict[str, TimecourseSim]:
+    """Multiple dosing simulations of the experiment."""
+    cls = type(
+        experiment_class.__name__, (experiment_class,), {"event_dosing": event_dosing}
+    )
+    experiment = cls(base_path=DAPAGLIFLOZIN_PATH, data_path=DATA_PATHS)
+    experiment_segmented = experiment_class(
+        base_path=DAPAGLIFLOZIN_PATH, data_path=DATA_PATHS
+    )
+    return {
+        sim_id: sim
+        for sim_id, sim in experiment.simulations().items()
+        if len(experiment_segmented.simulations()[sim_id].timecourses) > 1
+    }
+
+
+def run_timecourse(simulator: SimulatorSerial, simulation: TimecourseSim):
+    """Simulate the timecourse, returns results and runtime [s]."""
+    sim = deepcopy(simulation)
+    sim.normalize(uinfo=simulator.uinfo)
+    ts = time.time()
+    df = simulator._timecourse(sim)
+    return df, time.time() - ts
+
+
+def benchmark_dosing(
+    experiment_classes: List[Type[DapagliflozinSimulationExperiment]],
+) -> pd.DataFrame:
+    """Benchmark event-based dosing against chained timecourses."""
+    simulator = SimulatorSerial(
+        model=MODEL_PATH, absolute_tolerance=1e-10, relative_tolerance=1e-10
+    )
+    simulator.set_timecourse_selections(SELECTIONS)
+    rows = []
+    for experiment_class in experiment_classes:
+        sims_segmented = multiple_dosing_simulations(experiment_class, False)
+        sims_events = multiple_dosing_simulations(experiment_class, True)
+        for sim_id, sim_segmented in sims_segmented.items():
+            df_segmented, t_segmented = run_timecourse(simulator, sim_segmented)
+            df_events, t_events = run_timecourse(simulator, sims_events[sim_id])
+
+            # event results at the time points of the segmented results,
+            # the last value of duplicated time points (dose, urine collection)
+            df_events = df_events.drop_duplicates(subset="time", keep="last")
+            row = {
+                "experiment": experiment_class.__name__,
+                "simulation": sim_id,
+                "timecourses": len(sim_segmented.timecourses),
+                "time_segmented": t_segmented,
+                "time_events": t_events,
+                "speedup": t_segmented / t_events,
+            }
+            for sid in SELECTIONS[1:]:
+                y_segmented = df_segmented[sid].values
+                y_events = np.interp(
+                    df_segmented["time"].values,
+                    df_events["time"].values,
+                    df_events[sid].values,
+                )
+                scale = np.max(np.abs(y_segmented))
+                row[f"error_{sid}"] = (
+                    np.max(np.abs(y_events - y_segmented)) / scale if scale > 0 else 0.0
+                )
+            rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def main() -> None:
+    """Run dosing benchmark."""
+    df = benchmark_dosing([Komoroski2009, Kasichayanula2011a])
+    RESULTS_PATH_BENCHMARK.mkdir(parents=True, exist_ok=True)
+    df.to_csv(RESULTS_PATH_BENCHMARK / "dosing_events.tsv", sep="\t", index=False)
+    console.print(df)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,53 @@
 Reusable functionality for multiple simulation experiments.
 """
 from collections import namedtuple
-from typing import Dict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import pandas as pd
 
 from pkdb_models.models.dapagliflozin.pk import calculate_dapagliflozin_pk
 from pkdb_models.models.dapagliflozin import MODEL_PATH
+from sbmlsim.data import Data, DataSet
 from sbmlsim.experiment import SimulationExperiment
+from sbmlsim.experiment.experiment import ExperimentDict
 from sbmlsim.model import AbstractModel
 from sbmlsim.task import Task
+from sbmlsim.units import UnitsInformation
+from sbmlutils import log
+
+logger = log.get_logger(__name__)
 
 
 # Constants for conversion
 MolecularWeights = namedtuple("MolecularWeights", "dap d3g daptot glc")
 
 
+class ResultsRequiredError(Exception):
+    """Results of the tasks are accessed before the tasks are run."""
+
+
+class _DryRunResults(ExperimentDict):
+    """Results of the dry run of the figures, every access raises an error."""
+
+    def __getitem__(self, k):
+        raise ResultsRequiredError(f"Results of '{k}' are not available")
+
+    def get(self, k, default=None):
+        return self[k]
+
+    def __iter__(self):
+        raise ResultsRequiredError("Results are not available")
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return iter(self)
+
+    def items(self):
+        return iter(self)
+
+
 class DapagliflozinSimulationExperiment(SimulationExperiment):
     """Base class for all SimulationExperiments."""
 
@@ -174,6 +207,105 @@ class DapagliflozinSimulationExperiment(SimulationExperiment):
         500: "#5e1800",
     }
 
+    # selections of experiments for which the required selections cannot be
+    # determined, i.e., figures which access the results
+    selections_all = [
+        "time",
+        # dosing
+        "IVDOSE_dap",
+        "PODOSE_dap",
+
+        # venous
+        "[Cve_daptot]",
+        "[Cve_dap]",
+        "[Cve_d3g]",
+        "[KI__glc_ext]",
+
+        # liver
+        "[LI__dap]",
+        "[LI__d3g]",
+        
+        # urine
+        "Aurine_daptot",
+        "Aurine_dap",
+        "Aurine_d3g",
+        "KI__glc_urine",
+        "KI__UGE",
+        "KI__RTG",
+
+        # feces
+        "Afeces_dap",
+        "Afeces_daptot",
+
+        # renal excretion rate
+        "KI__D3GEX",
+        "KI__DAPEX",
+        "KI__GLCEX",
+
+        # cases
+        'KI__f_renal_function',
+        'f_cirrhosis',
+        'GU__f_absorption',
+        'f_ugt1a9',
+    ]
+
+    # multiple dosing via dosing events of the model in a single timecourse
+    # instead of chained timecourses per dose
+    event_dosing: bool = False
+
+    # process pool for saving the figures, figures are saved serially if None
+    figure_pool: Optional["FigurePool"] = None
+
+    # datasets of a fit bundle by experiment: {sid: {dset_id: (df, udict)}}
+    preloaded_datasets: Dict[str, Dict[str, Tuple[pd.DataFrame, Dict[str, str]]]] = {}
+
+    def initialize(self) -> None:
+        """Initialize experiment, reuses the datasets of a loaded fit bundle."""
+        preloaded = DapagliflozinSimulationExperiment.preloaded_datasets.get(self.sid)
+        if preloaded is None:
+            super(DapagliflozinSimulationExperiment, self).initialize()
+            return
+
+        def datasets() -> Dict[str, DataSet]:
+            dsets = {}
+            for dset_id, (df, udict) in preloaded.items():
+                dset = DataSet(df.copy())
+                dset.uinfo = UnitsInformation(dict(udict), ureg=self.ureg)
+                dset.Q_ = self.ureg.Quantity
+                dsets[dset_id] = dset
+            return dsets
+
+        self.datasets = datasets
+        try:
+            super(DapagliflozinSimulationExperiment, self).initialize()
+        finally:
+            del self.datasets
+
+    def save_mpl_figures(
+        self,
+        results_path: Path,
+        mpl_figures: Dict,
+        figure_formats: List[str] = None,
+    ) -> Dict[str, List[Path]]:
+        """Save matplotlib figures, on the figure pool if set."""
+        pool = DapagliflozinSimulationExperiment.figure_pool
+        if pool is None:
+            return super(DapagliflozinSimulationExperiment, self).save_mpl_figures(
+                results_path, mpl_figures=mpl_figures, figure_formats=figure_formats
+            )
+        if figure_formats is None:
+            figure_formats = ["svg"]
+        paths: Dict[str, List[Path]] = {fig_format: [] for fig_format in figure_formats}
+        for fkey, fig_mpl in mpl_figures.items():
+            fig_paths = [
+                results_path / f"{self.sid}_{fkey}.{fig_format}"
+                for fig_format in figure_formats
+            ]
+            pool.submit(fig_mpl, fig_paths)
+            for fig_format, fig_path in zip(figure_formats, fig_paths):
+                paths[fig_format].append(fig_path)
+        return paths
+
     def models(self) -> Dict[str, AbstractModel]:
         Q_ = self.Q_
         return {
@@ -197,6 +329,34 @@ class DapagliflozinSimulationExperiment(SimulationExperiment):
         """Default changes to simulations."""
         return DapagliflozinSimulationExperiment._default_changes(Q_=self.Q_)
 
+    def dosing_schedule_changes(
+        self,
+        dose: float,
+        n: int,
+        interval: float = 24 * 60,
+        urine_collection: bool = False,
+    ) -> Dict:
+        """Changes for n oral doses [mg] every interval [min] via dosing events.
+
+        The first dose is given at the start of the timecourse, the n - 1
+        repeated doses by the dosing events. With `urine_collection` the
+        urinary glucose is reset after every dosing interval (daily urine
+        collections).
+        """
+        Q_ = self.Q_
+        changes = {
+            "PODOSE_dap": Q_(dose, "mg"),
+            "PODOSE_dap_dose": Q_(dose, "mg"),
+            "PODOSE_dap_tau": Q_(interval, "min"),
+            "PODOSE_dap_n": Q_(n - 1, "dimensionless"),
+        }
+        if urine_collection:
+            changes.update({
+                "KI__COLLECT_tau": Q_(interval, "min"),
+                "KI__COLLECT_n": Q_(n - 1, "dimensionless"),
+            })
+        return changes
+
     def tasks(self) -> Dict[str, Task]:
         if self.simulations():
             return {
@@ -205,48 +365,68 @@ class DapagliflozinSimulationExperiment(SimulationExperiment):
             }
         return {}
 
+    def figures_mpl_selections(self) -> Optional[Iterable[str]]:
+        """Selections of all tasks which are accessed in `figures_mpl`.
+
+        None if unknown, i.e., all selections are recorded. Experiments which
+        implement `figures_mpl` must override this method to reduce the
+        selections.
+        """
+        figures_mpl = getattr(SimulationExperiment, "figures_mpl", None)
+        if getattr(type(self), "figures_mpl", None) is figures_mpl:
+            return []
+        return None
+
+    def task_selections(self) -> Dict[str, Set[str]]:
+        """Minimal selections for every task.
+
+        The selections are the union of the data referenced by the fit mappings,
+        the figures (data of a dry run of `figures`) and `figures_mpl`. If the
+        figures access the results (`ResultsRequiredError` in the dry run) or
+        the selections of `figures_mpl` are unknown, all selections are
+        recorded. Other errors of the figures are raised.
+        """
+        selections: Dict[str, Set[str]] = {
+            task_id: {"time"} for task_id in self._tasks
+        }
+
+        def add_data(data: Dict) -> None:
+            for d in data.values():
+                if d.is_task() and d.task_id in selections:
+                    selections[d.task_id].add(d.index)
+
+        # fit mappings and data registered during initialization
+        add_data(self._data if self._data else {})
+
+        # dry run of the figure definitions
+        data, results = self._data, self._results
+        self._data = {}
+        self._results = _DryRunResults()
+        try:
+            self.figures()
+            add_data(self._data)
+            complete = True
+        except ResultsRequiredError as err:
+            logger.debug(f"'{self.sid}' figures require results: {err}")
+            complete = False
+        finally:
+            self._data, self._results = data, results
+
+        mpl_selections = self.figures_mpl_selections()
+        if mpl_selections is None:
+            complete = False
+        for task_id in selections:
+            if complete:
+                selections[task_id].update(mpl_selections)
+            else:
+                selections[task_id].update(self.selections_all)
+        return selections
+
     def data(self) -> Dict:
-        self.add_selections_data(
-            selections=[
-                "time",
-                # dosing
-                "IVDOSE_dap",
-                "PODOSE_dap",
-
-                # venous
-                "[Cve_daptot]",
-                "[Cve_dap]",
-                "[Cve_d3g]",
-                "[KI__glc_ext]",
-
-                # liver
-                "[LI__dap]",
-                "[LI__d3g]",
-                
-                # urine
-                "Aurine_daptot",
-                "Aurine_dap",
-                "Aurine_d3g",
-                "KI__glc_urine",
-                "KI__UGE",
-                "KI__RTG",
-
-                # feces
-                "Afeces_dap",
-                "Afeces_daptot",
-
-                # renal excretion rate
-                "KI__D3GEX",
-                "KI__DAPEX",
-                "KI__GLCEX",
-
-                # cases
-                'KI__f_renal_function',
-                'f_cirrhosis',
-                'GU__f_absorption',
-                'f_ugt1a9',
-            ]
-        )
+        """Register the minimal selections of every task."""
+        for task_id, selections in self.task_selections().items():
+            for selection in sorted(selections):
+                Data(self, index=selection, task=task_id)
         return {}
 
     @property
@@ -1,3 +1,7 @@
-from .dose_dependency import DoseDependencyExperiment
-from .food_effect import FoodEffect
-from .hepatic_renal_impairment import HepaticRenalImpairment
\ No newline at end of file
+"""Miscellaneous simulation experiments.
+
+The experiment classes are imported on first access (see `registry`).
+"""
+from pkdb_models.models.dapagliflozin.registry import lazy_experiments
+
+__getattr__, __all__ = lazy_experiments(__name__)
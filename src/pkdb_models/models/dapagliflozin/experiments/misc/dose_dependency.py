@@ -2,7 +2,6 @@ from typing import Dict
 from sbmlsim.plot import Axis, Figure, Plot
 from sbmlsim.simulation import Timecourse, TimecourseSim
 from pkdb_models.models.dapagliflozin.experiments.base_experiment import DapagliflozinSimulationExperiment
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
 
 
 class DoseDependencyExperiment(DapagliflozinSimulationExperiment):
@@ -233,4 +232,5 @@ class DoseDependencyExperiment(DapagliflozinSimulationExperiment):
 
 
 if __name__ == "__main__":
+    from pkdb_models.models.dapagliflozin.helpers import run_experiments
     run_experiments(DoseDependencyExperiment, output_dir=DoseDependencyExperiment.__name__)
@@ -5,7 +5,6 @@ import matplotlib
 from sbmlsim.plot import Axis, Figure, Plot
 from sbmlsim.simulation import Timecourse, TimecourseSim
 from pkdb_models.models.dapagliflozin.experiments.base_experiment import DapagliflozinSimulationExperiment
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
 
 
 class FoodEffect(DapagliflozinSimulationExperiment):
@@ -166,4 +165,5 @@ class FoodEffect(DapagliflozinSimulationExperiment):
 
 
 if __name__ == "__main__":
+    from pkdb_models.models.dapagliflozin.helpers import run_experiments
     run_experiments(FoodEffect, output_dir=FoodEffect.__name__)
@@ -5,7 +5,6 @@ import matplotlib
 from sbmlsim.plot import Axis, Figure, Plot
 from sbmlsim.simulation import Timecourse, TimecourseSim
 from pkdb_models.models.dapagliflozin.experiments.base_experiment import DapagliflozinSimulationExperiment
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
 
 
 class HepaticRenalImpairment(DapagliflozinSimulationExperiment):
@@ -230,4 +229,5 @@ class HepaticRenalImpairment(DapagliflozinSimulationExperiment):
 
 
 if __name__ == "__main__":
+    from pkdb_models.models.dapagliflozin.helpers import run_experiments
     run_experiments(HepaticRenalImpairment, output_dir=HepaticRenalImpairment.__name__)
\ No newline at end of file
@@ -1 +1,7 @@
-from .scan_parameters import DapagliflozinParameterScan
\ No newline at end of file
+"""Parameter scans.
+
+The experiment classes are imported on first access (see `registry`).
+"""
+from pkdb_models.models.dapagliflozin.registry import lazy_experiments
+
+__getattr__, __all__ = lazy_experiments(__name__)
@@ -12,9 +12,10 @@ from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 from pathlib import Path
 from sbmlsim.simulation import Timecourse, TimecourseSim, ScanSim, Dimension
 from sbmlsim.plot.serialization_matplotlib import FigureMPL
+from sbmlsim.result import XResult
 from sbmlsim.plot.serialization_matplotlib import plt
 from pkdb_models.models.dapagliflozin.experiments.base_experiment import DapagliflozinSimulationExperiment
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
+from pkdb_models.models.dapagliflozin.pk import PK_SELECTIONS
 from pkdb_models.models.dapagliflozin.pk import calculate_dapagliflozin_pk as _calc_pk
 
 
@@ -85,6 +86,15 @@ class DapagliflozinParameterScan(DapagliflozinSimulationExperiment):
     dose_dap = 10
     num_points = 15
 
+    # variables of the timecourse figures
+    timecourse_sids = [
+        "[Cve_dap]",
+        "[Cve_d3g]",
+        "Aurine_dap",
+        "Aurine_d3g",
+        "Afeces_dap",
+    ]
+
     scan_map = {
         "dose_scan": {
             "parameter": "PODOSE_dap",
@@ -140,44 +150,58 @@ class DapagliflozinParameterScan(DapagliflozinSimulationExperiment):
     }
 
     def simulations(self) -> Dict[str, ScanSim]:
-        """Generate simulation scans for all parameter combinations and glucose levels."""
+        """Generate simulation scans over parameter and glucose levels."""
         Q_ = self.Q_
         tcscans = {}
         for scan_key, scan_data in self.scan_map.items():
             base_dose = scan_data.get("dose_mg", self.dose_dap)
-            for glc in self.glucose_values_mM:
-                tcscans[f"scan_po_{scan_key}__glc{int(glc)}"] = ScanSim(
-                    simulation=TimecourseSim(
-                        Timecourse(
-                            start=0,
-                            end=self.tend,
-                            steps=self.steps,
-                            changes={
-                                **self.default_changes(),
-                                "PODOSE_dap": Q_(base_dose, "mg"),
-                                "[KI__glc_ext]": Q_(glc, "mM"),
-                            },
-                        )
+            tcscans[f"scan_po_{scan_key}"] = ScanSim(
+                simulation=TimecourseSim(
+                    Timecourse(
+                        start=0,
+                        end=self.tend,
+                        steps=self.steps,
+                        changes={
+                            **self.default_changes(),
+                            "PODOSE_dap": Q_(base_dose, "mg"),
+                        },
+                    )
+                ),
+                dimensions=[
+                    Dimension(
+                        "dim_scan",
+                        changes={
+                            scan_data["parameter"]: Q_(scan_data["range"], scan_data["units"])
+                        },
                     ),
-                    dimensions=[
-                        Dimension(
-                            "dim_scan",
-                            changes={
-                                scan_data["parameter"]: Q_(scan_data["range"], scan_data["units"])
-                            },
-                        ),
-                    ],
-                )
+                    Dimension(
+                        "dim_glc",
+                        changes={
+                            "[KI__glc_ext]": Q_(self.glucose_values_mM, "mM"),
+                        },
+                    ),
+                ],
+            )
         return tcscans
 
+    def scan_result(self, scan_key: str, glc: float = None) -> XResult:
+        """Result of a parameter scan at the given glucose level.
+
+        :param glc: glucose [mM], defaults to the baseline glucose
+        """
+        if glc is None:
+            glc = self.baseline_glucose_mM
+        xres = self.results[f"task_scan_po_{scan_key}"]
+        k_glc = self.glucose_values_mM.index(glc)
+        return XResult(xdataset=xres.xds.isel({"dim_glc": k_glc}), uinfo=xres.uinfo)
+
     def calculate_dapagliflozin_pk(self) -> Dict[str, pd.DataFrame]:
         """Calculate PK metrics for each scan at baseline glucose levels."""
         pk_dfs: Dict[str, pd.DataFrame] = {}
         for scan_key in self.scan_map.keys():
-            sim_key_base = f"scan_po_{scan_key}__glc{int(self.baseline_glucose_mM)}"
-            xres = self.results[f"task_{sim_key_base}"]
-            df = _calc_pk(experiment=self, xres=xres)
-            pk_dfs[f"scan_po_{scan_key}"] = df
+            # only the timecourses at baseline glucose are reduced
+            xres = self.scan_result(scan_key)
+            pk_dfs[f"scan_po_{scan_key}"] = _calc_pk(experiment=self, xres=xres)
         return pk_dfs
 
     def _get_glucose_color(self, diabetes_status: str) -> str:
@@ -288,15 +312,18 @@ class DapagliflozinParameterScan(DapagliflozinSimulationExperiment):
             **self.figures_mpl_pharmacokinetics(),
         }
 
+    def figures_mpl_selections(self) -> List[str]:
+        """Selections of the pharmacokinetics, UGE and timecourse figures."""
+        return [
+            *PK_SELECTIONS,
+            "KI__UGE",
+            *self.timecourse_sids,
+            *sorted({scan_data["parameter"] for scan_data in self.scan_map.values()}),
+        ]
+
     def figures_mpl_timecourses(self) -> Dict[str, FigureMPL]:
         """Generate timecourse plots for each parameter scan."""
-        sids = [
-            "[Cve_dap]",
-            "[Cve_d3g]",
-            "Aurine_dap",
-            "Aurine_d3g",
-            "Afeces_dap",
-        ]
+        sids = self.timecourse_sids
 
         figures = {}
         for scan_key, scan_data in self.scan_map.items():
@@ -360,7 +387,7 @@ class DapagliflozinParameterScan(DapagliflozinSimulationExperiment):
             for kcol, sid in enumerate(sids):
                 ax = axes[kcol]
                 Q_ = self.Q_
-                xres = self.results[f"task_scan_po_{scan_key}"]
+                xres = self.scan_result(scan_key)
                 scandim = xres._redop_dims()[0]
                 parameter_id = scan_data["parameter"]
                 par_vec = Q_(xres[parameter_id].values[0], xres.uinfo[parameter_id])
@@ -534,8 +561,7 @@ class DapagliflozinParameterScan(DapagliflozinSimulationExperiment):
             panel_title = scan_data.get("title", "Parameter Scan")
             f.suptitle(panel_title, fontsize=22, fontweight='bold')
 
-            sim_key_base = f"scan_po_{scan_key}__glc{int(self.baseline_glucose_mM)}"
-            xres_base = self.results[f"task_{sim_key_base}"]
+            xres_base = self.scan_result(scan_key)
             df_all = self.pk_dfs[f"scan_po_{scan_key}"]
 
             parameter_id = scan_data["parameter"]
@@ -606,8 +632,7 @@ class DapagliflozinParameterScan(DapagliflozinSimulationExperiment):
                     glucose_handles: List[Line2D] = []
 
                     for j, glc in enumerate(self.glucose_values_mM):
-                        sim_key = f"scan_po_{scan_key}__glc{int(glc)}"
-                        xres = self.results[f"task_{sim_key}"]
+                        xres = self.scan_result(scan_key, glc)
                         uge_unit = xres.uinfo[uge_sid]
                         uge_24h_g = [
                             Q_(xres[uge_sid].isel({scandim: i}).values[idx_24h], uge_unit).to("g").magnitude
@@ -966,8 +991,7 @@ class DapagliflozinParameterScan(DapagliflozinSimulationExperiment):
             f_comb.suptitle(panel_title, fontsize=22, fontweight='bold')
 
             scan50 = self.scan_map["renal_scan_50"]
-            sim50_base = f"scan_po_renal_scan_50__glc{int(self.baseline_glucose_mM)}"
-            xres50 = self.results[f"task_{sim50_base}"]
+            xres50 = self.scan_result("renal_scan_50")
             df50 = self.pk_dfs["scan_po_renal_scan_50"]
 
             param_id = scan50["parameter"]
@@ -1009,8 +1033,7 @@ class DapagliflozinParameterScan(DapagliflozinSimulationExperiment):
             scan20 = self.scan_map["renal_scan_20"]
             param_id20 = scan20["parameter"]
 
-            sim20_base = f"scan_po_renal_scan_20__glc{int(self.baseline_glucose_mM)}"
-            xres20_base = self.results[f"task_{sim20_base}"]
+            xres20_base = self.scan_result("renal_scan_20")
             t_vec20 = xres20_base.dim_mean("time").to(self.units["time"]).magnitude
             idx_24h_20 = int(np.argmin(np.abs(t_vec20 - 24 * 60)))
             x_q20 = Q_(xres20_base[param_id20].values[0], xres20_base.uinfo[param_id20])
@@ -1021,8 +1044,7 @@ class DapagliflozinParameterScan(DapagliflozinSimulationExperiment):
 
             ax_uge.axvline(x=scan20["default"], color="grey", linestyle="--", linewidth=1.2, zorder=1)
             for j, glc in enumerate(self.glucose_values_mM):
-                sim20 = f"scan_po_renal_scan_20__glc{int(glc)}"
-                xres20 = self.results[f"task_{sim20}"]
+                xres20 = self.scan_result("renal_scan_20", glc)
                 uge_unit20 = xres20.uinfo[uge_sid]
                 uge_24h_g20 = [
                     Q_(xres20[uge_sid].isel({scandim: i}).values[idx_24h_20], uge_unit20).to("g").magnitude
@@ -1236,4 +1258,5 @@ class DapagliflozinParameterScan(DapagliflozinSimulationExperiment):
 
 
 if __name__ == "__main__":
+    from pkdb_models.models.dapagliflozin.helpers import run_experiments
     run_experiments(DapagliflozinParameterScan, output_dir=DapagliflozinParameterScan.__name__)
\ No newline at end of file
@@ -1,28 +1,7 @@
-from .boulton2013 import Boulton2013
-from .cho2021 import Cho2021
-from .fdamb102002 import FDAMB102002
-from .fdamb102003 import FDAMB102003
-from .fdamb102006 import FDAMB102006
-from .fdamb102007 import FDAMB102007
-from .gould2013 import Gould2013
-from .hwang2022a import Hwang2022a
-from .imamura2013 import Imamura2013
-from .jang2020 import Jang2020
-from .laCreta2016 import LaCreta2016
-from .kasichayanula2011 import Kasichayanula2011
-from .kasichayanula2011a import Kasichayanula2011a
-from .kasichayanula2011b import Kasichayanula2011b
-from .kasichayanula2011c import Kasichayanula2011c
-from .kasichayanula2012 import Kasichayanula2012
-from .kasichayanula2013 import Kasichayanula2013
-from .kasichayanula2013a import Kasichayanula2013a
-from .khomitskaya2018 import Khomitskaya2018
-from .kim2023 import Kim2023
-from .kim2023a import Kim2023a
-from .komoroski2009 import Komoroski2009
-from .obermeier2010 import Obermeier2010
-from .sha2015 import Sha2015
-from .shah2019a import Shah2019a
-from .vanderAartvanderBeek2020 import vanderAartvanderBeek2020
-from .watada2019 import Watada2019
-from .yang2013 import Yang2013
+"""Simulation experiments of the clinical studies.
+
+The experiment classes are imported on first access (see `registry`).
+"""
+from pkdb_models.models.dapagliflozin.registry import lazy_experiments
+
+__getattr__, __all__ = lazy_experiments(__name__)
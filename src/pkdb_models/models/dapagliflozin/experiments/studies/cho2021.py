@@ -9,7 +9,6 @@ from sbmlsim.plot import Axis, Figure
 from sbmlsim.simulation import Timecourse, TimecourseSim
 import pkdb_models.models.dapagliflozin as dapagliflozin
 from pathlib import Path
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
 
 
 class Cho2021(DapagliflozinSimulationExperiment):
@@ -125,6 +124,7 @@ class Cho2021(DapagliflozinSimulationExperiment):
 
 
 if __name__ == "__main__":
+    from pkdb_models.models.dapagliflozin.helpers import run_experiments
     out = dapagliflozin.RESULTS_PATH_SIMULATION / Cho2021.__name__
     out.mkdir(parents=True, exist_ok=True)
     run_experiments(Cho2021, output_dir=out)
\ No newline at end of file
@@ -7,7 +7,6 @@ from pkdb_models.models.dapagliflozin.experiments.metadata import Tissue, Route,
     Fasting, DapagliflozinMappingMetaData
 from sbmlsim.plot import Axis, Figure
 from sbmlsim.simulation import Timecourse, TimecourseSim
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
 import pkdb_models.models.dapagliflozin as dapagliflozin
 from pathlib import Path
 
@@ -161,6 +160,7 @@ class FDAMB102002(DapagliflozinSimulationExperiment):
 
 
 if __name__ == "__main__":
+    from pkdb_models.models.dapagliflozin.helpers import run_experiments
     out = dapagliflozin.RESULTS_PATH_SIMULATION / FDAMB102002.__name__
     out.mkdir(parents=True, exist_ok=True)
     run_experiments(FDAMB102002, output_dir=out)
\ No newline at end of file
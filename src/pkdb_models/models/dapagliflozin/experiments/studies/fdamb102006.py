@@ -7,7 +7,6 @@ from pkdb_models.models.dapagliflozin.experiments.metadata import Tissue, Route,
     Fasting, DapagliflozinMappingMetaData
 from sbmlsim.plot import Axis, Figure
 from sbmlsim.simulation import Timecourse, TimecourseSim
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
 from pathlib import Path
 import pkdb_models.models.dapagliflozin as dapagliflozin
 
@@ -147,6 +146,7 @@ class FDAMB102006(DapagliflozinSimulationExperiment):
 
 
 if __name__ == "__main__":
+    from pkdb_models.models.dapagliflozin.helpers import run_experiments
     out = dapagliflozin.RESULTS_PATH_SIMULATION / FDAMB102006.__name__
     out.mkdir(parents=True, exist_ok=True)
     run_experiments(FDAMB102006, output_dir=out)
\ No newline at end of file
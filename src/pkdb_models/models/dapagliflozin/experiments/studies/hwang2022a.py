@@ -7,7 +7,6 @@ from pkdb_models.models.dapagliflozin.experiments.metadata import Tissue, Route,
     Fasting, DapagliflozinMappingMetaData
 from sbmlsim.plot import Axis, Figure
 from sbmlsim.simulation import Timecourse, TimecourseSim
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
 from pathlib import Path
 import pkdb_models.models.dapagliflozin as dapagliflozin
 
@@ -160,6 +159,7 @@ class Hwang2022a(DapagliflozinSimulationExperiment):
 
 
 if __name__ == "__main__":
+    from pkdb_models.models.dapagliflozin.helpers import run_experiments
     out = dapagliflozin.RESULTS_PATH_SIMULATION / Hwang2022a.__name__
     out.mkdir(parents=True, exist_ok=True)
     run_experiments(Hwang2022a, output_dir=out)
\ No newline at end of file
@@ -15,7 +15,6 @@ from pkdb_models.models.dapagliflozin.experiments.metadata import (
 )
 from sbmlsim.plot import Axis, Figure
 from sbmlsim.simulation import Timecourse, TimecourseSim
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
 from pathlib import Path
 import pkdb_models.models.dapagliflozin as dapagliflozin
 
@@ -140,6 +139,7 @@ class Imamura2013(DapagliflozinSimulationExperiment):
 
 
 if __name__ == "__main__":
+    from pkdb_models.models.dapagliflozin.helpers import run_experiments
     out = dapagliflozin.RESULTS_PATH_SIMULATION / Imamura2013.__name__
     out.mkdir(parents=True, exist_ok=True)
     run_experiments(Imamura2013, output_dir=out)
\ No newline at end of file
@@ -7,7 +7,6 @@ from pkdb_models.models.dapagliflozin.experiments.metadata import Tissue, Route,
     Fasting, DapagliflozinMappingMetaData
 from sbmlsim.plot import Axis, Figure
 from sbmlsim.simulation import Timecourse, TimecourseSim
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
 from pathlib import Path
 import pkdb_models.models.dapagliflozin as dapagliflozin
 
@@ -127,10 +126,25 @@ class Kasichayanula2011a(DapagliflozinSimulationExperiment):
                     "PODOSE_dap": Q_(dose, "mg"),
                 },
             )
-            tcsims[f"po_MAD{dose}"] = TimecourseSim(
-                [tc0] + [tc1 for _ in range(12)] + [tc2],
-                # time_offset=-13*24*60,
-            )
+            if self.event_dosing:
+                tcsims[f"po_MAD{dose}"] = TimecourseSim(
+                    [Timecourse(
+                        start=0,
+                        end=13 * 24 * 60 + 25 * 60,  # [min]
+                        steps=14 * 500,
+                        changes={
+                            **tc0.changes,
+                            **self.dosing_schedule_changes(
+                                dose=dose, n=14, urine_collection=True
+                            ),
+                        },
+                    )],
+                )
+            else:
+                tcsims[f"po_MAD{dose}"] = TimecourseSim(
+                    [tc0] + [tc1 for _ in range(12)] + [tc2],
+                    # time_offset=-13*24*60,
+                )
         return tcsims
 
     def fit_mappings(self) -> Dict[str, FitMapping]:
@@ -223,6 +237,7 @@ class Kasichayanula2011a(DapagliflozinSimulationExperiment):
 
 
 if __name__ == "__main__":
+    from pkdb_models.models.dapagliflozin.helpers import run_experiments
     out = dapagliflozin.RESULTS_PATH_SIMULATION / Kasichayanula2011a.__name__
     out.mkdir(parents=True, exist_ok=True)
     run_experiments(Kasichayanula2011a, output_dir=out)
\ No newline at end of file
@@ -7,7 +7,6 @@ from pkdb_models.models.dapagliflozin.experiments.metadata import Tissue, Route,
     Fasting, DapagliflozinMappingMetaData
 from sbmlsim.plot import Axis, Figure
 from sbmlsim.simulation import Timecourse, TimecourseSim
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
 from pathlib import  Path
 import pkdb_models.models.dapagliflozin as dapagliflozin
 
@@ -121,6 +120,7 @@ class Kim2023a(DapagliflozinSimulationExperiment):
 
 
 if __name__ == "__main__":
+    from pkdb_models.models.dapagliflozin.helpers import run_experiments
     # run_experiments(Kim2023a, output_dir=Kim2023a.__name__)
     out = dapagliflozin.RESULTS_PATH_SIMULATION / Kim2023a.__name__
     out.mkdir(parents=True, exist_ok=True)
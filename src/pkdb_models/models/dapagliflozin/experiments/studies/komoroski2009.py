@@ -7,7 +7,6 @@ from pkdb_models.models.dapagliflozin.experiments.metadata import Tissue, Route,
     Fasting, DapagliflozinMappingMetaData
 from sbmlsim.plot import Axis, Figure
 from sbmlsim.simulation import Timecourse, TimecourseSim
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
 from pathlib import  Path
 import pkdb_models.models.dapagliflozin as dapagliflozin
 
@@ -119,10 +118,24 @@ class Komoroski2009(DapagliflozinSimulationExperiment):
                     "PODOSE_dap": Q_(dose, "mg"),
                 },
             )
-            tcsims[f"po_dap_{dose}_multi"] = TimecourseSim(
-                [tc0] + [tc1 for _ in range(12)] + [tc2],
-                time_offset=-24*60*13
-            )
+            if self.event_dosing:
+                tcsims[f"po_dap_{dose}_multi"] = TimecourseSim(
+                    [Timecourse(
+                        start=0,
+                        end=13 * 24 * 60 + 30 * 60,  # [min]
+                        steps=14 * 500,
+                        changes={
+                            **tc0.changes,
+                            **self.dosing_schedule_changes(dose=dose, n=14),
+                        },
+                    )],
+                    time_offset=-24*60*13
+                )
+            else:
+                tcsims[f"po_dap_{dose}_multi"] = TimecourseSim(
+                    [tc0] + [tc1 for _ in range(12)] + [tc2],
+                    time_offset=-24*60*13
+                )
             # multi dose simulation
             for dose in self.doses_uge_multi:
                 tc0 = Timecourse(
@@ -157,10 +170,26 @@ class Komoroski2009(DapagliflozinSimulationExperiment):
                         "PODOSE_dap": Q_(dose, "mg"),
                     },
                 )
-                tcsims[f"po_dap_{dose}_uge_multi"] = TimecourseSim(
-                    [tc0] + [tc1 for _ in range(12)] + [tc2],
-                    time_offset=0
-                )
+                if self.event_dosing:
+                    tcsims[f"po_dap_{dose}_uge_multi"] = TimecourseSim(
+                        [Timecourse(
+                            start=0,
+                            end=13 * 24 * 60 + 30 * 60,  # [min]
+                            steps=14 * 500,
+                            changes={
+                                **tc0.changes,
+                                **self.dosing_schedule_changes(
+                                    dose=dose, n=14, urine_collection=True
+                                ),
+                            },
+                        )],
+                        time_offset=0
+                    )
+                else:
+                    tcsims[f"po_dap_{dose}_uge_multi"] = TimecourseSim(
+                        [tc0] + [tc1 for _ in range(12)] + [tc2],
+                        time_offset=0
+                    )
 
         return tcsims
 
@@ -483,6 +512,7 @@ class Komoroski2009(DapagliflozinSimulationExperiment):
 
 
 if __name__ == "__main__":
+    from pkdb_models.models.dapagliflozin.helpers import run_experiments
     out = dapagliflozin.RESULTS_PATH_SIMULATION / Komoroski2009.__name__
     out.mkdir(parents=True, exist_ok=True)
     run_experiments(Komoroski2009, output_dir=out)
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""Fingerprints of simulation experiments for incremental runs.
+
+The fingerprint of an experiment consists of the hashes of
+
+- the source modules of the experiment class and its base classes,
+- the data files of the study (`<data_path>/<sid>/**`),
+- the flattened model file,
+- the simulation settings (integrator, fast-forward, output grid),
+
+and the version of sbmlsim. After a successful run the fingerprint is stored
+with the stored task ids and the report fragment of the experiment in the
+manifest `<output_path>/<sid>/fingerprint.json`. Experiments with an unchanged
+fingerprint and complete outputs are skipped in incremental runs, the stored
+results, figures and report fragments of the previous run are reused.
+Runs without figures store the manifest without report fragment, which is
+added when the figures are rendered (`render_experiments`). Such experiments
+are reused by runs without figures, runs with figures require the report
+fragment and the figures.
+"""
+import inspect
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Type, Union
+
+from sbmlsim.experiment import SimulationExperiment
+from sbmlsim.experiment.experiment import ExperimentResult
+from sbmlsim.report.experiment_report import ReportResults
+
+from pkdb_models.models.dapagliflozin.cache import _version, file_hash
+
+if TYPE_CHECKING:
+    from pkdb_models.models.dapagliflozin.result_store import ResultStore
+
+MANIFEST_FILE = "fingerprint.json"
+
+# entries of the report fragments which are paths
+_REPORT_PATHS = {"models", "datasets", "figures", "code_path"}
+
+
+def _source_hashes(experiment_class: Type[SimulationExperiment]) -> Dict[str, str]:
+    """Hashes of the modules defining the experiment class and its base classes."""
+    hashes = {}
+    for cls in experiment_class.__mro__:
+        if not cls.__module__.startswith("pkdb_models"):
+            continue
+        hashes[cls.__module__] = file_hash(inspect.getfile(cls))
+    return hashes
+
+
+def _data_hashes(
+    sid: str, data_paths: Iterable[Union[str, Path]]
+) -> Dict[str, str]:
+    """Hashes of the data files of the study."""
+    hashes = {}
+    for data_path in data_paths:
+        study_path = Path(data_path) / sid
+        for path in sorted(study_path.rglob("*")):
+            if path.is_file() and "__pycache__" not in path.parts:
+                hashes[str(path.relative_to(data_path))] = file_hash(path)
+    return hashes
+
+
+def experiment_fingerprint(
+    experiment_class: Type[SimulationExperiment],
+    model_path: Union[str, Path],
+    data_paths: Iterable[Union[str, Path]],
+    settings: Optional[Dict[str, Any]] = None,
+    model_hash: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Fingerprint of the experiment class.
+
+    :param settings: simulation settings which change the results, values
+        are compared by their representation.
+    :param model_hash: hash of the model file, e.g., calculated once for the
+        fingerprints of all experiments of a run. The model file is hashed
+        if None.
+    """
+    sid = experiment_class.__name__
+    return {
+        "sources": _source_hashes(experiment_class),
+        "data": _data_hashes(sid, data_paths),
+        "model": model_hash if model_hash is not None else file_hash(model_path),
+        "settings": {k: repr(v) for k, v in (settings or {}).items()},
+        "sbmlsim": _version("sbmlsim"),
+    }
+
+
+def changed_entries(old: Dict, new: Dict) -> List[str]:
+    """Entries of the fingerprint which changed."""
+    return [key for key in new if old.get(key) != new[key]]
+
+
+def report_fragment(exp_result: ExperimentResult) -> Dict[str, Any]:
+    """Report information of the experiment result."""
+    report_results = ReportResults()
+    report_results.add_experiment_result(exp_result=exp_result)
+    return report_results.data[exp_result.experiment.sid]
+
+
+def _paths_to_str(value: Any) -> Any:
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, dict):
+        return {k: _paths_to_str(v) for k, v in value.items()}
+    return value
+
+
+def _str_to_paths(value: Any) -> Any:
+    if isinstance(value, str):
+        return Path(value)
+    if isinstance(value, dict):
+        return {k: _str_to_paths(v) for k, v in value.items()}
+    return value
+
+
+class FingerprintManifest:
+    """Manifest of the last successful run of an experiment."""
+
+    def __init__(self, experiment_path: Path):
+        """
+        :param experiment_path: output directory of the experiment
+        """
+        self.experiment_path = Path(experiment_path)
+        self.path = self.experiment_path / MANIFEST_FILE
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Content of the manifest, None if no valid manifest exists."""
+        if not self.path.exists():
+            return None
+        try:
+            with open(self.path, "r") as f_json:
+                return json.load(f_json)
+        except (OSError, ValueError):
+            return None
+
+    def save(
+        self,
+        fingerprint: Dict[str, Any],
+        task_ids: List[str],
+        report: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Store the manifest of a successful run.
+
+        :param report: report fragment, None for runs without figures
+        """
+        content = {
+            "fingerprint": fingerprint,
+            "tasks": sorted(task_ids),
+            "report": _paths_to_str(report) if report is not None else None,
+        }
+        self.experiment_path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f_json:
+            json.dump(content, f_json, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add_report(self, report: Dict[str, Any]) -> None:
+        """Add the report fragment of rendered figures to the manifest."""
+        content = self.load()
+        if content is not None:
+            self.save(content["fingerprint"], content["tasks"], report=report)
+
+    def remove(self) -> None:
+        """Invalidate the manifest, e.g., before outputs are overwritten."""
+        self.path.unlink(missing_ok=True)
+
+    def fingerprint(self) -> Optional[Dict[str, Any]]:
+        """Fingerprint of the last successful run."""
+        content = self.load()
+        return content["fingerprint"] if content else None
+
+    def reusable(
+        self, fingerprint: Dict[str, Any], store: "ResultStore", figures: bool = True
+    ) -> bool:
+        """Fingerprint is unchanged and all outputs of the run exist.
+
+        :param figures: figures and report fragment are required
+        """
+        content = self.load()
+        if content is None or content["fingerprint"] != fingerprint:
+            return False
+        if not all(task_id in store for task_id in content["tasks"]):
+            return False
+        if not figures:
+            return True
+        if content["report"] is None:
+            return False
+        return all(
+            (self.experiment_path / f"{path}.png").exists()
+            for path in content["report"].get("figures", {}).values()
+        )
+
+    def report(self) -> Optional[Dict[str, Any]]:
+        """Report fragment of the last successful run, None without figures."""
+        fragment = self.load()["report"]
+        if fragment is None:
+            return None
+        return {
+            key: _str_to_paths(value) if key in _REPORT_PATHS else value
+            for key, value in fragment.items()
+        }
@@ -0,0 +1,179 @@
+"""Pre-compiled bundle of the fit problems.
+
+Creating the fit experiments instantiates all experiment classes, loads all
+datasets and applies the metadata filters; the optimization problems load the
+datasets again in every worker. The `FitBundle` stores the filtered
+`FitExperiment`s of all subsets together with the loaded datasets in a single
+pickle file. The bundle is keyed by the hash of the data directories and the
+code of the experiments, i.e., changed data or experiments invalidate the
+bundle.
+
+The bundle is created with the `fit_dapagliflozin_bundle` command or on first
+use by `load_fit_bundle`.
+"""
+import hashlib
+import os
+import pickle
+import time
+from dataclasses import dataclass
+from importlib import metadata
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from pymetadata.console import console
+from sbmlsim.fit import FitExperiment
+
+from pkdb_models.models.dapagliflozin import (
+    DAPAGLIFLOZIN_PATH,
+    DATA_PATHS,
+    RESULTS_PATH_FIT,
+)
+
+BUNDLE_PATH = RESULTS_PATH_FIT / "bundle"
+
+# code which defines the fit experiments and datasets
+BUNDLE_CODE_PATHS = [
+    DAPAGLIFLOZIN_PATH / "experiments",
+    DAPAGLIFLOZIN_PATH / "fitting" / "fit_experiments.py",
+]
+
+# datasets {sid: {dset_id: (df, udict)}}
+DatasetsType = Dict[str, Dict[str, Tuple[pd.DataFrame, Dict[str, str]]]]
+
+
+def _files(paths: List[Path], pattern: str) -> List[Path]:
+    files = []
+    for path in paths:
+        if path.is_file():
+            files.append(path)
+        else:
+            files.extend(p for p in path.rglob(pattern) if p.is_file())
+    return sorted(files)
+
+
+def bundle_key() -> str:
+    """Hash of the data directories, the experiment code and the sbmlsim version."""
+    h = hashlib.sha256()
+    for path in _files(DATA_PATHS, "*") + _files(BUNDLE_CODE_PATHS, "*.py"):
+        if "__pycache__" in path.parts:
+            continue
+        h.update(str(path.relative_to(DAPAGLIFLOZIN_PATH)).encode("utf-8"))
+        h.update(path.read_bytes())
+    h.update(metadata.version("sbmlsim").encode("utf-8"))
+    return h.hexdigest()
+
+
+@dataclass
+class FitBundle:
+    """Filtered fit experiments of all subsets and their datasets."""
+
+    key: str
+    # {subset: {study: [FitExperiment]}}
+    fit_experiments: Dict[str, Dict[str, List[FitExperiment]]]
+    datasets: DatasetsType
+
+    def register(self) -> None:
+        """Use the datasets of the bundle for the initialization of experiments."""
+        from pkdb_models.models.dapagliflozin.experiments.base_experiment import (
+            DapagliflozinSimulationExperiment,
+        )
+
+        DapagliflozinSimulationExperiment.preloaded_datasets.update(self.datasets)
+
+
+def bundle_path(key: str, bundle_dir: Path = BUNDLE_PATH) -> Path:
+    """Path of the bundle with given key."""
+    return bundle_dir / f"fit_bundle_{key[:16]}.pkl"
+
+
+def build_fit_bundle(bundle_dir: Path = BUNDLE_PATH) -> Path:
+    """Create the fit experiments of all subsets and store them in a bundle."""
+    from pkdb_models.models.dapagliflozin.fitting.fit_experiments import (
+        f_fitexp_pharmacodynamics,
+        f_fitexp_pharmacokinetics,
+    )
+
+    ts = time.time()
+    key = bundle_key()
+    fit_experiments = {
+        "PK": f_fitexp_pharmacokinetics(),
+        "PD": f_fitexp_pharmacodynamics(),
+    }
+
+    # datasets of all experiments with fit experiments
+    datasets: DatasetsType = {}
+    for fitexp_dict in fit_experiments.values():
+        for fit_exps in fitexp_dict.values():
+            for fit_exp in fit_exps:
+                experiment_class = fit_exp.experiment_class
+                if experiment_class.__name__ in datasets:
+                    continue
+                experiment = experiment_class(
+                    base_path=DAPAGLIFLOZIN_PATH, data_path=DATA_PATHS
+                )
+                datasets[experiment.sid] = {
+                    dset_id: (pd.DataFrame(dset), dict(dset.uinfo.udict))
+                    for dset_id, dset in experiment.datasets().items()
+                }
+
+    bundle = FitBundle(key=key, fit_experiments=fit_experiments, datasets=datasets)
+    bundle_dir.mkdir(parents=True, exist_ok=True)
+    path = bundle_path(key, bundle_dir=bundle_dir)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+    # remove outdated bundles
+    for p in bundle_dir.glob("fit_bundle_*.pkl"):
+        if p != path:
+            p.unlink(missing_ok=True)
+
+    console.print(
+        f"Fit bundle with {len(datasets)} experiments created in "
+        f"{time.time() - ts:.2f} s: '{path}'"
+    )
+    return path
+
+
+# bundles loaded in the process
+_bundles: Dict[Path, FitBundle] = {}
+
+
+def load_fit_bundle(
+    path: Optional[Path] = None, build: bool = True, bundle_dir: Path = BUNDLE_PATH
+) -> FitBundle:
+    """Load the fit bundle and register its datasets.
+
+    :param path: path of bundle, by default the bundle of the current data and code
+    :param build: build the bundle if it does not exist
+    """
+    if path is None:
+        path = bundle_path(bundle_key(), bundle_dir=bundle_dir)
+    path = Path(path)
+    if path not in _bundles:
+        if not path.exists():
+            if not build:
+                raise IOError(f"Fit bundle does not exist: '{path}'")
+            build_fit_bundle(bundle_dir=path.parent)
+        with open(path, "rb") as f:
+            _bundles[path] = pickle.load(f)
+    bundle = _bundles[path]
+    bundle.register()
+    return bundle
+
+
+def main() -> None:
+    """Entry point which builds the fit bundle.
+
+    The script is registered as `fit_dapagliflozin_bundle` command.
+    """
+    console.rule(style="white")
+    console.print(":wrench: BUNDLE FIT DAPAGLIFLOZIN :wrench:")
+    console.rule(style="white")
+    build_fit_bundle()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,34 @@ from pkdb_models.models.dapagliflozin.experiments.metadata import (
     Tissue, Route, Dosing, ApplicationForm, Health, Coadministration,
     Fasting, DapagliflozinMappingMetaData
 )
-from pkdb_models.models.dapagliflozin.experiments.studies import *
+from pkdb_models.models.dapagliflozin.experiments.studies.boulton2013 import Boulton2013
+from pkdb_models.models.dapagliflozin.experiments.studies.cho2021 import Cho2021
+from pkdb_models.models.dapagliflozin.experiments.studies.fdamb102002 import FDAMB102002
+from pkdb_models.models.dapagliflozin.experiments.studies.fdamb102003 import FDAMB102003
+from pkdb_models.models.dapagliflozin.experiments.studies.fdamb102006 import FDAMB102006
+from pkdb_models.models.dapagliflozin.experiments.studies.fdamb102007 import FDAMB102007
+from pkdb_models.models.dapagliflozin.experiments.studies.gould2013 import Gould2013
+from pkdb_models.models.dapagliflozin.experiments.studies.hwang2022a import Hwang2022a
+from pkdb_models.models.dapagliflozin.experiments.studies.imamura2013 import Imamura2013
+from pkdb_models.models.dapagliflozin.experiments.studies.jang2020 import Jang2020
+from pkdb_models.models.dapagliflozin.experiments.studies.laCreta2016 import LaCreta2016
+from pkdb_models.models.dapagliflozin.experiments.studies.kasichayanula2011 import Kasichayanula2011
+from pkdb_models.models.dapagliflozin.experiments.studies.kasichayanula2011a import Kasichayanula2011a
+from pkdb_models.models.dapagliflozin.experiments.studies.kasichayanula2011b import Kasichayanula2011b
+from pkdb_models.models.dapagliflozin.experiments.studies.kasichayanula2011c import Kasichayanula2011c
+from pkdb_models.models.dapagliflozin.experiments.studies.kasichayanula2012 import Kasichayanula2012
+from pkdb_models.models.dapagliflozin.experiments.studies.kasichayanula2013 import Kasichayanula2013
+from pkdb_models.models.dapagliflozin.experiments.studies.kasichayanula2013a import Kasichayanula2013a
+from pkdb_models.models.dapagliflozin.experiments.studies.khomitskaya2018 import Khomitskaya2018
+from pkdb_models.models.dapagliflozin.experiments.studies.kim2023 import Kim2023
+from pkdb_models.models.dapagliflozin.experiments.studies.kim2023a import Kim2023a
+from pkdb_models.models.dapagliflozin.experiments.studies.komoroski2009 import Komoroski2009
+from pkdb_models.models.dapagliflozin.experiments.studies.obermeier2010 import Obermeier2010
+from pkdb_models.models.dapagliflozin.experiments.studies.sha2015 import Sha2015
+from pkdb_models.models.dapagliflozin.experiments.studies.shah2019a import Shah2019a
+from pkdb_models.models.dapagliflozin.experiments.studies.vanderAartvanderBeek2020 import vanderAartvanderBeek2020
+from pkdb_models.models.dapagliflozin.experiments.studies.watada2019 import Watada2019
+from pkdb_models.models.dapagliflozin.experiments.studies.yang2013 import Yang2013
 
 
 logger = get_logger(__name__)
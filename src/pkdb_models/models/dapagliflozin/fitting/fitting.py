@@ -1,10 +1,14 @@
 """Dapagliflozin parameter fitting."""
 import logging
+import tempfile
 from pathlib import Path
 
 import itertools
-from typing import List, Dict, Tuple
+from copy import deepcopy
+from functools import partial
+from typing import List, Dict, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from pymetadata.console import console
 from sbmlsim.fit import FitParameter, FitExperiment
@@ -14,11 +18,29 @@ from sbmlsim.fit.analysis import OptimizationAnalysis
 from sbmlsim.fit.runner import run_optimization
 from sbmlsim.fit.options import *
 from sbmlsim.fit.sampling import SamplingType
+from sbmlsim.simulation import ScanSim
 
+from pkdb_models.models.dapagliflozin.fitting.bundle import (
+    bundle_key,
+    bundle_path,
+    load_fit_bundle,
+)
 from pkdb_models.models.dapagliflozin.fitting.fit_experiments import (
     f_fitexp_pharmacokinetics,
     f_fitexp_pharmacodynamics,
 )
+from pkdb_models.models.dapagliflozin.fitting.jacobian import (
+    JacobianOptimizationProblem,
+)
+from pkdb_models.models.dapagliflozin.fitting.memo import (
+    CachedOptimizationProblem,
+    cache_report,
+)
+from pkdb_models.models.dapagliflozin.fitting.storage import (
+    FitRunStore,
+    run_optimization_stored,
+    run_optimizations_stored,
+)
 from pkdb_models.models.dapagliflozin.fitting.parameters import (
     parameters_pk,
     parameters_pd,
@@ -50,48 +72,111 @@ fit_kwargs = {
 }
 
 
+# settings of the local least square fitting
+lsq_kwargs = {
+    "algorithm": OptimizationAlgorithmType.LEAST_SQUARE,
+    # parameters for least square optimization
+    "sampling": SamplingType.LOGUNIFORM_LHS,
+    "diff_step": 0.05,
+    # "diff_step": 0.05,
+    # "ftol": 1e-10,
+    # "xtol": 1e-10,
+    # "gtol": 1e-10,
+}
+
+# settings of the global differential evolution fitting
+de_kwargs = {
+    "algorithm": OptimizationAlgorithmType.DIFFERENTIAL_EVOLUTION,
+}
+
+
+def fit_bundle_path() -> Optional[Path]:
+    """Path of the loaded fit bundle of the current data and code."""
+    path = bundle_path(bundle_key())
+    return path if path.exists() else None
+
+
 def create_optimization_problem(
-    fit_experiments: List[FitExperiment], opid: str, parameters: List[FitParameter]
+    fit_experiments: List[FitExperiment],
+    opid: str,
+    parameters: List[FitParameter],
+    jacobian: bool = False,
+    prune: bool = True,
 ) -> OptimizationProblem:
-    op = OptimizationProblem(
+    """Create optimization problem.
+
+    :param jacobian: least square fits use the Jacobian from forward
+        sensitivities instead of finite differences
+    :param prune: reduce simulations to the tasks, selections and time range
+        of the fit mappings
+    """
+    problem_class = CachedOptimizationProblem
+    if jacobian:
+        problem_class = JacobianOptimizationProblem
+    op = problem_class(
         opid=opid,
         fit_experiments=fit_experiments,
         fit_parameters=parameters,
         base_path=DAPAGLIFLOZIN_PATH,
         data_path=DATA_PATHS,
+        bundle_path=fit_bundle_path(),
+        prune=prune,
     )
     return op
 
 
-def fitlsq(op, seed: int, **kwargs) -> Tuple[OptimizationResult, OptimizationProblem]:
-    """Local least square fitting."""
-    opt_res = run_optimization(
-        problem=op,
-        seed=seed,
-        algorithm=OptimizationAlgorithmType.LEAST_SQUARE,
-        # parameters for least square optimization
-        sampling=SamplingType.LOGUNIFORM_LHS,
-        diff_step=0.05,
-        # diff_step=0.05,
-        # ftol=1e-10,
-        # xtol=1e-10,
-        # gtol=1e-10,
-        **kwargs
-    )
+def fitlsq(
+    op, seed: int, store: Optional[FitRunStore] = None, resume: bool = False, **kwargs
+) -> Tuple[OptimizationResult, OptimizationProblem]:
+    """Local least square fitting.
+
+    With a store every finished run is stored and stored runs can be resumed.
+    """
+    optimizer = run_optimization
+    if store is not None:
+        optimizer = partial(run_optimization_stored, store=store, resume=resume)
+    opt_res = optimizer(problem=op, seed=seed, **lsq_kwargs, **kwargs)
     return opt_res, op
 
 
-def fitde(op, seed: int, **kwargs) -> Tuple[OptimizationResult, OptimizationProblem]:
-    """Global differential evolution fitting."""
-    opt_res = run_optimization(
-        problem=op,
-        seed=seed,
-        algorithm=OptimizationAlgorithmType.DIFFERENTIAL_EVOLUTION,
-        **kwargs
-    )
+def fitde(
+    op, seed: int, store: Optional[FitRunStore] = None, resume: bool = False, **kwargs
+) -> Tuple[OptimizationResult, OptimizationProblem]:
+    """Global differential evolution fitting.
+
+    With a store every finished run is stored and stored runs can be resumed.
+    """
+    optimizer = run_optimization
+    if store is not None:
+        optimizer = partial(run_optimization_stored, store=store, resume=resume)
+    opt_res = optimizer(problem=op, seed=seed, **de_kwargs, **kwargs)
     return opt_res, op
 
 
+def optimization_problem_cost(op: OptimizationProblem) -> float:
+    """Estimated cost of a single evaluation of the optimization problem.
+
+    The cost is the number of simulated time points of all tasks, i.e., scans
+    count with the number of their timecourses. The simulation experiments are
+    created without loading data or models.
+    """
+    cost = 0.0
+    for fit_exp in op.fit_experiments:
+        experiment = fit_exp.experiment_class(
+            base_path=op.base_path, data_path=op.data_path
+        )
+        simulations = experiment.simulations()
+        for task in experiment.tasks().values():
+            sim = simulations[task.simulation_id]
+            n_sims = 1
+            if isinstance(sim, ScanSim):
+                n_sims = int(np.prod([len(dim) for dim in sim.dimensions]))
+                sim = sim.simulation
+            n_points = sum(tc.steps + 1 for tc in sim.timecourses)
+            cost += n_sims * n_points
+    return cost
+
+
 class OptimizationStrategy(str, Enum):
     """Strategy for fitting.
 
@@ -125,6 +210,9 @@ def fit_dapagliflozin(
     n_cores: int,
     n_optimizations: int,
     seed: int,
+    store: Optional[FitRunStore] = None,
+    resume: bool = False,
+    jacobian: bool = False,
 ) -> Dict[str, Tuple[OptimizationResult, OptimizationProblem]]:
 
     if not isinstance(optimization_strategy, OptimizationStrategy):
@@ -141,42 +229,96 @@ def fit_dapagliflozin(
         opt_result: OptimizationResult
         op: OptimizationProblem
         if fit_method == FitMethod.LSQ:
-            opt_result, op = fitlsq(op, seed=seed, size=n_optimizations, n_cores=n_cores, **fit_kwargs)
+            opt_result, op = fitlsq(
+                op, seed=seed, size=n_optimizations, n_cores=n_cores,
+                store=store, resume=resume, **fit_kwargs
+            )
         elif fit_method == FitMethod.DE:
-            opt_result, op = fitde(op, seed=seed, size=n_optimizations, n_cores=n_cores, **fit_kwargs)
+            opt_result, op = fitde(
+                op, seed=seed, size=n_optimizations, n_cores=n_cores,
+                store=store, resume=resume, **fit_kwargs
+            )
 
         return opt_result, op
 
+    def fit_ops(
+        ops: List[OptimizationProblem],
+    ) -> Dict[str, Tuple[OptimizationResult, OptimizationProblem]]:
+        """Fit independent optimization problems concurrently.
+
+        The starts of all problems share the cores, problems with the largest
+        estimated cost are scheduled first.
+        """
+        costs = {op.opid: optimization_problem_cost(op) for op in ops}
+        console.print(
+            pd.Series(costs, name="cost").sort_values(ascending=False).to_frame()
+        )
+        method_kwargs = lsq_kwargs if fit_method == FitMethod.LSQ else de_kwargs
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            opt_results = run_optimizations_stored(
+                problems=ops,
+                store=store if store is not None else FitRunStore(Path(tmp_dir)),
+                size=n_optimizations,
+                seed=seed,
+                n_cores=n_cores,
+                resume=resume,
+                costs=costs,
+                **method_kwargs,
+                **fit_kwargs,
+            )
+        return {op.opid: (opt_results[op.opid], op) for op in ops}
+
     # store optimization results
     results = {}
 
     if optimization_strategy == OptimizationStrategy.SINGLE:
         # fit all experiments individually
-        for fit_exp in fit_experiments:
-            opid = fit_exp.experiment_class.__name__
-
-            op = create_optimization_problem(
-                fit_experiments=[fit_exp], opid=opid, parameters=parameters
+        ops = [
+            create_optimization_problem(
+                fit_experiments=[fit_exp],
+                opid=fit_exp.experiment_class.__name__,
+                parameters=parameters,
+                jacobian=jacobian,
             )
-            results[opid] = fit_op(op=op)
+            for fit_exp in fit_experiments
+        ]
+        if n_cores > 1 and len(ops) > 1:
+            results = fit_ops(ops)
+        else:
+            for op in ops:
+                results[op.opid] = fit_op(op=op)
 
     elif optimization_strategy == OptimizationStrategy.ALL:
         # fit all experiments together
         opid = "all"
         op = create_optimization_problem(
-            fit_experiments=fit_experiments, opid=opid, parameters=parameters
+            fit_experiments=fit_experiments,
+            opid=opid,
+            parameters=parameters,
+            jacobian=jacobian,
         )
         results[opid] = fit_op(op)
 
+    for opid, (opt_result, _) in results.items():
+        cache_report(opid, opt_result)
+
     return results
 
 
-def get_fit_experiments(fit_subset: FitExperimentSubset, study_ids: List[str] = None):
-    """Creates a subset of fit experiments from given information."""
+def get_fit_experiments(
+    fit_subset: FitExperimentSubset, study_ids: List[str] = None, bundle: bool = True
+):
+    """Creates a subset of fit experiments from given information.
+
+    :param bundle: load the fit experiments from the fit bundle (created if
+        outdated) instead of creating them from the data
+    """
     if not isinstance(fit_subset, FitExperimentSubset):
         raise ValueError
 
-    if fit_subset == FitExperimentSubset.PK:
+    if bundle:
+        fitexp_dict = deepcopy(load_fit_bundle().fit_experiments[fit_subset.value])
+    elif fit_subset == FitExperimentSubset.PK:
         fitexp_dict = f_fitexp_pharmacokinetics()
     elif fit_subset == FitExperimentSubset.PD:
         fitexp_dict = f_fitexp_pharmacodynamics()
@@ -270,6 +412,27 @@ def main() -> None:
         dest="output_dir",
         help="Path to output folder with optimization results (optional)",
     )
+    parser.add_option(
+        "--resume",
+        action="store_true",
+        dest="resume",
+        default=False,
+        help="Resume fit, skips the optimization runs which are already stored",
+    )
+    parser.add_option(
+        "--jacobian",
+        action="store_true",
+        dest="jacobian",
+        default=False,
+        help="Use Jacobian from forward sensitivities for LSQ (instead of finite differences)",
+    )
+    parser.add_option(
+        "--no-analysis",
+        action="store_false",
+        dest="analysis",
+        default=True,
+        help="Skip the analysis of the fit (run later with fit_dapagliflozin_analysis)",
+    )
 
     console.rule(style="white")
     console.print(":wrench: FIT DAPAGLIFLOZIN :wrench:")
@@ -295,6 +458,8 @@ def main() -> None:
         _parser_message("Required argument '--strategy' missing.")
     if not options.subset:
         _parser_message("Required argument '--subset' missing.")
+    if not options.name:
+        _parser_message("Required argument '--name' missing.")
 
     output_dir: Path
     if not options.output_dir:
@@ -326,6 +491,8 @@ def main() -> None:
     console.print(f"{'method':<20}: {fit_method}")
     console.print(f"{'subset':<20}: {fit_subset}")
     console.print(f"{'strategy':<20}: {optimization_strategy}")
+    console.print(f"{'jacobian':<20}: {options.jacobian}")
+    console.print(f"{'analysis':<20}: {options.analysis}")
 
     console.rule("Parameters", align="left", style="white")
 
@@ -338,6 +505,25 @@ def main() -> None:
     console.rule(style="white")
 
 
+    # every finished optimization run is stored
+    store = fit_store(output_dir=output_dir, name=name)
+    info = {
+        "method": fit_method.value,
+        "subset": fit_subset.value,
+        "strategy": optimization_strategy.value,
+        "runs": n_optimizations,
+        "seed": seed,
+        "jacobian": options.jacobian,
+    }
+    if options.resume and store.info_path.exists():
+        stored_info = store.read_info()
+        if stored_info != info:
+            _parser_message(
+                f"Settings of stored fit '{name}' differ, resume not possible: "
+                f"{stored_info}"
+            )
+    store.write_info(info)
+
     results: Dict[str, Tuple[OptimizationResult, OptimizationProblem]] = fit_dapagliflozin(
         fit_experiments=fit_experiments,
         parameters=parameters,
@@ -346,29 +532,59 @@ def main() -> None:
         n_cores=n_cores,
         n_optimizations=n_optimizations,
         seed=seed,
+        store=store,
+        resume=options.resume,
+        jacobian=options.jacobian,
     )
+    for opid, (opt_result, _) in results.items():
+        console.print(f"'{opid}': {opt_result.size} runs in '{store.path / opid}'")
+        console.print(opt_result.df_fits[["run", "success", "duration", "cost"]].head())
 
-    # Serialization
-    # FIXME: this must store the results
-    console.print(results)
-
+    console.rule(style="white")
+    if options.analysis:
+        # optimization results and figures, required by fit_dapagliflozin_profile
+        run_analysis(output_dir=output_dir, name=name)
+    else:
+        console.print(f"Run analysis with: fit_dapagliflozin_analysis --name={name}")
 
 
+def fit_store(output_dir: Path, name: str) -> FitRunStore:
+    """Store of the optimization runs of the fit with given name."""
+    return FitRunStore(output_dir / name / "runs")
 
 
-    # TODO: serialization
+def run_analysis(output_dir: Path, name: str) -> None:
+    """Create analysis of stored optimization runs (no refitting)."""
+    store = fit_store(output_dir=output_dir, name=name)
+    info = store.read_info()
+    fit_subset = FitExperimentSubset(info["subset"])
+    optimization_strategy = OptimizationStrategy(info["strategy"])
 
-    console.rule(style="white")
-    # Create report
-    # FIXME: this creates the analysis;
-    # TODO: separate in different command
+    parameters = get_fit_parameters(fit_subset=fit_subset)
+    fit_experiments = get_fit_experiments(fit_subset=fit_subset)
+    if optimization_strategy == OptimizationStrategy.SINGLE:
+        problem_experiments = {
+            fit_exp.experiment_class.__name__: [fit_exp] for fit_exp in fit_experiments
+        }
+    else:
+        problem_experiments = {"all": fit_experiments}
 
     # parameters for plots
     mpl_parameters = {
         # 'axes.labelsize': 12,
         # 'axes.labelweight': "bold",
     }
-    for key, (opt_result, op) in results.items():
+    for opid in store.opids():
+        # complete simulations for the figures
+        op = create_optimization_problem(
+            fit_experiments=problem_experiments[opid],
+            opid=opid,
+            parameters=parameters,
+            prune=False,
+        )
+        opt_result = store.load_result(opid, parameters=parameters)
+        console.print(f"'{opid}': {opt_result.size} runs")
+
         # create figures and outputs
         opt_analysis = OptimizationAnalysis(
             opt_result=opt_result,
@@ -382,10 +598,59 @@ def main() -> None:
         opt_analysis.run(mpl_parameters=mpl_parameters)
 
 
+def main_analysis() -> None:
+    """Entry point which runs the analysis of stored parameter fits.
+
+    The script is registered as `fit_dapagliflozin_analysis` command.
+    """
+    import optparse
+    import sys
+
+    parser = optparse.OptionParser()
+    parser.add_option(
+        "-n",
+        "--name",
+        action="store",
+        dest="name",
+        help="Name of optimization",
+    )
+    parser.add_option(
+        "-o",
+        "--output_dir",
+        action="store",
+        dest="output_dir",
+        help="Path to output folder with optimization results (optional)",
+    )
+
+    console.rule(style="white")
+    console.print(":wrench: ANALYSIS FIT DAPAGLIFLOZIN :wrench:")
+    console.rule(style="white")
+
+    options, args = parser.parse_args()
+    if not options.name:
+        console.print("Required argument '--name' missing.")
+        parser.print_help()
+        console.rule(style="white")
+        sys.exit(1)
+
+    output_dir: Path
+    if not options.output_dir:
+        from pkdb_models.models.dapagliflozin import RESULTS_PATH_FIT
+        output_dir = RESULTS_PATH_FIT
+    else:
+        output_dir = Path(options.output_dir)
+
+    run_analysis(output_dir=output_dir, name=str(options.name))
+
+
 if __name__ == "__main__":
     """
     Parameter fitting should be executed from the terminal:
-        
+
+    The fit experiments and datasets are loaded from the fit bundle which is
+    created on first use or with:
+    fit_dapagliflozin_bundle
+
     fit_dapagliflozin
     fit_dapagliflozin --cores=10 --runs=10 --seed=1234 --method=LSQ --strategy=ALL --subset=ALL --name=DAPAGLIFLOZIN_LSQ_ALL
     fit_dapagliflozin --cores=10 --runs=10 --seed=1234 --method=LSQ --strategy=ALL --subset=CONTROL --name=DAPAGLIFLOZIN_LSQ_CONTROL
@@ -393,5 +658,15 @@ if __name__ == "__main__":
     
     fit_dapagliflozin --cores=10 --runs=100 --seed=1234 --method=LSQ --strategy=ALL --subset=PK --name=DAPAGLIFLOZIN_LSQ_PK
     fit_dapagliflozin --cores=10 --runs=10 --seed=1234 --method=LSQ --strategy=ALL --subset=PD --name=DAPAGLIFLOZIN_LSQ_PD
+
+    The analysis is created from the stored runs at the end of the fit. Interrupted
+    fits are continued with `--resume`, the analysis of stored runs is repeated
+    without refitting with `fit_dapagliflozin_analysis`:
+    fit_dapagliflozin --cores=10 --runs=100 --seed=1234 --method=LSQ --strategy=ALL --subset=PK --name=DAPAGLIFLOZIN_LSQ_PK --resume
+    fit_dapagliflozin --cores=10 --runs=100 --seed=1234 --method=LSQ --strategy=ALL --subset=PK --name=DAPAGLIFLOZIN_LSQ_PK --no-analysis
+    fit_dapagliflozin_analysis --name=DAPAGLIFLOZIN_LSQ_PK
+
+    Least square fits with the Jacobian from forward sensitivities:
+    fit_dapagliflozin --cores=10 --runs=100 --seed=1234 --method=LSQ --strategy=ALL --subset=PK --name=DAPAGLIFLOZIN_LSQ_PK_JAC --jacobian
     """
     main()
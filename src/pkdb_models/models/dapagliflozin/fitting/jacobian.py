@@ -0,0 +1,299 @@
+"""Jacobian of the fit residuals from forward sensitivities.
+
+The least square optimizer approximates the Jacobian of the residuals by
+finite differences, i.e., every iteration requires an additional simulation
+of all fit mappings per fit parameter. The `JacobianOptimizationProblem`
+provides the Jacobian from the forward parameter sensitivities of the model
+(CVODES forward sensitivity solver of roadrunner), i.e., a single augmented
+integration per fit mapping.
+
+For the logarithmic parameters of the optimizer the Jacobian of the weighted
+residuals of a mapping is
+
+    dr/dlog10(p) = sqrt(w) / N * dy/dp * p * ln(10)
+
+with the observable y interpolated at the reference time points and the
+normalization N (mean of the reference data for normalized residuals).
+The sensitivities are shared with the local sensitivity analysis (see
+`sensitivity.forward`), mappings which share a simulation (see
+`fitting.pruning`) use a single augmented integration.
+
+Mappings which are not supported by the sensitivity solver, i.e., simulations
+with multiple timecourses (sensitivities restart at every timecourse),
+model changes or observables which are not state variables, fall back to
+central differences of the observable. Central differences are also used for
+parameters which change the initial state of the model (the initial
+sensitivities of the solver are zero).
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+import scipy.optimize
+from sbmlsim.fit.options import (
+    LossFunctionType,
+    OptimizationAlgorithmType,
+    ResidualType,
+)
+from sbmlsim.simulation import TimecourseSim
+from sbmlsim.simulator.simulation_serial import SimulatorSerial
+from sbmlutils import log
+
+from pkdb_models.models.dapagliflozin.fitting.memo import CachedOptimizationProblem
+from pkdb_models.models.dapagliflozin.sensitivity.forward import (
+    forward_sensitivities,
+    initial_state_parameters,
+    species_compartments,
+)
+
+logger = log.get_logger(__name__)
+
+
+class JacobianOptimizationProblem(CachedOptimizationProblem):
+    """Optimization problem with Jacobian from forward sensitivities.
+
+    Supported for the linear loss function, the least square optimizer uses
+    `jacobian` instead of finite differences.
+    """
+
+    def __init__(self, *args, diff_step: float = 1e-3, **kwargs):
+        """
+        :param diff_step: step of the logarithmic parameters for the central
+            differences of the fallback
+        """
+        super(JacobianOptimizationProblem, self).__init__(*args, **kwargs)
+        self.diff_step = diff_step
+        self._compartments: Dict[str, Dict[str, str]] = {}
+        self._initial_state: Dict[str, List[int]] = {}
+
+    def _optimize_single(
+        self,
+        x0: np.ndarray = None,
+        algorithm=OptimizationAlgorithmType.LEAST_SQUARE,
+        **kwargs,
+    ) -> Tuple[scipy.optimize.OptimizeResult, List]:
+        """Run single optimization with the Jacobian from sensitivities."""
+        if algorithm == OptimizationAlgorithmType.LEAST_SQUARE:
+            if self.loss_function == LossFunctionType.LINEAR:
+                kwargs["jac"] = self.jacobian
+                kwargs.pop("diff_step", None)
+            else:
+                logger.warning(
+                    f"Jacobian from sensitivities requires linear loss function, "
+                    f"finite differences are used for '{self.loss_function}'."
+                )
+        return super(JacobianOptimizationProblem, self)._optimize_single(
+            x0=x0, algorithm=algorithm, **kwargs
+        )
+
+    def jacobian(self, xlog: np.ndarray) -> np.ndarray:
+        """Jacobian of the weighted residuals for the logarithmic parameters.
+
+        :param xlog: logarithmic parameter vector
+        :return: Jacobian (n_residuals, n_parameters)
+        """
+        x = np.power(10, xlog)
+        simulator: SimulatorSerial = self.runner.simulator
+        Q_ = self.runner.Q_
+        changes = {
+            self.pids[ix]: Q_(value, self.punits[ix]) for ix, value in enumerate(x)
+        }
+
+        # mappings which share a simulation
+        groups: Dict[Tuple[int, int], List[int]] = {}
+        for k, simulation in enumerate(self.simulations):
+            groups.setdefault((id(self.models[k]), id(simulation)), []).append(k)
+
+        derivatives: Dict[int, np.ndarray] = {}
+        for ks in groups.values():
+            # update initial changes
+            simulation: TimecourseSim = self.simulations[ks[0]]
+            simulation.timecourses[0].changes.update(changes)
+            simulator.set_model(model=self.models[ks[0]])
+            simulator.set_timecourse_selections(
+                selections=sorted(set().union(*(self.selections[k] for k in ks)))
+            )
+            simulation.normalize(uinfo=simulator.uinfo)
+
+            try:
+                # parameters of the initial state by central differences
+                fd = self._initial_state_indices(simulator, ks[0])
+                forward = [ix for ix in range(len(self.pids)) if ix not in fd]
+                dys = self._observable_derivatives(simulator, ks, forward)
+                for k in ks:
+                    dy = np.zeros(shape=(len(self.x_references[k]), len(self.pids)))
+                    indices = list(range(len(self.pids)))
+                    if k in dys:
+                        dy[:, forward] = dys[k]
+                        indices = fd
+                    if indices:
+                        dy[:, indices] = self._observable_differences(
+                            simulator, k, xlog, indices
+                        )
+                    derivatives[k] = dy
+            except RuntimeError as err:
+                # error in integration, no information on the gradient
+                logger.error(
+                    f"RuntimeError in ODE integration (jacobian) "
+                    f"('{self.pids} = {x}'): \n{err}"
+                )
+                for k in ks:
+                    derivatives[k] = np.zeros(
+                        shape=(len(self.x_references[k]), len(self.pids))
+                    )
+
+        parts = []
+        for k, _ in enumerate(self.mapping_keys):
+            dy = derivatives[k]
+            if self.residual in {
+                ResidualType.ABSOLUTE_TO_BASELINE,
+                ResidualType.NORMALIZED_TO_BASELINE,
+            }:
+                dy = dy - dy[0, :]
+            if self.residual in {
+                ResidualType.NORMALIZED,
+                ResidualType.NORMALIZED_TO_BASELINE,
+            }:
+                dy = dy / np.mean(self.y_references[k])
+
+            parts.append(dy * np.sqrt(self.weights[k])[:, np.newaxis])
+
+        return np.vstack(parts)
+
+    def _observable_derivatives(
+        self, simulator: SimulatorSerial, ks: List[int], indices: List[int]
+    ) -> Dict[int, np.ndarray]:
+        """Derivatives of the observables of mappings ks for the logarithmic parameters.
+
+        The mappings share a single simulation, the sensitivities are calculated
+        in one augmented integration.
+
+        :param indices: indices of the parameters
+        :return: derivatives (n_references, n_indices) of the mappings which are
+            supported by the sensitivity solver
+        """
+        simulation: TimecourseSim = self.simulations[ks[0]]
+        if (
+            not indices
+            or len(simulation.timecourses) != 1
+            or simulation.timecourses[0].model_changes
+        ):
+            return {}
+        ks = [k for k in ks if self.xid_observable[k] == "time"]
+        if not ks:
+            return {}
+
+        tc = simulation.timecourses[0]
+        pids = [self.pids[ix] for ix in indices]
+        values = np.array([tc.changes[pid].magnitude for pid in pids], dtype=float)
+        fs = forward_sensitivities(
+            simulator.r,
+            pids,
+            start=tc.start,
+            end=tc.end,
+            steps=tc.steps,
+            reset=lambda: self._apply_changes(simulator, simulation),
+            compartments=self._species_compartments(simulator, ks[0]),
+            concentrations=[
+                self.yid_observable[k]
+                for k in ks
+                if self.yid_observable[k].startswith("[")
+            ],
+        )
+        time = fs.time + simulation.time_offset
+
+        derivatives = {}
+        for k in ks:
+            dy = fs.derivative(self.yid_observable[k])
+            if dy is None:
+                continue
+            # derivatives for logarithmic parameters at the reference time points
+            dy = dy * values[:, np.newaxis] * np.log(10)
+            derivatives[k] = np.column_stack(
+                [np.interp(self.x_references[k], time, dy[kp]) for kp in range(len(pids))]
+            )
+        return derivatives
+
+    def _observable_differences(
+        self, simulator: SimulatorSerial, k: int, xlog: np.ndarray, indices: List[int]
+    ) -> np.ndarray:
+        """Central differences of the observable of mapping k (fallback).
+
+        :param indices: indices of the parameters
+        :return: derivatives (n_references, n_indices)
+        """
+        Q_ = self.runner.Q_
+        simulation: TimecourseSim = self.simulations[k]
+        x_ref = self.x_references[k]
+
+        def observable(xlog_k: np.ndarray) -> np.ndarray:
+            x = np.power(10, xlog_k)
+            changes = {
+                self.pids[ix]: Q_(value, self.punits[ix]) for ix, value in enumerate(x)
+            }
+            simulation.timecourses[0].changes.update(changes)
+            simulation.normalize(uinfo=simulator.uinfo)
+            df = simulator._timecourses([simulation])[0]
+            return np.interp(
+                x_ref, df[self.xid_observable[k]], df[self.yid_observable[k]]
+            )
+
+        dy = np.zeros(shape=(len(x_ref), len(indices)))
+        for kp, ix in enumerate(indices):
+            xlog_up = np.array(xlog, dtype=float)
+            xlog_up[ix] += self.diff_step
+            xlog_down = np.array(xlog, dtype=float)
+            xlog_down[ix] -= self.diff_step
+            dy[:, kp] = (observable(xlog_up) - observable(xlog_down)) / (
+                2 * self.diff_step
+            )
+
+        # restore the changes of the parameter vector
+        observable(xlog)
+        return dy
+
+    @staticmethod
+    def _apply_changes(
+        simulator: SimulatorSerial,
+        simulation: TimecourseSim,
+        changes: Dict[str, float] = None,
+    ) -> None:
+        """Reset model and apply the changes of the first timecourse.
+
+        :param changes: additional changes, e.g. of single parameters
+        """
+        r = simulator.r
+        if simulation.reset:
+            r.resetToOrigin()
+        for key, item in simulation.timecourses[0].changes.items():
+            try:
+                r[key] = float(item.magnitude)
+            except AttributeError:
+                r[key] = float(item)
+        for key, value in (changes or {}).items():
+            r[key] = value
+
+    def _species_compartments(
+        self, simulator: SimulatorSerial, k: int
+    ) -> Dict[str, str]:
+        """Compartments of the species of the model of mapping k."""
+        source = str(self.models[k].source)
+        if source not in self._compartments:
+            self._compartments[source] = species_compartments(simulator.r)
+        return self._compartments[source]
+
+    def _initial_state_indices(self, simulator: SimulatorSerial, k: int) -> List[int]:
+        """Indices of the parameters which change the initial state of mapping k."""
+        source = str(self.models[k].source)
+        if source not in self._initial_state:
+            simulation: TimecourseSim = self.simulations[k]
+            pids = initial_state_parameters(
+                simulator.r,
+                self.pids,
+                apply=lambda changes: self._apply_changes(
+                    simulator, simulation, changes
+                ),
+            )
+            self._initial_state[source] = [self.pids.index(pid) for pid in pids]
+            if pids:
+                logger.info(f"Central differences for initial state parameters: {pids}")
+        return self._initial_state[source]
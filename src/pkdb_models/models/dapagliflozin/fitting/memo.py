@@ -0,0 +1,150 @@
+"""Memo cache of the residuals of an optimization problem.
+
+Finite difference Jacobians, line searches and restarts of the least square
+optimizer evaluate parameter vectors which were already simulated. The
+`CachedOptimizationProblem` stores the residual vector for the rounded
+logarithmic parameter vector, so that every parameter vector is only
+simulated once. Hits and misses of a start are stored on its `OptimizeResult`.
+"""
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import scipy.optimize
+from pymetadata.console import console
+from sbmlsim.fit.optimization import OptimizationProblem
+from sbmlsim.fit.options import OptimizationAlgorithmType
+from sbmlsim.fit.result import OptimizationResult
+
+from pkdb_models.models.dapagliflozin.fitting.pruning import prune_optimization_problem
+
+
+class ResidualCache:
+    """In-memory cache of residual vectors with least recently used eviction."""
+
+    def __init__(self, max_size: int = 10000, decimals: int = 10):
+        """
+        :param max_size: maximal number of cached residual vectors
+        :param decimals: decimals of the logarithmic parameters in the key
+        """
+        self.max_size = max_size
+        self.decimals = decimals
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def key(self, xlog: np.ndarray) -> Tuple[float, ...]:
+        """Cache key of a logarithmic parameter vector."""
+        # adding 0.0 maps -0.0 to 0.0
+        xlog = np.round(np.asarray(xlog, dtype=float), self.decimals) + 0.0
+        return tuple(xlog.tolist())
+
+    def get(self, key: Tuple[float, ...]) -> Optional[np.ndarray]:
+        """Cached residuals for key, otherwise None."""
+        residuals = self._entries.get(key)
+        if residuals is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return residuals
+
+    def put(self, key: Tuple[float, ...], residuals: np.ndarray) -> None:
+        """Store residuals for key, evicts the least recently used entry if full."""
+        self._entries[key] = residuals
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CachedOptimizationProblem(OptimizationProblem):
+    """Optimization problem with memo cache of the residuals.
+
+    The cache is local to the process, i.e., every worker of a parallel fit
+    has its own cache. With a `bundle_path` the datasets of the fit bundle are
+    used for the initialization (see `fitting.bundle`), with `prune` the
+    simulations are reduced to the fit mappings (see `fitting.pruning`).
+    """
+
+    def __init__(
+        self,
+        *args,
+        cache_size: int = 10000,
+        cache_decimals: int = 10,
+        bundle_path: Optional[Path] = None,
+        prune: bool = True,
+        **kwargs,
+    ):
+        super(CachedOptimizationProblem, self).__init__(*args, **kwargs)
+        self.cache = ResidualCache(max_size=cache_size, decimals=cache_decimals)
+        self.bundle_path = bundle_path
+        self.prune = prune
+
+    def initialize(self, *args, **kwargs) -> None:
+        """Initialize optimization problem."""
+        if self.bundle_path is not None:
+            from pkdb_models.models.dapagliflozin.fitting.bundle import load_fit_bundle
+
+            load_fit_bundle(self.bundle_path, build=False)
+        super(CachedOptimizationProblem, self).initialize(*args, **kwargs)
+        if self.prune:
+            prune_optimization_problem(self)
+
+    def residuals(self, xlog: np.ndarray, complete_data=False):
+        """Calculate residuals for given parameter vector, cached."""
+        if complete_data:
+            return super(CachedOptimizationProblem, self).residuals(
+                xlog, complete_data=True
+            )
+        key = self.cache.key(xlog)
+        res_all = self.cache.get(key)
+        if res_all is None:
+            res_all = super(CachedOptimizationProblem, self).residuals(xlog)
+            self.cache.put(key, res_all)
+        else:
+            # store the local step
+            self._trajectory.append(
+                (np.power(10, xlog), 0.5 * np.sum(np.power(res_all, 2)))
+            )
+        return res_all.copy()
+
+    def _optimize_single(
+        self,
+        x0: np.ndarray = None,
+        algorithm=OptimizationAlgorithmType.LEAST_SQUARE,
+        **kwargs,
+    ) -> Tuple[scipy.optimize.OptimizeResult, List]:
+        """Run single optimization, hits and misses are stored on the result."""
+        hits, misses = self.cache.hits, self.cache.misses
+        opt_result, trajectory = super(
+            CachedOptimizationProblem, self
+        )._optimize_single(x0=x0, algorithm=algorithm, **kwargs)
+        opt_result.cache_hits = self.cache.hits - hits
+        opt_result.cache_misses = self.cache.misses - misses
+        return opt_result, trajectory
+
+
+def cache_statistics(opt_result: OptimizationResult) -> Tuple[int, int]:
+    """Hits and misses of the residual cache of all starts."""
+    hits = sum(getattr(fit, "cache_hits", 0) for fit in opt_result.fits)
+    misses = sum(getattr(fit, "cache_misses", 0) for fit in opt_result.fits)
+    return hits, misses
+
+
+def cache_report(opid: str, opt_result: OptimizationResult) -> None:
+    """Print residual cache statistics of the optimization."""
+    hits, misses = cache_statistics(opt_result)
+    total = hits + misses
+    ratio = hits / total if total else 0.0
+    console.print(
+        f"'{opid}' residual cache: {hits} hits, {misses} misses "
+        f"({ratio:.1%} of {total} evaluations cached)"
+    )
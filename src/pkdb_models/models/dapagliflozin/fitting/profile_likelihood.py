@@ -0,0 +1,371 @@
+"""Profile likelihood of the fitted parameters.
+
+Every fit parameter is stepped from its best fit value to its lower and upper
+bound on a grid in logarithmic space. At every grid point the remaining
+parameters are re-optimized by least squares, warm-started from the optimum
+of the neighbouring grid point. The two branches (down, up) of all parameters
+are independent and are calculated on a process pool.
+
+With the cost C = 0.5 * sum(r^2) of the weighted residuals the profile is
+reported as the difference 2 * (C - C_best). The confidence interval is the
+range in which the difference stays below the chi-square quantile with one
+degree of freedom (3.84 for 95%). The weighting of the residuals is heuristic,
+i.e., the intervals are approximate and mainly show whether a parameter is
+identifiable (finite interval within the bounds).
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.optimize
+from pymetadata.console import console
+from sbmlsim.fit import FitExperiment, FitParameter
+from sbmlsim.fit.optimization import OptimizationProblem
+from scipy import stats
+
+from pkdb_models.models.dapagliflozin.fitting.fitting import (
+    FitExperimentSubset,
+    create_optimization_problem,
+    fit_kwargs,
+    get_fit_experiments,
+    get_fit_parameters,
+    lsq_kwargs,
+)
+from pkdb_models.models.dapagliflozin.fitting.storage import INITIALIZE_KEYS
+
+
+def best_parameters(path: Path, parameters: List[FitParameter]) -> Dict[str, float]:
+    """Parameters of the best fit from an `optimization_result.tsv`."""
+    df = pd.read_csv(path, sep="\t")
+    best = df.loc[df.cost.idxmin()]
+    return {p.pid: float(best[p.pid]) for p in parameters}
+
+
+# optimization problem of a worker process, initialized once by the pool initializer
+_worker_problem: Optional[OptimizationProblem] = None
+
+
+def _init_worker(
+    fit_experiments: List[FitExperiment], parameters: List[FitParameter]
+) -> None:
+    """Create and initialize the optimization problem in the worker process."""
+    global _worker_problem
+    op = create_optimization_problem(
+        fit_experiments=fit_experiments, opid="profile", parameters=parameters
+    )
+    op.initialize(**{k: v for k, v in fit_kwargs.items() if k in INITIALIZE_KEYS})
+    op._trajectory = []
+    _worker_problem = op
+
+
+def _profile_branch(
+    kp: int, xlog_best: np.ndarray, grid: np.ndarray
+) -> Tuple[int, List[Dict]]:
+    """Profile of parameter kp along the grid (warm-started re-optimizations)."""
+    op = _worker_problem
+    n_par = len(xlog_best)
+    free = np.array([k for k in range(n_par) if k != kp], dtype=int)
+    lower = np.log10([op.parameters[k].lower_bound for k in free])
+    upper = np.log10([op.parameters[k].upper_bound for k in free])
+    optimizer_kwargs = {
+        k: v for k, v in lsq_kwargs.items() if k not in {"algorithm", "sampling"}
+    }
+
+    rows = []
+    z = xlog_best[free]
+    for step, value in enumerate(grid):
+        xlog = np.array(xlog_best, dtype=float)
+        xlog[kp] = value
+
+        def residuals(z: np.ndarray) -> np.ndarray:
+            xlog[free] = z
+            return op.residuals(xlog)
+
+        ts = time.time()
+        try:
+            if len(free) > 0:
+                opt_result = scipy.optimize.least_squares(
+                    fun=residuals,
+                    x0=np.clip(z, lower, upper),
+                    bounds=(lower, upper),
+                    **optimizer_kwargs,
+                )
+                z = opt_result.x
+                success, nfev = bool(opt_result.success), int(opt_result.nfev)
+            else:
+                success, nfev = True, 1
+            res = residuals(z)
+            cost = 0.5 * float(np.sum(np.power(res, 2)))
+        except RuntimeError as err:
+            console.print(f"Profile '{op.pids[kp]}' failed at {10**value}: {err}")
+            success, nfev, cost = False, 0, np.nan
+
+        row = {
+            "parameter": op.pids[kp],
+            "step": step,
+            "value": 10**value,
+            "cost": cost,
+            "success": success,
+            "nfev": nfev,
+            "duration": time.time() - ts,
+        }
+        row.update({pid: 10 ** xlog[k] for k, pid in enumerate(op.pids)})
+        rows.append(row)
+
+    return kp, rows
+
+
+class ProfileLikelihood:
+    """Profile likelihood of the fit parameters around the best fit."""
+
+    def __init__(
+        self,
+        fit_experiments: List[FitExperiment],
+        parameters: List[FitParameter],
+        best: Dict[str, float],
+        n_points: int = 10,
+        confidence: float = 0.95,
+        n_cores: int = 1,
+    ):
+        """
+        :param best: parameter values of the best fit
+        :param n_points: number of grid points from the best value to each bound
+        """
+        self.fit_experiments = fit_experiments
+        self.parameters = parameters
+        self.best = best
+        self.n_points = n_points
+        self.confidence = confidence
+        self.n_cores = n_cores
+
+        self.profile_df: Optional[pd.DataFrame] = None
+        self.ci_df: Optional[pd.DataFrame] = None
+
+    @property
+    def threshold(self) -> float:
+        """Threshold of the profile (chi-square quantile, one degree of freedom)."""
+        return float(stats.chi2.ppf(self.confidence, df=1))
+
+    def grids(self) -> List[Tuple[int, str, np.ndarray]]:
+        """Logarithmic grids of the branches (parameter index, direction, grid)."""
+        branches = []
+        for kp, p in enumerate(self.parameters):
+            xlog = np.log10(self.best[p.pid])
+            for direction, bound in [
+                ("down", np.log10(p.lower_bound)),
+                ("up", np.log10(p.upper_bound)),
+            ]:
+                grid = np.linspace(xlog, bound, self.n_points + 1)
+                branches.append((kp, direction, grid))
+        return branches
+
+    def calculate(self) -> pd.DataFrame:
+        """Calculate the profiles of all parameters."""
+        xlog_best = np.log10([self.best[p.pid] for p in self.parameters])
+        branches = self.grids()
+        console.print(
+            f"Profile likelihood: {len(self.parameters)} parameters, "
+            f"{len(branches) * (self.n_points + 1)} points"
+        )
+
+        results: Dict[Tuple[int, str], List[Dict]] = {}
+        initargs = (self.fit_experiments, self.parameters)
+        if self.n_cores <= 1:
+            _init_worker(*initargs)
+            for kp, direction, grid in branches:
+                _, rows = _profile_branch(kp, xlog_best, grid)
+                results[(kp, direction)] = rows
+        else:
+            with ProcessPoolExecutor(
+                max_workers=self.n_cores, initializer=_init_worker, initargs=initargs
+            ) as executor:
+                futures = {
+                    executor.submit(_profile_branch, kp, xlog_best, grid): direction
+                    for kp, direction, grid in branches
+                }
+                for future in as_completed(futures):
+                    kp, rows = future.result()
+                    direction = futures[future]
+                    results[(kp, direction)] = rows
+                    console.print(
+                        f"Profile '{self.parameters[kp].pid}' {direction} finished"
+                    )
+
+        dfs = []
+        for (kp, direction), rows in sorted(results.items()):
+            df = pd.DataFrame(rows)
+            df.insert(1, "direction", direction)
+            dfs.append(df)
+        df = pd.concat(dfs, ignore_index=True)
+        cost_best = df.cost.min()
+        df.insert(df.columns.get_loc("cost") + 1, "delta", 2 * (df.cost - cost_best))
+        self.profile_df = df
+        return df
+
+    def confidence_intervals(self) -> pd.DataFrame:
+        """Confidence intervals from the profiles.
+
+        Bounds are interpolated in logarithmic space; if the profile does not
+        exceed the threshold within the parameter bounds the bound is NaN.
+        """
+        rows = []
+        for p in self.parameters:
+            bounds = {}
+            for direction in ["down", "up"]:
+                df = self.profile_df[
+                    (self.profile_df.parameter == p.pid)
+                    & (self.profile_df.direction == direction)
+                ].sort_values("step")
+                values = np.log10(df.value.values)
+                delta = df.delta.values
+                bound = np.nan
+                idx = np.where(delta > self.threshold)[0]
+                if len(idx) > 0 and idx[0] > 0:
+                    k = idx[0]
+                    f = (self.threshold - delta[k - 1]) / (delta[k] - delta[k - 1])
+                    bound = 10 ** (values[k - 1] + f * (values[k] - values[k - 1]))
+                bounds[direction] = bound
+            rows.append(
+                {
+                    "parameter": p.pid,
+                    "unit": p.unit,
+                    "value": self.best[p.pid],
+                    "lower": bounds["down"],
+                    "upper": bounds["up"],
+                    "lower_bound": p.lower_bound,
+                    "upper_bound": p.upper_bound,
+                    "identifiable": bool(
+                        np.isfinite(bounds["down"]) and np.isfinite(bounds["up"])
+                    ),
+                }
+            )
+        self.ci_df = pd.DataFrame(rows)
+        return self.ci_df
+
+    def plot(self, path: Path) -> None:
+        """Plot the profiles of all parameters."""
+        from matplotlib import pyplot as plt
+
+        n = len(self.parameters)
+        ncols = min(n, 4)
+        nrows = int(np.ceil(n / ncols))
+        f, axes = plt.subplots(
+            nrows=nrows,
+            ncols=ncols,
+            figsize=(5 * ncols, 4 * nrows),
+            squeeze=False,
+            layout="constrained",
+        )
+        for ax in axes.flatten()[n:]:
+            ax.set_visible(False)
+        for ax, p in zip(axes.flatten(), self.parameters):
+            df = self.profile_df[self.profile_df.parameter == p.pid].sort_values(
+                "value"
+            )
+            ax.plot(df.value, df.delta, marker="o", color="black")
+            ax.axhline(self.threshold, linestyle="--", color="tab:red")
+            ax.axvline(self.best[p.pid], linestyle=":", color="tab:blue")
+            ax.set_xscale("log")
+            ax.set_xlabel(f"{p.pid} [{p.unit}]")
+            ax.set_ylabel("2·Δcost")
+            ax.set_ylim(bottom=0)
+        f.savefig(path, bbox_inches="tight")
+        plt.close(f)
+
+    def save(self, output_dir: Path) -> None:
+        """Save profiles and confidence intervals (TSV, PNG)."""
+        self.profile_df.to_csv(
+            output_dir / "profile_likelihood.tsv", sep="\t", index=False
+        )
+        self.ci_df.to_csv(
+            output_dir / "profile_likelihood_ci.tsv", sep="\t", index=False
+        )
+        self.plot(output_dir / "profile_likelihood.png")
+        console.print(f"Profile likelihood results in '{output_dir}'")
+
+
+def main() -> None:
+    """Entry point which calculates the profile likelihood of a fit.
+
+    The script is registered as `fit_dapagliflozin_profile` command.
+    """
+    import optparse
+    import sys
+
+    parser = optparse.OptionParser()
+    parser.add_option(
+        "-f",
+        "--fit",
+        action="store",
+        dest="fit",
+        help="Path to fit output folder with 'optimization_result.tsv'",
+    )
+    parser.add_option(
+        "-x",
+        "--subset",
+        action="store",
+        dest="subset",
+        help="Subset of the fit [PK, PD]",
+    )
+    parser.add_option(
+        "-c",
+        "--cores",
+        action="store",
+        dest="cores",
+        default="1",
+        help="Number of cores",
+    )
+    parser.add_option(
+        "-p",
+        "--points",
+        action="store",
+        dest="points",
+        default="10",
+        help="Number of profile points from the best value to each bound",
+    )
+
+    console.rule(style="white")
+    console.print(":wrench: PROFILE LIKELIHOOD DAPAGLIFLOZIN :wrench:")
+    console.rule(style="white")
+
+    options, args = parser.parse_args()
+
+    def _parser_message(text: str) -> None:
+        console.print(text)
+        parser.print_help()
+        console.rule(style="white")
+        sys.exit(1)
+
+    if not options.fit:
+        _parser_message("Required argument '--fit' missing.")
+    if not options.subset:
+        _parser_message("Required argument '--subset' missing.")
+
+    fit_dir = Path(options.fit)
+    fit_subset = FitExperimentSubset(str(options.subset))
+    parameters = get_fit_parameters(fit_subset=fit_subset)
+    best = best_parameters(fit_dir / "optimization_result.tsv", parameters=parameters)
+    console.print(best)
+
+    profile = ProfileLikelihood(
+        fit_experiments=get_fit_experiments(fit_subset=fit_subset),
+        parameters=parameters,
+        best=best,
+        n_points=int(options.points),
+        n_cores=int(options.cores),
+    )
+    profile.calculate()
+    console.print(profile.confidence_intervals())
+    profile.save(output_dir=fit_dir)
+
+
+if __name__ == "__main__":
+    """
+    Profile likelihood of the best fit of a fit run:
+
+    fit_dapagliflozin_profile --fit=fit/20250522_232217__18858/DAPAGLIFLOZIN_LSQ_PK --subset=PK --cores=10
+    """
+    main()
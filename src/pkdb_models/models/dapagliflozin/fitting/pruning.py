@@ -0,0 +1,150 @@
+"""Fit-aware pruning of the simulations of optimization problems.
+
+The optimization problem simulates the complete simulation of the task of
+every fit mapping with the selections of all task data of the experiment.
+After the metadata filters only a part of the mappings remains, e.g., the
+pharmacodynamics of a multiple dosing study are only observed on the first
+days. `prune_optimization_problem` reduces the simulations of the problem to
+what the fit mappings reference:
+
+- mappings of the same task share a single simulation, which is simulated
+  once per parameter vector (`SimulatorDeduplicated`),
+- only the observables of the mappings (and time) are selected,
+- the integration stops at the last data time point of the mappings, i.e.,
+  later timecourses are removed and the last timecourse is shortened.
+"""
+from copy import deepcopy
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from pymetadata.console import console
+from sbmlsim.fit.optimization import OptimizationProblem
+from sbmlsim.simulation import TimecourseSim
+from sbmlsim.simulator.simulation_serial import SimulatorSerial
+
+from pkdb_models.models.dapagliflozin.cache import canonical_simulation
+
+
+def truncate_simulation(simulation: TimecourseSim, t_end: float) -> TimecourseSim:
+    """Timecourse simulation which stops at time t_end.
+
+    The time t_end refers to the time of the concatenated results, i.e.,
+    including the time offset. A shortened timecourse keeps the step width of
+    the original timecourse and ends at the first time point of the original
+    grid at or after t_end, i.e., the results contain t_end and all time points
+    before t_end are identical to the complete simulation.
+    """
+    sim = deepcopy(simulation)
+    timecourses = []
+    t_offset = sim.time_offset
+    for tc in sim.timecourses:
+        timecourses.append(tc)
+        if tc.discard:
+            # pre-simulations are not part of the results
+            continue
+        if t_offset + tc.end >= t_end:
+            end = t_end - t_offset
+            if end > tc.start:
+                dt = (tc.end - tc.start) / tc.steps
+                steps = int(np.ceil((end - tc.start) / dt))
+                if tc.start + steps * dt < end:
+                    # rounding of the grid
+                    steps += 1
+                if steps < tc.steps:
+                    tc.end = tc.start + steps * dt
+                    tc.steps = steps
+            break
+        t_offset += tc.end
+    sim.timecourses = timecourses
+    return sim
+
+
+def _n_points(simulation: TimecourseSim) -> int:
+    """Number of output points of a timecourse simulation."""
+    return sum(tc.steps + 1 for tc in simulation.timecourses)
+
+
+def prune_optimization_problem(op: OptimizationProblem) -> pd.DataFrame:
+    """Reduce simulations and selections of an initialized problem to the mappings.
+
+    :return: DataFrame with the time points of the simulations before and
+        after pruning
+    """
+    # mappings which simulate the same task
+    groups: Dict[Tuple[int, int], List[int]] = {}
+    for k, simulation in enumerate(op.simulations):
+        groups.setdefault((id(op.models[k]), id(simulation)), []).append(k)
+
+    info = []
+    for ks in groups.values():
+        simulation = op.simulations[ks[0]]
+        t_end = max(float(np.max(op.x_references[k])) for k in ks)
+        pruned = truncate_simulation(simulation, t_end=t_end)
+        selections = sorted(
+            {"time"}
+            | {op.xid_observable[k] for k in ks}
+            | {op.yid_observable[k] for k in ks}
+        )
+        for k in ks:
+            op.simulations[k] = pruned
+            op.selections[k] = selections
+        info.append(
+            {
+                "experiment": op.experiment_keys[ks[0]],
+                "mappings": len(ks),
+                "timecourses": f"{len(pruned.timecourses)}/{len(simulation.timecourses)}",
+                "points": _n_points(pruned),
+                "points_full": _n_points(simulation) * len(ks),
+            }
+        )
+
+    # simulate shared simulations once
+    simulator = op.runner.simulator
+    op.set_simulator(
+        SimulatorDeduplicated(max_size=len(groups), **simulator.integrator_settings)
+    )
+
+    df = pd.DataFrame(info)
+    console.print(
+        f"'{op.opid}': {len(op.simulations)} mappings on {len(groups)} simulations, "
+        f"{df.points.sum()}/{df.points_full.sum()} time points"
+    )
+    return df
+
+
+class SimulatorDeduplicated(SimulatorSerial):
+    """Serial simulator which reuses the results of identical simulations.
+
+    Results are stored for the last `max_size` simulations, i.e., the shared
+    simulations of a single evaluation of the residuals.
+    """
+
+    def __init__(self, model=None, max_size: int = 100, **kwargs):
+        self.max_size = max_size
+        self._results: Dict[Tuple, pd.DataFrame] = {}
+        self._selections: Tuple[str, ...] = tuple()
+        super(SimulatorDeduplicated, self).__init__(model=model, **kwargs)
+
+    def set_timecourse_selections(self, selections) -> None:
+        """Set timecourse selection in model."""
+        self._selections = tuple(selections) if selections else tuple()
+        super(SimulatorDeduplicated, self).set_timecourse_selections(selections)
+
+    def _timecourses(self, simulations: List[TimecourseSim]) -> List[pd.DataFrame]:
+        dfs = []
+        for simulation in simulations:
+            key = (
+                id(self.model),
+                id(simulation),
+                self._selections,
+                canonical_simulation(simulation),
+            )
+            df = self._results.get(key)
+            if df is None:
+                df = self._timecourse(simulation)
+                if len(self._results) >= self.max_size:
+                    self._results.clear()
+                self._results[key] = df
+            dfs.append(df)
+        return dfs
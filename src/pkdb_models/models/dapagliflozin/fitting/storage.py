@@ -0,0 +1,321 @@
+"""Persistent storage of optimization runs.
+
+Every finished start of a multi-start optimization is appended to the
+`FitRunStore` as soon as it completes, i.e., a crashed or killed fit only
+loses the starts which were running. Per optimization problem the store
+contains
+
+- `runs.jsonl`: one line per finished start with parameters, cost, nfev,
+  timing and the start values,
+- `run_XXXXX.pkl`: the pickled scipy `OptimizeResult` and trajectory.
+
+The start values and seeds of all starts are derived from the seed of the fit,
+so that an interrupted fit can be resumed by skipping the stored starts.
+"""
+import json
+import os
+import pickle
+from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pymetadata.console import console
+from sbmlsim.fit import FitParameter
+from sbmlsim.fit.optimization import OptimizationProblem
+from sbmlsim.fit.options import OptimizationAlgorithmType
+from sbmlsim.fit.result import OptimizationResult
+from sbmlsim.fit.sampling import SamplingType, create_samples
+
+# arguments of `OptimizationProblem.initialize`
+INITIALIZE_KEYS = {
+    "residual",
+    "loss_function",
+    "weighting_curves",
+    "weighting_points",
+    "variable_step_size",
+    "relative_tolerance",
+    "absolute_tolerance",
+}
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (np.floating, np.integer, np.bool_)):
+        return value.item()
+    return value
+
+
+class FitRunStore:
+    """Append-only on-disk store of optimization runs."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def info_path(self) -> Path:
+        return self.path / "store.json"
+
+    def write_info(self, info: Dict[str, Any]) -> None:
+        """Store the settings of the fit."""
+        with open(self.info_path, "w") as f:
+            json.dump(info, f, indent=2)
+
+    def read_info(self) -> Dict[str, Any]:
+        """Settings of the fit."""
+        with open(self.info_path, "r") as f:
+            return json.load(f)
+
+    def opids(self) -> List[str]:
+        """Optimization problems with stored runs."""
+        return sorted(p.parent.name for p in self.path.glob("*/runs.jsonl"))
+
+    def _runs_path(self, opid: str) -> Path:
+        return self.path / opid / "runs.jsonl"
+
+    def runs(self, opid: str) -> Dict[int, Dict[str, Any]]:
+        """Records of the stored runs of the optimization problem."""
+        path = self._runs_path(opid)
+        records: Dict[int, Dict[str, Any]] = {}
+        if not path.exists():
+            return records
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # incomplete line of an interrupted write
+                    continue
+                records[record["run"]] = record
+        return records
+
+    def append(
+        self, opid: str, run: int, seed: int, fit: Any, trajectory: List
+    ) -> None:
+        """Append a finished run of the optimization problem."""
+        run_dir = self.path / opid
+        run_dir.mkdir(exist_ok=True)
+        pkl_path = run_dir / f"run_{run:05d}.pkl"
+        tmp_path = pkl_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump((fit, trajectory), f)
+        os.replace(tmp_path, pkl_path)
+
+        record = {
+            "run": run,
+            "seed": seed,
+            "success": bool(getattr(fit, "success", False)),
+            "cost": _json_value(getattr(fit, "cost", np.nan)),
+            "nfev": _json_value(getattr(fit, "nfev", None)),
+            "duration": _json_value(getattr(fit, "duration", None)),
+            "cache_hits": _json_value(getattr(fit, "cache_hits", None)),
+            "cache_misses": _json_value(getattr(fit, "cache_misses", None)),
+            "message": str(getattr(fit, "message", "")),
+            "x": _json_value(getattr(fit, "x", None)),
+            "x0": _json_value(getattr(fit, "x0", None)),
+            "pickle": pkl_path.name,
+        }
+        with open(self._runs_path(opid), "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self, opid: str) -> None:
+        """Remove all runs of the optimization problem."""
+        run_dir = self.path / opid
+        if run_dir.exists():
+            for p in run_dir.iterdir():
+                p.unlink()
+
+    def load_result(
+        self, opid: str, parameters: List[FitParameter]
+    ) -> OptimizationResult:
+        """OptimizationResult of the stored runs."""
+        fits = []
+        trajectories = []
+        for run, record in sorted(self.runs(opid).items()):
+            with open(self.path / opid / record["pickle"], "rb") as f:
+                fit, trajectory = pickle.load(f)
+            fits.append(fit)
+            trajectories.append(trajectory)
+        return OptimizationResult(
+            parameters=parameters, fits=fits, trajectories=trajectories
+        )
+
+
+# optimization problems of a worker process, only the problem in use is initialized
+_worker_problems: Dict[str, OptimizationProblem] = {}
+_worker_initialize_kwargs: Dict = {}
+_worker_active: Optional[Tuple[str, OptimizationProblem]] = None
+
+
+def _init_worker(
+    problems: Dict[str, OptimizationProblem], initialize_kwargs: Dict
+) -> None:
+    """Set the optimization problems of the worker process."""
+    global _worker_problems, _worker_initialize_kwargs, _worker_active
+    _worker_problems = problems
+    _worker_initialize_kwargs = initialize_kwargs
+    _worker_active = None
+
+
+def _worker_problem(opid: str) -> OptimizationProblem:
+    """Initialized optimization problem of the worker process.
+
+    Switching the problem releases the models of the previous problem.
+    """
+    global _worker_active
+    if _worker_active is None or _worker_active[0] != opid:
+        _worker_active = None
+        problem = deepcopy(_worker_problems[opid])
+        problem.initialize(**_worker_initialize_kwargs)
+        _worker_active = (opid, problem)
+    return _worker_active[1]
+
+
+def _optimize_start(
+    opid: str,
+    run: int,
+    x0: Optional[np.ndarray],
+    seed: int,
+    algorithm: OptimizationAlgorithmType,
+    kwargs: Dict,
+) -> Tuple[str, int, Any, List]:
+    """Run a single start of the optimization in the worker process."""
+    np.random.seed(seed)
+    fit, trajectory = _worker_problem(opid)._optimize_single(
+        x0=x0, algorithm=algorithm, **kwargs
+    )
+    return opid, run, fit, trajectory
+
+
+def run_optimizations_stored(
+    problems: List[OptimizationProblem],
+    store: FitRunStore,
+    size: int,
+    seed: int,
+    algorithm: OptimizationAlgorithmType,
+    sampling: SamplingType = SamplingType.LOGUNIFORM_LHS,
+    n_cores: int = 1,
+    resume: bool = False,
+    costs: Optional[Dict[str, float]] = None,
+    **kwargs,
+) -> Dict[str, OptimizationResult]:
+    """Run multi-start optimizations of independent problems on a shared pool.
+
+    The starts of all problems are scheduled on a single pool of `n_cores`
+    workers, so that cores which are not needed by a small problem are used by
+    the remaining problems. Problems are scheduled by decreasing estimated
+    `costs` (largest first), starts of a problem are scheduled consecutively.
+    Every finished start is stored.
+
+    :param resume: skip the starts which are in the store, otherwise the
+        stored runs of the problems are removed
+    :param costs: estimated cost of a single start per problem id
+    :return: OptimizationResult of all stored starts per problem id
+    """
+    initialize_kwargs = {k: v for k, v in kwargs.items() if k in INITIALIZE_KEYS}
+    kwargs = {k: v for k, v in kwargs.items() if k not in INITIALIZE_KEYS}
+    if costs is None:
+        costs = {}
+    problems = sorted(problems, key=lambda op: -costs.get(op.opid, 0.0))
+
+    # start values and seeds of all starts
+    seeds: Dict[str, np.ndarray] = {}
+    jobs: List[Tuple[str, int, Optional[np.ndarray], int]] = []
+    for problem in problems:
+        opid = problem.opid
+        x0s: List[Optional[np.ndarray]] = [None] * size
+        if algorithm == OptimizationAlgorithmType.LEAST_SQUARE:
+            x0s = list(
+                create_samples(
+                    parameters=problem.parameters,
+                    size=size,
+                    sampling=sampling,
+                    seed=seed,
+                ).values
+            )
+        seeds[opid] = np.random.RandomState(seed).randint(
+            low=1, high=2**31 - 1, size=size
+        )
+
+        if resume:
+            done = set(store.runs(opid))
+        else:
+            store.clear(opid)
+            done = set()
+        pending = [k for k in range(size) if k not in done]
+        console.print(
+            f"'{opid}': {size} starts, {len(done)} stored, {len(pending)} to run"
+        )
+        jobs.extend((opid, k, x0s[k], int(seeds[opid][k])) for k in pending)
+
+    problems_dict = {problem.opid: problem for problem in problems}
+    if jobs:
+        if n_cores <= 1:
+            _init_worker(problems_dict, initialize_kwargs)
+            for opid, k, x0, run_seed in jobs:
+                _, run, fit, trajectory = _optimize_start(
+                    opid, k, x0, run_seed, algorithm, kwargs
+                )
+                store.append(opid, run, run_seed, fit, trajectory)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=n_cores,
+                initializer=_init_worker,
+                initargs=(problems_dict, initialize_kwargs),
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        _optimize_start, opid, k, x0, run_seed, algorithm, kwargs
+                    )
+                    for opid, k, x0, run_seed in jobs
+                ]
+                for future in as_completed(futures):
+                    opid, run, fit, trajectory = future.result()
+                    store.append(opid, run, int(seeds[opid][run]), fit, trajectory)
+                    console.print(
+                        f"'{opid}' run {run}: cost={getattr(fit, 'cost', np.nan):.6g}"
+                    )
+
+    return {
+        problem.opid: store.load_result(problem.opid, parameters=problem.parameters)
+        for problem in problems
+    }
+
+
+def run_optimization_stored(
+    problem: OptimizationProblem,
+    store: FitRunStore,
+    size: int,
+    seed: int,
+    algorithm: OptimizationAlgorithmType,
+    sampling: SamplingType = SamplingType.LOGUNIFORM_LHS,
+    n_cores: int = 1,
+    resume: bool = False,
+    **kwargs,
+) -> OptimizationResult:
+    """Run multi-start optimization and store every finished start.
+
+    Drop-in replacement for `sbmlsim.fit.runner.run_optimization`. Starts are
+    distributed on a pool of `n_cores` workers.
+
+    :param resume: skip the starts which are in the store, otherwise the
+        stored runs of the problem are removed
+    :return: OptimizationResult of all stored starts
+    """
+    results = run_optimizations_stored(
+        problems=[problem],
+        store=store,
+        size=size,
+        seed=seed,
+        algorithm=algorithm,
+        sampling=sampling,
+        n_cores=n_cores,
+        resume=resume,
+        **kwargs,
+    )
+    return results[problem.opid]
@@ -1,4 +1,5 @@
-from typing import List, Type, Union
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Type, Union
 
 from pkdb_models.models.dapagliflozin import (
     DATA_PATHS,
@@ -7,11 +8,31 @@ from pkdb_models.models.dapagliflozin import (
     RESULTS_PATH_SIMULATION,
 )
 from sbmlsim.experiment import ExperimentRunner, SimulationExperiment
+from sbmlsim.experiment.experiment import ExperimentResult
 from sbmlsim.report.experiment_report import ExperimentReport, ReportResults
-from sbmlsim.simulator.simulation_serial import SimulatorSerial
+from pkdb_models.models.dapagliflozin.cache import (
+    SimulationCache,
+    SimulatorCached,
+    file_hash,
+)
+from pkdb_models.models.dapagliflozin.fingerprint import (
+    FingerprintManifest,
+    changed_entries,
+    experiment_fingerprint,
+    report_fragment,
+)
+from pkdb_models.models.dapagliflozin.output_grid import OutputGrid, data_times
+from pkdb_models.models.dapagliflozin.experiments.base_experiment import (
+    DapagliflozinSimulationExperiment,
+)
+from pkdb_models.models.dapagliflozin.planning import SimulationPlan
+from pkdb_models.models.dapagliflozin.steady_state import FastForward
 from sbmlutils import log
 from sbmlutils.console import console
 
+if TYPE_CHECKING:
+    from pkdb_models.models.dapagliflozin.result_store import ResultStore
+
 logger = log.get_logger(__name__)
 
 
@@ -20,36 +41,316 @@ def run_experiments(
         Type[SimulationExperiment], List[Type[SimulationExperiment]]
     ],
     output_dir: str,
+    n_jobs: int = 1,
+    cache: Optional[SimulationCache] = None,
+    fast_forward: Optional[FastForward] = None,
+    output_grid: Optional[OutputGrid] = None,
+    store_results: bool = True,
+    figures: bool = True,
+    incremental: bool = False,
 ):
-    """Execute given simulation experiment(s)."""
-    output_path = RESULTS_PATH_SIMULATION / output_dir
-    simulator = SimulatorSerial(model=MODEL_PATH)
+    """Execute given simulation experiment(s).
+
+    :param n_jobs: number of worker processes for the simulations, with
+        `n_jobs > 1` all simulations are run on a process pool and the figures
+        are saved on a figure pool.
+    :param cache: optional cache for the simulation results.
+    :param fast_forward: optional fast-forward of multiple dosing to the
+        periodic steady state.
+    :param output_grid: optional error-controlled output grid of the results,
+        the time points of the data are interpolated exactly.
+    :param store_results: store the results of all tasks in the result store
+        of the experiments, see `render_experiments`. Always True for
+        incremental runs.
+    :param figures: create figures and report of the experiments. Without
+        figures only the results are stored.
+    :param incremental: skip experiments with unchanged fingerprint and complete
+        outputs of a previous run, their results, figures and report fragments
+        are reused (see `fingerprint`). The results are stored, reused
+        experiments require the stored results of the previous run. Runs
+        without figures only require the stored results.
+    """
+    # process pools and figures are imported on use
+    from pkdb_models.models.dapagliflozin.parallel import SimulatorPool
+    from pkdb_models.models.dapagliflozin.rendering import FigurePool
 
+    output_path = RESULTS_PATH_SIMULATION / output_dir
+    if incremental:
+        store_results = True
+    integrator_settings = {
+        "absolute_tolerance": 1e-10,
+        "relative_tolerance": 1e-10,
+    }
     if isinstance(experiment_classes, SimulationExperiment):
         experiment_classes = [experiment_classes]
 
+    settings = {
+        "integrator": integrator_settings,
+        "fast_forward": fast_forward,
+        "output_grid": output_grid,
+    }
+    model_hash = file_hash(MODEL_PATH)
+    fingerprints = {
+        cls.__name__: experiment_fingerprint(
+            cls, MODEL_PATH, DATA_PATHS, settings, model_hash=model_hash
+        )
+        for cls in experiment_classes
+    }
+    reused: Dict[str, Dict] = {}
+    if incremental:
+        experiment_classes, reused = _skip_unchanged(
+            experiment_classes, fingerprints, output_path, figures=figures
+        )
+        if not experiment_classes:
+            console.print("All experiments are unchanged, nothing to simulate")
+            if figures:
+                create_report([], output_path, reused=reused)
+            return
+    for cls in experiment_classes:
+        # outputs are overwritten
+        FingerprintManifest(output_path / cls.__name__).remove()
+
+    if n_jobs > 1:
+        simulator = SimulatorPool(
+            model=MODEL_PATH,
+            n_jobs=n_jobs,
+            cache=cache,
+            fast_forward=fast_forward,
+            output_grid=output_grid,
+            **integrator_settings,
+        )
+    else:
+        simulator = SimulatorCached(
+            model=MODEL_PATH,
+            cache=cache,
+            fast_forward=fast_forward,
+            output_grid=output_grid,
+            **integrator_settings,
+        )
+
     runner = ExperimentRunner(
         experiment_classes=experiment_classes,
         data_path=DATA_PATHS,
         base_path=DAPAGLIFLOZIN_PATH,
         simulator=simulator,
-        absolute_tolerance=1e-10,
-        relative_tolerance=1e-10,
+        **integrator_settings,
     )
-    results = runner.run_experiments(
-        output_path=output_path,
-        show_figures=True,
-        save_results=False,
-        figure_formats=["png", "svg"],
-        reduced_selections=True,
+
+    if output_grid is not None:
+        simulator.output_grid = output_grid.with_times(
+            data_times(runner.experiments.values())
+        )
+
+    # identical simulations of all experiments are only simulated once
+    plan = SimulationPlan.from_experiments(
+        runner.experiments.values(), uinfo=simulator.uinfo
     )
+    plan.report()
+    if isinstance(simulator, SimulatorPool):
+        # all simulations are queued before the experiments are run
+        simulator.schedule(plan)
+    else:
+        simulator.set_plan(plan)
+
+    figure_pool = FigurePool(n_jobs=n_jobs) if (figures and n_jobs > 1) else None
+    DapagliflozinSimulationExperiment.figure_pool = figure_pool
+    try:
+        if figures:
+            results = runner.run_experiments(
+                output_path=output_path,
+                show_figures=True,
+                save_results=False,
+                figure_formats=["png", "svg"],
+                reduced_selections=True,
+            )
+        else:
+            # results are stored and released after every experiment
+            for experiment in runner.experiments.values():
+                experiment._run_tasks(simulator, reduced_selections=True)
+                store_results_experiment(output_path, experiment)
+                FingerprintManifest(output_path / experiment.sid).save(
+                    fingerprint=fingerprints[experiment.sid],
+                    task_ids=list(experiment._results.keys()),
+                )
+                experiment._results = None
+    finally:
+        if isinstance(simulator, SimulatorPool):
+            simulator.close()
+        if figure_pool is not None:
+            figure_pool.close()
+            DapagliflozinSimulationExperiment.figure_pool = None
+    console.print(f"Shared simulation results: {simulator.n_shared} solves saved")
+    if output_grid is not None:
+        console.print(
+            f"Output grid: {simulator.n_points}/{simulator.n_points_full} time points"
+        )
+    if cache is not None:
+        cache.report()
+
+    if not figures:
+        console.print(
+            f"Results of {len(runner.experiments)} experiments stored in "
+            f"'{output_path}', create figures with 'render_experiments'"
+        )
+        return
+
+    if store_results:
+        for experiment in runner.experiments.values():
+            store_results_experiment(output_path, experiment)
+        console.print(f"Results of {len(runner.experiments)} experiments stored")
+        for exp_result in results:
+            experiment = exp_result.experiment
+            FingerprintManifest(exp_result.output_path).save(
+                fingerprint=fingerprints[experiment.sid],
+                task_ids=list(experiment._results.keys()),
+                report=report_fragment(exp_result),
+            )
+
+    create_report(results, output_path, reused=reused)
+    console.print("Successfully executed simulation experiments", style="success")
+
+
+def result_store(output_path: Path, sid: str) -> "ResultStore":
+    """Result store of the experiment in the output directory."""
+    from pkdb_models.models.dapagliflozin.result_store import ResultStore
+
+    return ResultStore(output_path / sid / "results")
+
+
+def store_results_experiment(output_path: Path, experiment: SimulationExperiment) -> None:
+    """Store the results of all tasks of the experiment."""
+    store = result_store(output_path, experiment.sid)
+    for task_id, xres in experiment._results.items():
+        store.save(task_id, xres)
+
+
+def _skip_unchanged(
+    experiment_classes: List[Type[SimulationExperiment]],
+    fingerprints: Dict[str, Dict],
+    output_path: Path,
+    figures: bool = True,
+) -> Tuple[List[Type[SimulationExperiment]], Dict[str, Dict]]:
+    """Experiments which have to be run and report fragments of the skipped ones.
+
+    :param figures: figures of the skipped experiments are required
+    """
+    changed = []
+    reused: Dict[str, Dict] = {}
+    for cls in experiment_classes:
+        sid = cls.__name__
+        manifest = FingerprintManifest(output_path / sid)
+        if manifest.reusable(
+            fingerprints[sid], result_store(output_path, sid), figures=figures
+        ):
+            reused[sid] = manifest.report()
+            continue
+        previous = manifest.fingerprint()
+        if previous is None:
+            reason = "no previous run"
+        else:
+            entries = changed_entries(previous, fingerprints[sid])
+            reason = f"changed {', '.join(entries)}" if entries else "missing outputs"
+        console.print(f"'{sid}': {reason}")
+        changed.append(cls)
+
+    console.print(
+        f"Incremental run: {len(changed)} experiments changed, "
+        f"{len(reused)} unchanged experiments skipped"
+    )
+    return changed, reused
+
 
+def create_report(
+    results: List[ExperimentResult],
+    output_path: Path,
+    reused: Optional[Dict[str, Dict]] = None,
+) -> None:
+    """Create HTML report of the experiment results.
+
+    :param reused: report fragments of experiments from previous runs
+    """
     report_results = ReportResults()
     for exp_result in results:
         report_results.add_experiment_result(exp_result=exp_result)
+    if reused:
+        report_results.data.update(reused)
 
-    # create HTML report
     report = ExperimentReport(report_results, metadata=None)
     report.create_report(output_path, report_type=ExperimentReport.ReportType.HTML)
 
-    console.print("Successfully executed simulation experiments", style="success")
+
+def render_experiments(
+    experiment_classes: Union[
+        Type[SimulationExperiment], List[Type[SimulationExperiment]]
+    ],
+    output_dir: str,
+    n_jobs: int = 1,
+) -> None:
+    """Create figures and report of experiment(s) from the stored results.
+
+    The results of the tasks are loaded from the result store of a previous
+    `run_experiments`, no simulations are performed.
+
+    :param n_jobs: number of worker processes for saving the figures.
+    """
+    from pkdb_models.models.dapagliflozin.rendering import FigurePool
+
+    output_path = RESULTS_PATH_SIMULATION / output_dir
+    if isinstance(experiment_classes, SimulationExperiment):
+        experiment_classes = [experiment_classes]
+
+    runner = ExperimentRunner(
+        experiment_classes=experiment_classes,
+        data_path=DATA_PATHS,
+        base_path=DAPAGLIFLOZIN_PATH,
+    )
+
+    figure_pool = FigurePool(n_jobs=n_jobs) if n_jobs > 1 else None
+    DapagliflozinSimulationExperiment.figure_pool = figure_pool
+    try:
+        results = _render(runner, output_path)
+    finally:
+        if figure_pool is not None:
+            figure_pool.close()
+            DapagliflozinSimulationExperiment.figure_pool = None
+
+    for exp_result in results:
+        # figures of results-only runs are reused by incremental runs
+        FingerprintManifest(exp_result.output_path).add_report(
+            report_fragment(exp_result)
+        )
+    create_report(results, output_path)
+    console.print(
+        f"Successfully rendered {len(results)} simulation experiments", style="success"
+    )
+
+
+def _render(runner: ExperimentRunner, output_path: Path) -> List[ExperimentResult]:
+    """Run the experiments of the runner with the stored results."""
+    from pkdb_models.models.dapagliflozin.result_store import StoredResults
+
+    def _run_tasks(*args, **kwargs) -> None:
+        """Results are loaded from the result store."""
+
+    results = []
+    for sid, experiment in runner.experiments.items():
+        store = result_store(output_path, sid)
+        missing = set(experiment._tasks) - set(store.task_ids())
+        if missing:
+            console.print(
+                f"[red]'{sid}': no stored results for {sorted(missing)}, "
+                f"run the simulations first.[/red]"
+            )
+            continue
+        experiment._results = StoredResults(store, ureg=experiment.ureg)
+        experiment._run_tasks = _run_tasks
+        results.append(
+            experiment.run(
+                simulator=None,
+                output_path=output_path / sid,
+                show_figures=False,
+                save_results=False,
+                figure_formats=["png", "svg"],
+            )
+        )
+    return results
@@ -989,6 +989,68 @@ for sid, sdict in SUBSTANCES_BODY.items():
             ]
         )
 
+# -------------------------------------------------------------------------------------------------
+# Dosing schedule
+# -------------------------------------------------------------------------------------------------
+# Repeated oral dosing via events instead of chained timecourses. The first dose is
+# the oral dose PODOSE_{sid}, the k-th repeated dose is added to the oral dose at time
+# k * PODOSE_{sid}_tau, i.e., a regimen of 1 + PODOSE_{sid}_n doses is a single
+# timecourse. The triggers are false at the start of the timecourse, so that schedules
+# set via changes after a model reset are not missed. Disabled by default.
+_m.events = []
+for sid, sdict in SUBSTANCES_BODY.items():
+    if "PODOSE" in sdict:
+        _m.parameters.extend([
+            Parameter(
+                f"PODOSE_{sid}_dose",
+                0,
+                U.mg,
+                constant=True,
+                sboTerm=SBO.QUANTITATIVE_SYSTEMS_DESCRIPTION_PARAMETER,
+                name=f"repeated oral dose {sid} [mg]",
+            ),
+            Parameter(
+                f"PODOSE_{sid}_tau",
+                24 * 60,
+                U.min,
+                constant=True,
+                sboTerm=SBO.QUANTITATIVE_SYSTEMS_DESCRIPTION_PARAMETER,
+                name=f"dosing interval {sid} [min]",
+            ),
+            Parameter(
+                f"PODOSE_{sid}_n",
+                0,
+                U.dimensionless,
+                constant=True,
+                sboTerm=SBO.QUANTITATIVE_SYSTEMS_DESCRIPTION_PARAMETER,
+                name=f"number of repeated doses {sid}",
+            ),
+            Parameter(
+                f"PODOSE_{sid}_k",
+                0,
+                U.dimensionless,
+                constant=False,
+                sboTerm=SBO.QUANTITATIVE_SYSTEMS_DESCRIPTION_PARAMETER,
+                name=f"number of applied repeated doses {sid}",
+            ),
+        ])
+        _m.events.append(
+            Event(
+                f"EPODOSE_{sid}",
+                trigger=(
+                    f"(PODOSE_{sid}_k < PODOSE_{sid}_n) && "
+                    f"(time >= (PODOSE_{sid}_k + 1 dimensionless) * PODOSE_{sid}_tau)"
+                ),
+                trigger_initialValue=False,
+                trigger_persistent=True,
+                assignments={
+                    f"PODOSE_{sid}": f"PODOSE_{sid} + PODOSE_{sid}_dose",
+                    f"PODOSE_{sid}_k": f"PODOSE_{sid}_k + 1 dimensionless",
+                },
+                name=f"repeated oral dose {sid}",
+            )
+        )
+
 # -------------------------------------------------------------------------------------------------
 # AssignmentRules
 # -------------------------------------------------------------------------------------------------
@@ -517,6 +517,52 @@ _m.rules.extend([
     )
 ])
 
+# -------------------------------------
+# Urine collection intervals
+# -------------------------------------
+# Daily urine collections of multiple dosing studies reset the urinary glucose at
+# the end of every collection interval, i.e., at times k * COLLECT_tau. Disabled by
+# default (COLLECT_n = 0).
+_m.parameters.extend([
+    Parameter(
+        "COLLECT_tau",
+        24 * 60,
+        U.min,
+        constant=True,
+        sboTerm=SBO.QUANTITATIVE_SYSTEMS_DESCRIPTION_PARAMETER,
+        name="urine collection interval [min]",
+    ),
+    Parameter(
+        "COLLECT_n",
+        0,
+        U.dimensionless,
+        constant=True,
+        sboTerm=SBO.QUANTITATIVE_SYSTEMS_DESCRIPTION_PARAMETER,
+        name="number of urine collection intervals",
+    ),
+    Parameter(
+        "COLLECT_k",
+        0,
+        U.dimensionless,
+        constant=False,
+        sboTerm=SBO.QUANTITATIVE_SYSTEMS_DESCRIPTION_PARAMETER,
+        name="number of finished urine collection intervals",
+    ),
+])
+_m.events = [
+    Event(
+        "ECOLLECT",
+        trigger="(COLLECT_k < COLLECT_n) && (time >= (COLLECT_k + 1 dimensionless) * COLLECT_tau)",
+        trigger_initialValue=False,
+        trigger_persistent=True,
+        assignments={
+            "glc_urine": "0 mmole",
+            "COLLECT_k": "COLLECT_k + 1 dimensionless",
+        },
+        name="end of urine collection interval",
+    )
+]
+
 model_kidney = _m
 
 
@@ -0,0 +1,166 @@
+"""Error-controlled output grid of timecourse results.
+
+Timecourses are simulated on uniform grids with a fixed number of `steps`
+(e.g. 4000 steps of the parameter scans), most of the points are in the slow
+elimination tail. The `OutputGrid` reduces the results to the time points
+which are required to represent every timecourse by linear interpolation
+within the tolerance
+
+    |y(t) - y_interp(t)| <= atol + rtol * max|y|
+
+at all time points of the full grid. The grid is dense during absorption
+and around tmax and sparse in the tail. The reduction is done on the results
+of a complete scan at once, so that all scan points share the reduced grid
+(required by the `XResult`). Always kept are
+
+- the first two and the last time point of every timecourse (doses,
+  changes, spacing of the full grid),
+- the minimum and maximum of every variable (Cmax and tmax are exact),
+- the time points of the full grid around the `times` (data time points and
+  the PK/PD evaluation times, e.g. UGE over 24 hr), i.e., results
+  interpolated at these time points and the nearest time points are
+  identical to the full grid.
+
+Integration is not affected, cached results are stored on the full grid.
+Quantities which depend on the density of the time points, e.g., the
+regression of the terminal phase in the pharmacokinetics, are calculated on
+the full grid restored by `restore_grid`.
+"""
+from dataclasses import dataclass, replace
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sbmlsim.experiment import SimulationExperiment
+
+# time points [min] of PK/PD evaluations of the results (UGE over 24 hr)
+EVALUATION_TIMES: Tuple[float, ...] = (24 * 60,)
+
+
+@dataclass(frozen=True)
+class OutputGrid:
+    """Settings of the error-controlled output grid.
+
+    :param rtol: relative tolerance of the linear interpolation (relative to
+        the maximal absolute value of the variable)
+    :param atol: absolute tolerance of the linear interpolation
+    :param times: time points [min] which are interpolated exactly, by default
+        the PK/PD evaluation times
+    """
+
+    rtol: float = 1e-4
+    atol: float = 1e-12
+    times: Tuple[float, ...] = EVALUATION_TIMES
+
+    def with_times(self, times: Iterable[float]) -> "OutputGrid":
+        """Output grid with the additional time points."""
+        return replace(self, times=tuple(sorted(set(self.times) | set(times))))
+
+
+def data_times(experiments: Iterable[SimulationExperiment]) -> List[float]:
+    """Time points [min] of the reference data of the fit mappings."""
+    times = set()
+    for experiment in experiments:
+        for mapping in experiment._fit_mappings.values():
+            x = mapping.reference.x.get_data()
+            times.update(np.atleast_1d(x.to("min").magnitude).tolist())
+    return sorted(times)
+
+
+def _segments(time: np.ndarray) -> List[Tuple[int, int]]:
+    """Index ranges [start, end] of the timecourses in concatenated results."""
+    starts = np.concatenate([[0], np.nonzero(np.diff(time) <= 0)[0] + 1])
+    ends = np.concatenate([starts[1:] - 1, [len(time) - 1]])
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _simplify(
+    t: np.ndarray, y: np.ndarray, tol: np.ndarray, keep: np.ndarray
+) -> np.ndarray:
+    """Douglas-Peucker reduction of the series y (n_time, n_series).
+
+    Points are added between the kept points until the linear interpolation
+    of every series is within tol at all points.
+    """
+    fixed = np.nonzero(keep)[0]
+    stack = list(zip(fixed[:-1].tolist(), fixed[1:].tolist()))
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        w = (t[i + 1 : j] - t[i]) / (t[j] - t[i])
+        y_interp = y[i] + w[:, np.newaxis] * (y[j] - y[i])
+        err = np.max(np.abs(y[i + 1 : j] - y_interp) / tol, axis=1)
+        k = int(np.argmax(err))
+        if err[k] > 1.0:
+            k += i + 1
+            keep[k] = True
+            stack.extend([(i, k), (k, j)])
+    return keep
+
+
+def reduce_timecourses(
+    dfs: Sequence[pd.DataFrame], grid: OutputGrid
+) -> List[pd.DataFrame]:
+    """Results of all timecourses on the common error-controlled grid.
+
+    Results on different time grids are returned unchanged.
+    """
+    if not dfs:
+        return list(dfs)
+    time = dfs[0]["time"].values
+    if any(
+        len(df) != len(time) or not np.array_equal(df["time"].values, time)
+        for df in dfs[1:]
+    ):
+        return list(dfs)
+
+    columns = [c for c in dfs[0].columns if c != "time"]
+    if not columns:
+        return list(dfs)
+    y = np.hstack([df[columns].values.astype(float) for df in dfs])
+    y = np.nan_to_num(y)
+    tol = grid.atol + grid.rtol * np.max(np.abs(y), axis=0)
+    tol = np.where(tol > 0, tol, np.finfo(float).tiny)
+
+    keep = np.zeros(len(time), dtype=bool)
+    keep[np.argmax(y, axis=0)] = True
+    keep[np.argmin(y, axis=0)] = True
+    if grid.times:
+        idx = np.searchsorted(time, np.asarray(grid.times), side="left")
+        inside = (idx > 0) & (idx < len(time))
+        keep[idx[inside]] = True
+        keep[idx[inside] - 1] = True
+    for start, end in _segments(time):
+        keep[start : start + 2] = True
+        keep[end] = True
+        _simplify(
+            time[start : end + 1], y[start : end + 1], tol, keep[start : end + 1]
+        )
+
+    return [df.iloc[keep] for df in dfs]
+
+
+
+def restore_grid(time: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Results of a reduced grid on the uniform full grid.
+
+    The full grid is restored from the spacing of the first two time points,
+    values are interpolated linearly. Results which are not on a reduced
+    uniform grid are returned unchanged.
+
+    :param time: time vector (n_time,)
+    :param y: results (n_scan, n_time)
+    :return: time vector and results on the full grid
+    """
+    if len(time) < 3 or np.any(np.diff(time) <= 0):
+        return time, y
+    h = time[1] - time[0]
+    k = (time - time[0]) / h
+    steps = int(np.rint(k[-1]))
+    if steps + 1 <= len(time) or not np.allclose(k, np.rint(k), rtol=0, atol=1e-6):
+        return time, y
+    t_full = np.linspace(time[0], time[-1], steps + 1)
+    j = np.clip(np.searchsorted(time, t_full, side="right") - 1, 0, len(time) - 2)
+    w = (t_full - time[j]) / (time[j + 1] - time[j])
+    return t_full, y[:, j] + w * (y[:, j + 1] - y[:, j])
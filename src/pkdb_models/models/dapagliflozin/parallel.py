@@ -0,0 +1,210 @@
+"""Parallel execution of dapagliflozin simulation experiments.
+
+The `SimulatorPool` is a drop-in replacement for the `SimulatorSerial` used by
+the `ExperimentRunner`. Worker processes load the flattened model once and take
+`TimecourseSim` tasks from the shared queue of a process pool. All tasks of the
+selected experiments are scheduled before the experiments are run, so that the
+experiments only collect the finished results.
+
+Workers use the same model file, integrator settings and fast-forward settings
+as the serial simulator, so results are identical to the serial results. Only the unique
+simulations of the `SimulationPlan` which are not cached are scheduled. At most
+`max_pending` simulations are submitted or finished but not yet consumed, i.e.,
+the results of a plan do not pile up in the main process. With a cache, finished
+results are written to the cache and released immediately.
+"""
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import pandas as pd
+from sbmlsim.simulation import TimecourseSim
+from sbmlsim.simulator.simulation_serial import SimulatorSerial
+from sbmlutils import log
+from sbmlutils.console import console
+
+from pkdb_models.models.dapagliflozin.cache import (
+    SimulationCache,
+    SimulatorCached,
+    select_columns,
+)
+from pkdb_models.models.dapagliflozin.planning import SimulationPlan
+from pkdb_models.models.dapagliflozin.steady_state import FastForward
+
+logger = log.get_logger(__name__)
+
+
+# simulator of a worker process, created once by the pool initializer
+_worker_simulator: Optional[SimulatorSerial] = None
+_worker_selections: Optional[List[str]] = None
+
+
+def _init_worker(
+    model_path: str,
+    integrator_settings: Dict[str, Any],
+    fast_forward: Optional[FastForward] = None,
+) -> None:
+    """Load the model in the worker process."""
+    global _worker_simulator
+    if fast_forward is None:
+        _worker_simulator = SimulatorSerial(model=model_path, **integrator_settings)
+    else:
+        _worker_simulator = SimulatorCached(
+            model=model_path, fast_forward=fast_forward, **integrator_settings
+        )
+
+
+def _simulate_timecourse(
+    simulation: TimecourseSim, selections: List[str]
+) -> pd.DataFrame:
+    """Simulate a single timecourse in the worker process."""
+    global _worker_selections
+    if selections != _worker_selections:
+        _worker_simulator.set_timecourse_selections(selections)
+        _worker_selections = selections
+    return _worker_simulator._timecourse(simulation)
+
+
+class SimulatorPool(SimulatorCached):
+    """Simulator distributing timecourse simulations on a process pool.
+
+    Every worker loads the model from `model_path` once. Timecourse simulations
+    are either scheduled in advance via `schedule` or submitted on demand when
+    the results are requested.
+    """
+
+    def __init__(
+        self,
+        model: Union[str, Path],
+        n_jobs: Optional[int] = None,
+        cache: Optional[SimulationCache] = None,
+        max_pending: Optional[int] = None,
+        **kwargs,
+    ):
+        """
+        :param n_jobs: number of worker processes
+        :param max_pending: maximal number of submitted simulations which are not
+            consumed, defaults to four times the number of workers
+        """
+        self.n_jobs: int = n_jobs if n_jobs else os.cpu_count()
+        self.max_pending: int = max_pending if max_pending else 4 * self.n_jobs
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        self._simulations: Dict[str, TimecourseSim] = {}
+        self._queue: Dict[str, List[str]] = {}
+        super(SimulatorPool, self).__init__(model=model, cache=cache, **kwargs)
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Process pool, workers are started on first use."""
+        if self._executor is None:
+            console.print(f"Starting simulation pool with {self.n_jobs} workers")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.n_jobs,
+                initializer=_init_worker,
+                initargs=(self.model_path, dict(self.settings), self.fast_forward),
+            )
+        return self._executor
+
+    def close(self) -> None:
+        """Cancel pending simulations and shut down the worker processes."""
+        self._pending.clear()
+        self._simulations.clear()
+        self._queue.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self) -> "SimulatorPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def set_model(self, model) -> None:
+        """Set model in main process, workers are restarted for a new model file."""
+        model_path = getattr(self, "model_path", None)
+        super(SimulatorPool, self).set_model(model)
+        if self.model_path != model_path:
+            self.close()
+
+    def set_integrator_settings(self, **kwargs) -> None:
+        """Set integrator settings in main process and workers.
+
+        Changed settings restart the workers, pending simulations are discarded.
+        """
+        settings = dict(self.settings)
+        super(SimulatorPool, self).set_integrator_settings(**kwargs)
+        if self.settings != settings:
+            self.close()
+
+    def schedule(self, plan: SimulationPlan) -> None:
+        """Schedule the unique simulations of the plan.
+
+        Simulations are submitted in order of the plan, i.e., in the order in
+        which the experiments consume the results, at most `max_pending` at once.
+        """
+        self.set_plan(plan)
+        for key, sim in plan.simulations.items():
+            if self.cache is not None and self.cache.contains(self.cache_key(sim)):
+                continue
+            self._simulations[key] = sim
+            self._queue[key] = sorted(plan.selections[key])
+        console.print(
+            f"Scheduled {len(self._queue)} timecourse simulations on the pool"
+        )
+        self._submit_queued()
+
+    def _release_finished(self) -> None:
+        """Write finished results to the cache and release them.
+
+        Failed simulations are kept, the error is raised on consumption.
+        """
+        if self.cache is None:
+            return
+        for key, future in list(self._pending.items()):
+            if not future.done() or future.exception() is not None:
+                continue
+            self.cache.put(self.cache_key(self._simulations.pop(key)), future.result())
+            del self._pending[key]
+
+    def _submit_queued(self) -> None:
+        """Submit queued simulations until `max_pending` are pending."""
+        self._release_finished()
+        while self._queue and len(self._pending) < self.max_pending:
+            key = next(iter(self._queue))
+            selections = self._queue.pop(key)
+            self._pending[key] = self.executor.submit(
+                _simulate_timecourse, self._simulations[key], selections
+            )
+
+    def _run_timecourses(
+        self, simulations: List[TimecourseSim], keys: List[str]
+    ) -> List[pd.DataFrame]:
+        """Run timecourse simulations on the pool and collect the results."""
+        futures = []
+        for sim, key in zip(simulations, keys):
+            future = self._pending.pop(key, None)
+            if future is None:
+                # not submitted yet or released to the cache
+                self._queue.pop(key, None)
+                future = self.executor.submit(
+                    _simulate_timecourse, sim, self.run_selections(key)
+                )
+            self._simulations.pop(key, None)
+            futures.append(future)
+        # keep the workers busy while the results are collected
+        self._submit_queued()
+
+        dfs = []
+        for sim, key, future in zip(simulations, keys, futures):
+            df: pd.DataFrame = future.result()
+            if select_columns(df, self.run_selections(key)) is None:
+                # scheduled without the selections of the task
+                df = self.executor.submit(
+                    _simulate_timecourse, sim, self.run_selections(key)
+                ).result()
+            dfs.append(df)
+        self._submit_queued()
+        return dfs
@@ -1,12 +1,248 @@
-"""Dapagliflozin pharmacokinetics."""
-import pandas as pd
+"""Dapagliflozin pharmacokinetics.
+
+The pharmacokinetic parameters of all timecourses of a scan are calculated
+in a single call of the vectorized `pk_kernel` on the `(scan, time)` arrays of
+magnitudes. Units are resolved once per array via `pk_units`. The calculation
+follows `pkdb_analysis.pk.pharmacokinetics.TimecoursePK`, i.e., the results
+are identical to the results of `TimecoursePK` for the individual timecourses.
+"""
+import warnings
+from typing import Dict, Optional, Tuple, Union
 
-from pkdb_analysis.pk.pharmacokinetics import TimecoursePK
+import numpy as np
+import pandas as pd
+from pint import Unit, UnitRegistry
+from scipy import stats
 from sbmlsim.result import XResult
 from sbmlutils.log import get_logger
 
+from pkdb_models.models.dapagliflozin.output_grid import restore_grid
+
 logger = get_logger(__name__)
 
+# columns of `PKParameters.to_dict`
+PK_PARAMETERS = [
+    "auc", "aucinf", "tmax", "cmax", "tmaxhalf", "cmaxhalf", "kel", "thalf",
+    "dose", "vd", "vdss", "cl",
+]
+REGRESSION_PARAMETERS = ["slope", "intercept", "r_value", "p_value", "std_err", "max_idx"]
+
+
+def pk_units(
+    ureg: UnitRegistry,
+    time_unit: Union[str, Unit],
+    concentration_unit: Union[str, Unit],
+    dose_unit: Optional[Union[str, Unit]] = None,
+) -> Dict[str, Tuple[float, Unit]]:
+    """Conversion factors and units of the pk parameters.
+
+    The units are derived with the unit arithmetic of `TimecoursePK`, so that
+    magnitudes calculated in the time, concentration and dose units can be
+    converted to the units reported by `TimecoursePK` by a single factor.
+
+    :param dose_unit: unit of the dose, None if no dose is given
+    :return: dictionary of parameter: (factor, unit)
+    """
+    Q_ = ureg.Quantity
+    t = Q_(1.0, time_unit)
+    c = Q_(1.0, concentration_unit)
+    dose = Q_(1.0, dose_unit if dose_unit else "mg")
+
+    auc = t * c
+    slope = Q_(1.0, ureg.Unit(f"1/{t.units}"))
+    intercept = Q_(1.0, c.units)
+    kel = slope
+    thalf = 1 / kel
+    aucinf = auc
+    if dose_unit:
+        vdss = dose / Q_(1.0, intercept.units)
+        vd = dose / (aucinf * kel)
+        cl = kel * vd
+    else:
+        vd_units = dose.units / (auc.units / kel.units)
+        vdss = Q_(1.0, vd_units)
+        vd = Q_(1.0, vd_units)
+        cl = Q_(1.0, kel.units * vd.units)
+    for vd_par in [vd, vdss]:
+        if vd_par.check("[length] ** 3"):
+            vd_par.ito("liter")
+        elif vd_par.check("[length] ** 3/[mass]"):
+            vd_par.ito("liter/kg")
+
+    quantities = {
+        "auc": auc.to_reduced_units(),
+        "aucinf": aucinf.to_reduced_units(),
+        "tmax": t.to_reduced_units(),
+        "cmax": c.to_reduced_units(),
+        "tmaxhalf": t.to_reduced_units(),
+        "cmaxhalf": c.to_reduced_units(),
+        "kel": kel.to_reduced_units(),
+        "thalf": thalf.to_reduced_units(),
+        "dose": dose.to_reduced_units(),
+        "vd": vd,
+        "vdss": vdss,
+        "cl": cl.to_reduced_units(),
+        "slope": slope.to_reduced_units(),
+        "intercept": intercept.to_reduced_units(),
+    }
+    return {key: (q.magnitude, q.units) for key, q in quantities.items()}
+
+
+def pk_kernel(
+    time: np.ndarray,
+    concentration: np.ndarray,
+    dose: Optional[np.ndarray] = None,
+    min_treshold: float = 1e8,
+) -> Dict[str, np.ndarray]:
+    """Pharmacokinetic parameters of multiple timecourses.
+
+    Calculates AUC(end), AUC(inf), cmax, tmax, kel, thalf, vd, vdss and cl
+    as in `TimecoursePK` for all rows of the concentration array at once.
+    All values are magnitudes in the units of time, concentration and dose.
+
+    :param time: time vector (n_time,) or array (n_scan, n_time)
+    :param concentration: concentration array (n_scan, n_time)
+    :param dose: dose vector (n_scan,), None if no dose is given
+    :param min_treshold: concentrations below cmax/min_treshold are ignored
+    :return: dictionary of parameter: (n_scan,) array
+    """
+    c = np.array(concentration, dtype=float, ndmin=2)
+    n, m = c.shape
+    t = np.broadcast_to(np.asarray(time, dtype=float), c.shape)
+    rows = np.arange(n)
+    idx = np.arange(m)
+
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+
+        # for numerical simulations problems in calculations can arise
+        # if values are getting too small
+        cmin = np.nanmin(np.where(c != 0, c, np.nan), axis=1)
+        cmax = np.nanmax(c, axis=1)
+        small = (min_treshold * cmin < cmax)[:, np.newaxis] & (
+            c * min_treshold < cmax[:, np.newaxis]
+        )
+        c[small] = np.nan
+        valid = ~np.isnan(c)
+        has_valid = valid.any(axis=1)
+
+        # auc via trapezoid rule between consecutive non-nan values
+        last = np.maximum.accumulate(np.where(valid, idx, -1), axis=1)
+        prev = np.hstack([np.full((n, 1), -1), last[:, :-1]])
+        pair = valid & (prev >= 0)
+        prev = np.maximum(prev, 0)
+        c_prev = np.take_along_axis(c, prev, axis=1)
+        t_prev = np.take_along_axis(t, prev, axis=1)
+        auc = np.sum(np.where(pair, (t - t_prev) * (c + c_prev) / 2.0, 0.0), axis=1)
+        c_last = c[rows, last[:, -1]]
+
+        # maximum
+        max_idx = np.argmax(np.where(valid, c, -np.inf), axis=1)
+        tmax = np.where(has_valid, t[rows, max_idx], np.nan)
+        cmax = np.where(has_valid, c[rows, max_idx], np.nan)
+
+        # half maximum before the maximum
+        before = idx[np.newaxis, :] < max_idx[:, np.newaxis]
+        d_half = np.where(
+            before & valid, np.abs(c - 0.5 * cmax[:, np.newaxis]), np.inf
+        )
+        half_idx = np.argmin(d_half, axis=1)
+        has_half = (max_idx > 0) & np.any(before & valid, axis=1)
+        tmaxhalf = np.where(has_half, t[rows, half_idx], np.nan)
+        cmaxhalf = np.where(has_half, c[rows, half_idx], np.nan)
+
+        # ordinary least squares on log concentrations after the maximum,
+        # at least three data points after maximum are required
+        has_regression = has_valid & (max_idx <= m - 4)
+        y = np.log(c)
+        w = (idx[np.newaxis, :] > max_idx[:, np.newaxis]) & ~np.isnan(y)
+        n_w = w.sum(axis=1)
+        xmean = np.sum(np.where(w, t, 0.0), axis=1) / n_w
+        ymean = np.sum(np.where(w, y, 0.0), axis=1) / n_w
+        dx = np.where(w, t - xmean[:, np.newaxis], 0.0)
+        dy = np.where(w, y - ymean[:, np.newaxis], 0.0)
+        ssxm = np.sum(dx * dx, axis=1) / n_w
+        ssym = np.sum(dy * dy, axis=1) / n_w
+        ssxym = np.sum(dx * dy, axis=1) / n_w
+
+        degenerate = (ssxm == 0.0) | (ssym == 0.0)
+        r_value = np.clip(ssxym / np.sqrt(ssxm * ssym), -1.0, 1.0)
+        r_value = np.where(degenerate, np.where(ssxym == 0, np.nan, 0.0), r_value)
+        slope = ssxym / ssxm
+        intercept = ymean - slope * xmean
+        df = n_w - 2
+        t_stat = r_value * np.sqrt(df / ((1.0 - r_value + 1.0e-20) * (1.0 + r_value + 1.0e-20)))
+        p_value = 2 * stats.t.sf(np.abs(t_stat), df)
+        std_err = np.sqrt((1 - r_value**2) * ssym / ssxm / df)
+        # two data points define the regression line
+        two = n_w == 2
+        p_value = np.where(two, np.where(dy.any(axis=1), 0.0, 1.0), p_value)
+        std_err = np.where(two, 0.0, std_err)
+
+        # a positive slope is physically not meaningful
+        positive = slope > 0.0
+        slope = np.where(has_regression & ~positive, slope, np.nan)
+        intercept = np.where(has_regression & ~positive, intercept, np.nan)
+        r_value = np.where(has_regression, r_value, np.nan)
+        p_value = np.where(has_regression, p_value, np.nan)
+        std_err = np.where(has_regression, std_err, np.nan)
+        max_idx = np.where(has_regression, max_idx, np.nan)
+
+        kel = -slope
+        thalf = np.log(2) / kel
+        aucinf = auc + (-c_last / slope)
+
+        if dose is None:
+            dose = np.full(n, np.nan)
+        dose = np.broadcast_to(np.asarray(dose, dtype=float), (n,))
+        vd = dose / (aucinf * kel)
+        vdss = dose / np.exp(intercept)
+        cl = kel * vd
+
+    return {
+        "auc": auc,
+        "aucinf": aucinf,
+        "tmax": tmax,
+        "cmax": cmax,
+        "tmaxhalf": tmaxhalf,
+        "cmaxhalf": cmaxhalf,
+        "kel": kel,
+        "thalf": thalf,
+        "dose": dose,
+        "vd": vd,
+        "vdss": vdss,
+        "cl": cl,
+        "slope": slope,
+        "intercept": intercept,
+        "r_value": r_value,
+        "p_value": p_value,
+        "std_err": std_err,
+        "max_idx": max_idx,
+    }
+
+
+def pk_dataframe(
+    pk: Dict[str, np.ndarray],
+    units: Dict[str, Tuple[float, Unit]],
+    compound: str,
+) -> pd.DataFrame:
+    """DataFrame of pk parameters with the columns of `PKParameters.to_dict`."""
+    d = {"compound": compound}
+    for key in PK_PARAMETERS:
+        factor, unit = units[key]
+        d[key] = pk[key] * factor
+        d[f"{key}_unit"] = unit
+    for key in REGRESSION_PARAMETERS:
+        if key in units:
+            d[key] = pk[key] * units[key][0]
+        else:
+            d[key] = pk[key]
+    return pd.DataFrame(d, index=range(len(pk["auc"])))
+
+
+# selections which are accessed by `calculate_dapagliflozin_pk`
+PK_SELECTIONS = ["time", "PODOSE_dap", "[Cve_dap]", "[Cve_d3g]"]
+
 
 def calculate_dapagliflozin_pk(
     experiment: "DapagliflozinSimulationExperiment",
@@ -14,65 +250,74 @@ def calculate_dapagliflozin_pk(
 ) -> pd.DataFrame:
     """Calculate PK parameters.
 
-    Only works for 1D-scans.
+    Works for scans with any number of dimensions. All timecourses of the scan
+    are reduced in one pass. The returned frame is tidy, i.e., every row is
+    identified by the index coordinates of the scan dimensions (one column per
+    dimension) and the substance. Rows are ordered by the scan points in the
+    order of the dimensions with the substances dap, d3g, daptot.
+    Results on the error-controlled output grid are evaluated on the restored
+    full grid (see `output_grid.restore_grid`).
     Currently only supporting po scans.
     """
     Q_ = experiment.Q_
+    ureg = experiment.ureg
 
-    # scanned dimension
-    scandim = xres._redop_dims()[0]
-    dose_vec = Q_(xres["PODOSE_dap"].values[0], xres.uinfo["PODOSE_dap"])
+    # scanned dimensions
+    dims = xres._redop_dims()
 
-    pk_dicts = []
+    def scan_array(key: str) -> np.ndarray:
+        """Values as (scan point, time) array."""
+        da = xres[key].transpose(*dims, ...)
+        return da.values.reshape(-1, da.shape[-1])
 
-    for k_dose, dose in enumerate(dose_vec):
-        # common time vector
-        t_vec = Q_(xres.dim_mean("time").magnitude, xres.uinfo["time"])
+    # scan coordinates
+    coords = pd.MultiIndex.from_product(
+        [xres[dim].values for dim in dims], names=dims
+    ).to_frame(index=False)
 
-        # parent
-        c_dap = Q_(
-            xres["[Cve_dap]"].sel({scandim: k_dose}).values,
-            xres.uinfo["[Cve_dap]"],
-        )
-        dose_mmole = dose / experiment.Mr.dap
-        pk_dap = TimecoursePK(
-            time=t_vec,
-            concentration=c_dap,
-            substance="dapagliflozin",
-            dose=dose_mmole,
-            ureg=experiment.ureg,
-        ).pk.to_dict()
-        pk_dap["substance"] = "dap"
-        pk_dicts.append(pk_dap)
-
-        # metabolite
-        c_d3g = Q_(
-            xres["[Cve_d3g]"].sel({scandim: k_dose}).values,
-            xres.uinfo["[Cve_d3g]"],
-        )
-        pk_d3g = TimecoursePK(
-            time=t_vec,
-            concentration=c_d3g,
-            substance="dapagliflozin-3-o-glucuronide",
-            dose=None,
-            ureg=experiment.ureg,
-        ).pk.to_dict()
-        pk_d3g["substance"] = "d3g"
-        pk_dicts.append(pk_d3g)
-
-        # total = parent + metabolite
-        conc_unit = c_dap.units
-        c_d3g_same = c_d3g.to(conc_unit)
-        c_tot = Q_(c_dap.magnitude + c_d3g_same.magnitude, conc_unit)
-
-        pk_tot = TimecoursePK(
-            time=t_vec,
-            concentration=c_tot,
-            substance="total dapagliflozin (dap + d3g)",
-            dose=dose_mmole,
-            ureg=experiment.ureg,
-        ).pk.to_dict()
-        pk_tot["substance"] = "daptot"
-        pk_dicts.append(pk_tot)
-
-    return pd.DataFrame(pk_dicts)
+    # common time vector
+    t_vec = xres.dim_mean("time").magnitude
+    t_unit = xres.uinfo["time"]
+
+    dose = Q_(scan_array("PODOSE_dap")[:, 0], xres.uinfo["PODOSE_dap"])
+    dose_mmole = dose / experiment.Mr.dap
+
+    # parent
+    _, c_dap = restore_grid(t_vec, scan_array("[Cve_dap]"))
+    conc_unit = xres.uinfo["[Cve_dap]"]
+    # metabolite
+    t_vec, c_d3g = restore_grid(t_vec, scan_array("[Cve_d3g]"))
+    d3g_unit = xres.uinfo["[Cve_d3g]"]
+    # total = parent + metabolite
+    c_tot = c_dap + c_d3g * Q_(1.0, d3g_unit).to(conc_unit).magnitude
+
+    dose_unit = dose_mmole.units
+    dfs = {
+        "dap": pk_dataframe(
+            pk_kernel(t_vec, c_dap, dose=dose_mmole.magnitude),
+            units=pk_units(ureg, t_unit, conc_unit, dose_unit),
+            compound="dapagliflozin",
+        ),
+        "d3g": pk_dataframe(
+            pk_kernel(t_vec, c_d3g, dose=None),
+            units=pk_units(ureg, t_unit, d3g_unit, None),
+            compound="dapagliflozin-3-o-glucuronide",
+        ),
+        "daptot": pk_dataframe(
+            pk_kernel(t_vec, c_tot, dose=dose_mmole.magnitude),
+            units=pk_units(ureg, t_unit, conc_unit, dose_unit),
+            compound="total dapagliflozin (dap + d3g)",
+        ),
+    }
+
+    # rows ordered by scan point: dap, d3g, daptot
+    df = pd.concat(
+        [
+            pd.concat([coords, df], axis=1).assign(substance=substance)
+            for substance, df in dfs.items()
+        ],
+        keys=range(len(dfs)),
+        names=["_substance", "_scan"],
+    )
+    df = df.sort_index(level=["_scan", "_substance"])
+    return df.reset_index(drop=True)
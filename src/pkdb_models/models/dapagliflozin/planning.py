@@ -0,0 +1,125 @@
+"""Planning of the simulations of multiple simulation experiments.
+
+Many experiments simulate identical scenarios, e.g., a single 10 mg oral dose
+in a healthy, fasted subject with normal renal function. The `SimulationPlan`
+collects the timecourse simulations of all tasks of the selected experiments
+and identifies the unique simulations by their canonical change sets and time
+grids (see `simulation_key`). Every unique simulation is solved only once and
+the result is shared with all experiments which require it.
+"""
+from collections import Counter
+from copy import deepcopy
+from typing import Dict, Iterable, List, Set
+
+from sbmlsim.experiment import SimulationExperiment
+from sbmlsim.simulation import ScanSim, TimecourseSim
+from sbmlutils import log
+from sbmlutils.console import console
+
+from pkdb_models.models.dapagliflozin.cache import simulation_key
+
+logger = log.get_logger(__name__)
+
+
+def experiment_simulations(
+    experiment: SimulationExperiment, uinfo
+) -> Dict[str, List[TimecourseSim]]:
+    """Normalized timecourse simulations of all tasks of an experiment.
+
+    Scans are flattened to their individual timecourse simulations.
+    The simulations of the experiment are not modified.
+
+    :return: timecourse simulations by simulation id
+    """
+    simulations: Dict[str, List[TimecourseSim]] = {}
+    for sim_id, sim in experiment._simulations.items():
+        sim = deepcopy(sim)
+        if isinstance(sim, TimecourseSim):
+            sim = ScanSim(simulation=sim)
+        sim.normalize(uinfo=uinfo)
+        _, tcsims = sim.to_simulations()
+        simulations[sim_id] = tcsims
+    return simulations
+
+
+def experiment_selections(experiment: SimulationExperiment) -> Dict[str, Set[str]]:
+    """Selections which are used by the task data of an experiment.
+
+    :return: union of the selections of the tasks by simulation id
+    """
+    selections: Dict[str, Set[str]] = {
+        sim_id: {"time"} for sim_id in experiment._simulations
+    }
+    for d in (getattr(experiment, "_data", None) or {}).values():
+        if d.is_task():
+            sim_id = experiment._tasks[d.task_id].simulation_id
+            selections[sim_id].add(d.index)
+    return selections
+
+
+class SimulationPlan:
+    """Unique timecourse simulations of a set of experiments."""
+
+    def __init__(self):
+        # unique simulations in order of first occurrence
+        self.simulations: Dict[str, TimecourseSim] = {}
+        # union of the selections of all tasks requiring the simulation
+        self.selections: Dict[str, Set[str]] = {}
+        # number of tasks requiring the simulation
+        self.counts: Counter = Counter()
+        self._remaining: Counter = Counter()
+
+    @classmethod
+    def from_experiments(
+        cls, experiments: Iterable[SimulationExperiment], uinfo
+    ) -> "SimulationPlan":
+        """Plan the simulations of all tasks of the experiments."""
+        plan = cls()
+        for experiment in experiments:
+            selections = experiment_selections(experiment)
+            for sim_id, sims in experiment_simulations(experiment, uinfo).items():
+                for sim in sims:
+                    plan.add(sim, selections=selections[sim_id])
+        return plan
+
+    def add(self, simulation: TimecourseSim, selections: Iterable[str]) -> str:
+        """Add a normalized timecourse simulation to the plan."""
+        key = simulation_key(simulation)
+        if key not in self.simulations:
+            self.simulations[key] = simulation
+            self.selections[key] = set()
+        self.selections[key].update(selections)
+        self.counts[key] += 1
+        self._remaining[key] += 1
+        return key
+
+    def consume(self, key: str) -> int:
+        """Register the use of a simulation result.
+
+        :return: number of remaining uses of the result
+        """
+        if self._remaining[key] > 0:
+            self._remaining[key] -= 1
+        return self._remaining[key]
+
+    @property
+    def n_tasks(self) -> int:
+        """Number of planned timecourse simulations."""
+        return sum(self.counts.values())
+
+    @property
+    def n_unique(self) -> int:
+        """Number of unique timecourse simulations."""
+        return len(self.simulations)
+
+    @property
+    def n_saved(self) -> int:
+        """Number of solves saved by sharing results."""
+        return self.n_tasks - self.n_unique
+
+    def report(self) -> None:
+        """Print summary of the plan."""
+        console.print(
+            f"Simulation plan: {self.n_tasks} timecourse simulations, "
+            f"{self.n_unique} unique, {self.n_saved} solves saved"
+        )
@@ -0,0 +1,454 @@
+"""Virtual population simulations of the whole-body model.
+
+Individuals of the virtual population differ in the physiological covariates
+of the model, i.e., body weight, renal function, cirrhosis, absorption
+(fasted/fed), UGT1A9 activity and plasma glucose. The covariates of N
+individuals are sampled from the distributions of `Covariate`s.
+
+The individuals are simulated in chunks on a process pool; every worker loads
+the model once. The pharmacokinetic parameters of a chunk are calculated in a
+single pass (`pk_kernel`). The per-individual summaries (AUC, Cmax, half-life
+of dapagliflozin and D3G, UGE after 24 hr) are streamed as row groups to a
+parquet file as soon as a chunk is finished, so memory is bounded by the
+chunk size and not by the size of the population. Timecourses are reduced
+to population prediction bands in the same pass (see `population.quantiles`).
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy import stats
+from sbmlsim.sensitivity.analysis import SensitivityOutput
+from sbmlutils import log
+from sbmlutils.console import console
+
+from pkdb_models.models.dapagliflozin import MODEL_PATH, RESULTS_PATH
+from pkdb_models.models.dapagliflozin.experiments.base_experiment import (
+    DapagliflozinSimulationExperiment,
+)
+from pkdb_models.models.dapagliflozin.population.quantiles import PopulationBands
+from pkdb_models.models.dapagliflozin.sensitivity.sensitivity_analysis import (
+    DapagliflozinSensitivitySimulation,
+)
+
+logger = log.get_logger(__name__)
+
+RESULTS_PATH_POPULATION = RESULTS_PATH / "population"
+
+# summaries per individual in model units
+SUMMARY_UNITS: Dict[str, str] = {
+    "dap_aucinf": "mM*min",
+    "dap_cmax": "mM",
+    "dap_thalf": "min",
+    "d3g_aucinf": "mM*min",
+    "d3g_cmax": "mM",
+    "d3g_thalf": "min",
+    "uge24": "g",
+}
+
+
+@dataclass
+class Covariate:
+    """Distribution of a covariate of the virtual population.
+
+    Values are in model units. Continuous distributions are truncated to
+    [lower, upper]:
+
+    - "normal": mean `loc`, standard deviation `scale`
+    - "lognormal": median `loc`, standard deviation of the logarithm `scale`
+    - "uniform": uniform in [loc, loc + scale]
+    - "discrete": `values` with `probabilities`
+    """
+
+    sid: str
+    distribution: str
+    loc: float = 0.0
+    scale: float = 1.0
+    lower: float = -np.inf
+    upper: float = np.inf
+    values: Tuple[float, ...] = ()
+    probabilities: Tuple[float, ...] = ()
+    unit: str = "dimensionless"
+
+    def sample(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        """Draw n values of the covariate."""
+        if self.distribution == "discrete":
+            return rng.choice(
+                np.asarray(self.values, dtype=float), size=n, p=self.probabilities
+            )
+        if self.distribution == "normal":
+            dist = stats.norm(loc=self.loc, scale=self.scale)
+        elif self.distribution == "lognormal":
+            dist = stats.lognorm(s=self.scale, scale=self.loc)
+        elif self.distribution == "uniform":
+            dist = stats.uniform(loc=self.loc, scale=self.scale)
+        else:
+            raise ValueError(f"Unsupported distribution: '{self.distribution}'")
+
+        # inverse transform sampling of the truncated distribution
+        u = rng.uniform(dist.cdf(self.lower), dist.cdf(self.upper), size=n)
+        return dist.ppf(u)
+
+
+def default_covariates() -> List[Covariate]:
+    """Covariates of a mixed population around the reference individual.
+
+    Renal function, cirrhosis and food are drawn around the values of the
+    impairment and fasting maps of the simulation experiments.
+    """
+    e = DapagliflozinSimulationExperiment
+    cirrhosis = e.cirrhosis_map
+    return [
+        Covariate(
+            "BW", "normal", loc=e.bodyweight_default, scale=12.0,
+            lower=45.0, upper=140.0, unit="kg",
+        ),
+        Covariate(
+            "KI__f_renal_function", "lognormal", loc=1.0, scale=0.35,
+            lower=e.renal_map["Severe renal impairment"], upper=1.5,
+        ),
+        Covariate(
+            "f_cirrhosis", "discrete",
+            values=(
+                cirrhosis["Control"],
+                cirrhosis["Mild cirrhosis"],
+                cirrhosis["Moderate cirrhosis"],
+                cirrhosis["Severe cirrhosis"],
+            ),
+            probabilities=(0.94, 0.03, 0.02, 0.01),
+        ),
+        Covariate(
+            "GU__f_absorption", "discrete",
+            values=(e.fasting_map["fasted"], e.fasting_map["fed"]),
+            probabilities=(0.8, 0.2),
+        ),
+        Covariate(
+            "f_ugt1a9", "lognormal", loc=1.0, scale=0.3, lower=0.2, upper=5.0,
+        ),
+        Covariate(
+            "[KI__glc_ext]", "lognormal", loc=e.fpg_healthy, scale=0.2,
+            lower=3.5, upper=e.fpg_t2dm * 2, unit="mM",
+        ),
+    ]
+
+
+def sample_population(
+    covariates: List[Covariate], n: int, seed: Optional[int] = None
+) -> pd.DataFrame:
+    """Covariates of n individuals.
+
+    :return: DataFrame with the column `individual` and a column per covariate
+    """
+    rng = np.random.default_rng(seed)
+    d = {"individual": np.arange(n)}
+    for covariate in covariates:
+        d[covariate.sid] = covariate.sample(rng, n)
+    return pd.DataFrame(d)
+
+
+# simulation of a worker process, created once by the pool initializer
+_worker_simulation: Optional[DapagliflozinSensitivitySimulation] = None
+
+
+def _init_worker(kwargs: Dict, tend: float, steps: int) -> None:
+    """Load the model in the worker process."""
+    global _worker_simulation
+    _worker_simulation = DapagliflozinSensitivitySimulation(**kwargs)
+    _worker_simulation.tend = tend
+    _worker_simulation.steps = steps
+
+
+def _simulate_chunk(
+    individuals: np.ndarray,
+    samples: np.ndarray,
+    covariate_ids: List[str],
+    timecourse_ids: List[str],
+) -> Tuple[pd.DataFrame, Dict[str, np.ndarray]]:
+    """Simulate the individuals of a chunk in the worker process.
+
+    :return: DataFrame with the summaries of the individuals (NaN for failed
+        simulations), timecourses (n_individuals, n_time) of `timecourse_ids`
+    """
+    sim = _worker_simulation
+    y = sim.simulate_timecourses(
+        [dict(zip(covariate_ids, values)) for values in samples]
+    )
+    # pharmacokinetics and pharmacodynamics of all individuals in one pass
+    d = {"individual": individuals, **sim.pk_outputs(y)}
+    return pd.DataFrame(d), {sid: y[sid].astype(np.float32) for sid in timecourse_ids}
+
+
+class VirtualPopulation:
+    """Virtual population simulated in chunks on a process pool.
+
+    The summaries of the individuals are written to `output_path` (parquet)
+    with one row group per chunk in the order of completion. The covariates
+    of the individuals are stored next to the summaries. The timecourses of
+    `timecourse_ids` are aggregated in `PopulationBands` chunk by chunk.
+    """
+
+    def __init__(
+        self,
+        covariates: List[Covariate],
+        n: int,
+        output_path: Path,
+        dose: float = 10.0,
+        seed: int = 1234,
+        chunk_size: int = 200,
+        n_jobs: Optional[int] = None,
+        tend: float = 2 * 24 * 60,
+        steps: int = 400,
+        timecourse_ids: Optional[List[str]] = None,
+    ):
+        """
+        :param dose: oral dose of dapagliflozin [mg]
+        :param tend: end time of the simulations [min], at least 24 hr for UGE24
+        :param steps: steps of the simulations
+        :param timecourse_ids: variables with population prediction bands
+        """
+        if tend < 24 * 60:
+            raise ValueError(f"Simulations must cover 24 hr for UGE24: tend={tend}")
+        self.covariates = covariates
+        self.n = n
+        self.output_path = Path(output_path)
+        self.dose = dose
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.n_jobs: int = n_jobs if n_jobs else os.cpu_count()
+        self.tend = tend
+        self.steps = steps
+        self.timecourse_ids: List[str] = timecourse_ids if timecourse_ids else []
+        self.samples: Optional[pd.DataFrame] = None
+        self.bands: Optional[PopulationBands] = None
+
+    @property
+    def covariates_path(self) -> Path:
+        """Path of the covariates of the individuals."""
+        return self.output_path.with_name(f"{self.output_path.stem}_covariates.tsv")
+
+    @property
+    def bands_path(self) -> Path:
+        """Path of the population prediction bands."""
+        return self.output_path.with_name(f"{self.output_path.stem}_bands.tsv")
+
+    def simulation_kwargs(self) -> Dict:
+        """Arguments of the simulation in the workers."""
+        return dict(
+            model_path=MODEL_PATH,
+            selections=list(
+                dict.fromkeys(
+                    ["time", "[Cve_dap]", "[Cve_d3g]", "KI__UGE"] + self.timecourse_ids
+                )
+            ),
+            changes_simulation={"PODOSE_dap": self.dose},  # [mg]
+            outputs=[SensitivityOutput(uid=uid, name=uid) for uid in SUMMARY_UNITS],
+        )
+
+    def create_samples(self) -> pd.DataFrame:
+        """Sample the covariates of the individuals."""
+        self.samples = sample_population(self.covariates, n=self.n, seed=self.seed)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.samples.to_csv(self.covariates_path, sep="\t", index=False)
+        return self.samples
+
+    def schema(self) -> pa.Schema:
+        """Schema of the summaries with the units as metadata."""
+        fields = [pa.field("individual", pa.int64())] + [
+            pa.field(uid, pa.float64(), metadata={"unit": unit})
+            for uid, unit in SUMMARY_UNITS.items()
+        ]
+        return pa.schema(
+            fields,
+            metadata={"dose": f"{self.dose} mg", "seed": str(self.seed)},
+        )
+
+    def simulate(self) -> Path:
+        """Simulate all individuals and stream the summaries to the output file."""
+        if self.samples is None:
+            self.create_samples()
+        covariate_ids = [c.sid for c in self.covariates]
+        individuals = self.samples["individual"].values
+        values = self.samples[covariate_ids].values
+        starts = range(0, self.n, self.chunk_size)
+
+        kwargs = self.simulation_kwargs()
+        self.bands = PopulationBands(
+            time=np.linspace(0, self.tend, self.steps + 1), sids=self.timecourse_ids
+        )
+        ts = time.time()
+        n_done, n_failed = 0, 0
+        schema = self.schema()
+        tmp_path = self.output_path.with_suffix(f".{os.getpid()}.tmp")
+        console.print(
+            f"Simulating {self.n} individuals in {len(starts)} chunks "
+            f"on {self.n_jobs} workers"
+        )
+        with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+            with ProcessPoolExecutor(
+                max_workers=self.n_jobs,
+                initializer=_init_worker,
+                initargs=(kwargs, self.tend, self.steps),
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        _simulate_chunk,
+                        individuals[start:start + self.chunk_size],
+                        values[start:start + self.chunk_size],
+                        covariate_ids,
+                        self.timecourse_ids,
+                    )
+                    for start in starts
+                ]
+                for future in as_completed(futures):
+                    df, timecourses = future.result()
+                    self.bands.add_chunk(timecourses)
+                    writer.write_table(
+                        pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+                    )
+                    n_done += len(df)
+                    n_failed += int(df["dap_aucinf"].isna().sum())
+                    rate = n_done / (time.time() - ts) * 3600
+                    console.print(
+                        f"{n_done}/{self.n} individuals ({rate:.0f} individuals/hr)"
+                    )
+        os.replace(tmp_path, self.output_path)
+        if self.timecourse_ids:
+            self.bands.save(self.bands_path)
+
+        if n_failed:
+            logger.warning(f"{n_failed}/{self.n} individuals could not be simulated")
+        console.print(
+            f"Virtual population simulated in {time.time() - ts:.2f} s: "
+            f"'{self.output_path}'"
+        )
+        return self.output_path
+
+    def summaries(self) -> pd.DataFrame:
+        """Summaries and covariates of all individuals ordered by individual."""
+        df = pq.read_table(self.output_path).to_pandas()
+        covariates = pd.read_csv(self.covariates_path, sep="\t")
+        return covariates.merge(df, on="individual").sort_values("individual")
+
+
+def main() -> None:
+    """Entry point which simulates a virtual population.
+
+    The script is registered as `run_dapagliflozin_population` command.
+    """
+    import optparse
+    import sys
+
+    parser = optparse.OptionParser()
+    parser.add_option(
+        "-n",
+        "--individuals",
+        action="store",
+        dest="individuals",
+        help="Number of individuals of the virtual population",
+    )
+    parser.add_option(
+        "-o",
+        "--output",
+        action="store",
+        dest="output",
+        default="population",
+        help="Name of the output file in the population results",
+    )
+    parser.add_option(
+        "-d",
+        "--dose",
+        action="store",
+        dest="dose",
+        default="10",
+        help="Oral dose of dapagliflozin [mg]",
+    )
+    parser.add_option(
+        "-s",
+        "--seed",
+        action="store",
+        dest="seed",
+        default="1234",
+        help="Seed of the covariate sampling",
+    )
+    parser.add_option(
+        "-c",
+        "--cores",
+        action="store",
+        dest="cores",
+        help="Number of cores",
+    )
+    parser.add_option(
+        "--steps",
+        action="store",
+        dest="steps",
+        default="400",
+        help="Steps of the simulations over 48 hr",
+    )
+    parser.add_option(
+        "--bands",
+        action="store_true",
+        dest="bands",
+        default=False,
+        help="Population prediction bands of plasma concentrations and UGE",
+    )
+    parser.add_option(
+        "--chunk-size",
+        action="store",
+        dest="chunk_size",
+        default="200",
+        help="Number of individuals per chunk",
+    )
+
+    console.rule(style="white")
+    console.print(":wrench: VIRTUAL POPULATION DAPAGLIFLOZIN :wrench:")
+    console.rule(style="white")
+
+    options, args = parser.parse_args()
+
+    def _parser_message(text: str) -> None:
+        console.print(text)
+        parser.print_help()
+        console.rule(style="white")
+        sys.exit(1)
+
+    if not options.individuals:
+        _parser_message("Required argument '--individuals' missing.")
+    if not options.cores:
+        _parser_message("Required argument '--cores' missing.")
+
+    population = VirtualPopulation(
+        covariates=default_covariates(),
+        n=int(options.individuals),
+        output_path=RESULTS_PATH_POPULATION / f"{options.output}.parquet",
+        dose=float(options.dose),
+        seed=int(options.seed),
+        chunk_size=int(options.chunk_size),
+        n_jobs=int(options.cores),
+        steps=int(options.steps),
+        timecourse_ids=["[Cve_dap]", "[Cve_d3g]", "KI__UGE"] if options.bands else None,
+    )
+    population.simulate()
+    console.print(population.summaries().describe().T)
+    if options.bands:
+        f = population.bands.plot()
+        f.savefig(population.bands_path.with_suffix(".png"), bbox_inches="tight")
+
+
+if __name__ == "__main__":
+    """
+    Virtual population of 100000 individuals:
+
+    run_dapagliflozin_population --individuals=100000 --cores=32
+
+    Population prediction bands on a fine time grid:
+
+    run_dapagliflozin_population --individuals=100000 --cores=32 --steps=4000 --bands
+    """
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark of the virtual population simulation.
+
+Simulates a small virtual population (default 1000 individuals) and reports
+the runtime and the rate of simulated individuals per hour and per core.
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+from sbmlutils.console import console
+
+from pkdb_models.models.dapagliflozin import RESULTS_PATH
+from pkdb_models.models.dapagliflozin.population.population import (
+    VirtualPopulation,
+    default_covariates,
+)
+
+RESULTS_PATH_BENCHMARK = RESULTS_PATH / "benchmark"
+
+
+def benchmark_population(
+    n: int = 1000,
+    n_jobs: Optional[int] = None,
+    chunk_size: int = 200,
+    steps: int = 400,
+) -> pd.DataFrame:
+    """Simulate a virtual population of n individuals and measure the rate."""
+    n_jobs = n_jobs if n_jobs else os.cpu_count()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        population = VirtualPopulation(
+            covariates=default_covariates(),
+            n=n,
+            output_path=Path(tmp_dir) / "population.parquet",
+            chunk_size=chunk_size,
+            n_jobs=n_jobs,
+            steps=steps,
+        )
+        population.create_samples()
+        ts = time.time()
+        population.simulate()
+        runtime = time.time() - ts
+        n_failed = int(population.summaries()["dap_aucinf"].isna().sum())
+
+    rate = n / runtime * 3600
+    return pd.DataFrame(
+        [
+            {
+                "individuals": n,
+                "failed": n_failed,
+                "cores": n_jobs,
+                "chunk_size": chunk_size,
+                "steps": steps,
+                "time": runtime,
+                "individuals_per_hr": rate,
+                "individuals_per_hr_core": rate / n_jobs,
+            }
+        ]
+    )
+
+
+def main() -> None:
+    """Run population benchmark."""
+    import optparse
+
+    parser = optparse.OptionParser()
+    parser.add_option(
+        "-n",
+        "--individuals",
+        action="store",
+        dest="individuals",
+        default="1000",
+        help="Number of individuals of the virtual population",
+    )
+    parser.add_option(
+        "-c",
+        "--cores",
+        action="store",
+        dest="cores",
+        help="Number of cores",
+    )
+    options, args = parser.parse_args()
+
+    df = benchmark_population(
+        n=int(options.individuals),
+        n_jobs=int(options.cores) if options.cores else None,
+    )
+    RESULTS_PATH_BENCHMARK.mkdir(parents=True, exist_ok=True)
+    df.to_csv(RESULTS_PATH_BENCHMARK / "population.tsv", sep="\t", index=False)
+    console.print(df.T)
+
+
+if __name__ == "__main__":
+    """
+    python -m pkdb_models.models.dapagliflozin.population.population_benchmark --individuals=1000 --cores=1
+    """
+    main()
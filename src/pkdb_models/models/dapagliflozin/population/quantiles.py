@@ -0,0 +1,233 @@
+"""Streaming quantile aggregation of population timecourses.
+
+The timecourses of a large virtual population do not fit in memory, e.g.,
+10^5 individuals with 4001 time points. The `PopulationBands` consume the
+timecourses chunk by chunk and keep a `QuantileSketch` per variable, i.e.,
+memory depends on the number of time points and the accuracy of the sketch
+but not on the number of individuals.
+
+The sketch uses logarithmic buckets (DDSketch, Masson2019): every quantile is
+returned with a relative error below `alpha`. Sketches of different chunks or
+processes are merged by adding the bucket counts. Mean and standard deviation
+are exact (pairwise update of count, mean and sum of squared deviations).
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Type
+
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+from pint import UnitRegistry
+
+from pkdb_models.models.dapagliflozin.experiments.base_experiment import (
+    DapagliflozinSimulationExperiment,
+)
+
+# units of the model variables
+MODEL_UNITS: Dict[str, str] = {
+    "time": "min",
+    "[Cve_dap]": "mM",
+    "[Cve_d3g]": "mM",
+    "[Cve_daptot]": "mM",
+    "[KI__glc_ext]": "mM",
+    "KI__UGE": "g",
+}
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch of the values at multiple time points.
+
+    Values in [0, min_value) are counted in a zero bucket, negative values
+    (numerical noise of the integration) as zero, values above max_value in
+    the last bucket. NaN values are ignored.
+    """
+
+    def __init__(
+        self,
+        n_time: int,
+        alpha: float = 0.01,
+        min_value: float = 1e-12,
+        max_value: float = 1e6,
+    ):
+        """
+        :param n_time: number of time points
+        :param alpha: relative accuracy of the quantiles
+        :param min_value: smallest value which is distinguished from zero
+        :param max_value: largest value which is resolved
+        """
+        self.n_time = n_time
+        self.alpha = alpha
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = np.log(self.gamma)
+        self.offset = int(np.ceil(np.log(min_value) / self._log_gamma))
+        self.n_buckets = (
+            int(np.ceil(np.log(max_value) / self._log_gamma)) - self.offset + 1
+        )
+
+        # bucket 0 are the zero values
+        self.counts = np.zeros((n_time, self.n_buckets + 1), dtype=np.int32)
+        self.n = np.zeros(n_time, dtype=np.int64)
+        self.mean = np.zeros(n_time)
+        self.m2 = np.zeros(n_time)
+
+    def add(self, values: np.ndarray) -> None:
+        """Add values (n_samples, n_time)."""
+        v = np.array(values, dtype=float, ndmin=2)
+        if v.shape[1] != self.n_time:
+            raise ValueError(
+                f"Values with {v.shape[1]} time points, sketch has {self.n_time}."
+            )
+        valid = np.isfinite(v)
+        v = np.where(valid, np.maximum(v, 0.0), np.nan)
+
+        idx = np.zeros(v.shape, dtype=np.int64)
+        positive = valid & (v >= self.min_value)
+        idx[positive] = np.clip(
+            np.ceil(np.log(v[positive]) / self._log_gamma).astype(np.int64)
+            - self.offset
+            + 1,
+            1,
+            self.n_buckets,
+        )
+        rows = np.broadcast_to(np.arange(self.n_time), v.shape)
+        flat = rows[valid] * self.counts.shape[1] + idx[valid]
+        np.add.at(self.counts.reshape(-1), flat, 1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            n = valid.sum(axis=0)
+            mean = np.nansum(v, axis=0) / n
+            m2 = np.nansum((v - mean) ** 2, axis=0)
+        self._update_moments(n, np.nan_to_num(mean), m2)
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Merge the values of another sketch with identical buckets."""
+        if (
+            other.n_time != self.n_time
+            or other.gamma != self.gamma
+            or other.offset != self.offset
+            or other.n_buckets != self.n_buckets
+        ):
+            raise ValueError("Sketches with different time points or buckets.")
+        self.counts += other.counts
+        self._update_moments(other.n, other.mean, other.m2)
+
+    def _update_moments(self, n: np.ndarray, mean: np.ndarray, m2: np.ndarray) -> None:
+        """Combine count, mean and squared deviations (Chan1979)."""
+        n_total = self.n + n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = mean - self.mean
+            self.mean = np.where(n_total > 0, self.mean + delta * n / n_total, 0.0)
+            self.m2 = np.where(
+                n_total > 0, self.m2 + m2 + delta**2 * self.n * n / n_total, 0.0
+            )
+        self.n = n_total
+
+    def quantiles(self, qs: Sequence[float] = QUANTILES) -> np.ndarray:
+        """Quantiles at all time points.
+
+        :return: quantiles (len(qs), n_time), NaN for time points without values
+        """
+        cumulative = np.cumsum(self.counts, axis=1, dtype=np.int64)
+        values = np.full((len(qs), self.n_time), np.nan)
+        has_values = self.n > 0
+        for k, q in enumerate(qs):
+            rank = np.floor(q * (self.n - 1))
+            bucket = np.argmax(cumulative > rank[:, np.newaxis], axis=1)
+            # center of the logarithmic bucket
+            value = 2 * self.gamma ** (bucket - 1 + self.offset) / (self.gamma + 1)
+            values[k] = np.where(has_values, np.where(bucket > 0, value, 0.0), np.nan)
+        return values
+
+    def std(self) -> np.ndarray:
+        """Standard deviation at all time points."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.n > 1, np.sqrt(self.m2 / (self.n - 1)), np.nan)
+
+
+class PopulationBands:
+    """Population prediction bands of timecourses from streamed chunks.
+
+    The timecourses are in model units (see `MODEL_UNITS`) on the common
+    time grid `time` [min].
+    """
+
+    def __init__(self, time: np.ndarray, sids: List[str], alpha: float = 0.01):
+        self.time = np.asarray(time, dtype=float)
+        self.sids = sids
+        self.sketches: Dict[str, QuantileSketch] = {
+            sid: QuantileSketch(n_time=len(self.time), alpha=alpha) for sid in sids
+        }
+
+    def add_chunk(self, chunk: Dict[str, np.ndarray]) -> None:
+        """Add the timecourses (n_individuals, n_time) of a chunk."""
+        for sid in self.sids:
+            self.sketches[sid].add(chunk[sid])
+
+    def merge(self, other: "PopulationBands") -> None:
+        """Merge the bands of another population."""
+        for sid in self.sids:
+            self.sketches[sid].merge(other.sketches[sid])
+
+    def to_dataframe(self, quantiles: Sequence[float] = QUANTILES) -> pd.DataFrame:
+        """Tidy DataFrame with quantiles, mean and SD per variable and time point."""
+        dfs = []
+        for sid in self.sids:
+            sketch = self.sketches[sid]
+            d = {"sid": sid, "time": self.time, "n": sketch.n}
+            for q, values in zip(quantiles, sketch.quantiles(quantiles)):
+                d[f"q{q * 100:02.0f}"] = values
+            d["mean"] = sketch.mean
+            d["sd"] = sketch.std()
+            dfs.append(pd.DataFrame(d))
+        return pd.concat(dfs, ignore_index=True)
+
+    def save(self, path: Path) -> pd.DataFrame:
+        """Save the bands as TSV."""
+        df = self.to_dataframe()
+        df.to_csv(path, sep="\t", index=False)
+        return df
+
+    def plot(
+        self,
+        sids: Optional[List[str]] = None,
+        experiment_class: Type[
+            DapagliflozinSimulationExperiment
+        ] = DapagliflozinSimulationExperiment,
+        color: str = "tab:blue",
+    ) -> plt.Figure:
+        """Plot median, 25-75 % and 5-95 % bands with the labels and units."""
+        sids = sids if sids else self.sids
+        df = self.to_dataframe(quantiles=QUANTILES)
+        ureg = UnitRegistry()
+        e = experiment_class
+
+        def factor(unit_from: str, unit_to: str) -> float:
+            return ureg.Quantity(1.0, unit_from).to(unit_to).magnitude
+
+        f, axes = plt.subplots(
+            nrows=1, ncols=len(sids), figsize=(7 * len(sids), 6), squeeze=False
+        )
+        t = self.time * factor(MODEL_UNITS["time"], e.unit_time)
+        for ax, sid in zip(axes[0], sids):
+            d = df[df.sid == sid]
+            y = factor(MODEL_UNITS[sid], e.units[sid])
+            ax.fill_between(
+                t, d.q05 * y, d.q95 * y, color=color, alpha=0.2, label="5-95 %"
+            )
+            ax.fill_between(
+                t, d.q25 * y, d.q75 * y, color=color, alpha=0.4, label="25-75 %"
+            )
+            ax.plot(t, d.q50 * y, color=color, linewidth=2, label="median")
+            ax.plot(t, d["mean"] * y, color="black", linestyle="--", label="mean")
+            ax.set_xlabel(
+                f"{e.labels['time']} [{e.unit_time}]", fontdict=e.scan_font
+            )
+            ax.set_ylabel(f"{e.labels[sid]} [{e.units[sid]}]", fontdict=e.scan_font)
+            ax.tick_params(axis="both", labelsize=e.tick_font_size)
+            ax.legend(fontsize=e.legend_font_size)
+        f.tight_layout()
+        return f
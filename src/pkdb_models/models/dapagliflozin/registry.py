@@ -0,0 +1,181 @@
+"""Registry of the dapagliflozin simulation experiments.
+
+Static table of the experiment names and the modules defining them. Experiment
+classes are imported only when they are selected, i.e., listing the
+experiments does not import sbmlsim or any experiment module, and running a
+single study only imports the module of the study.
+"""
+from importlib import import_module
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Tuple, Type
+
+if TYPE_CHECKING:
+    from sbmlsim.experiment import SimulationExperiment
+
+_STUDIES = "pkdb_models.models.dapagliflozin.experiments.studies"
+_MISC = "pkdb_models.models.dapagliflozin.experiments.misc"
+_SCANS = "pkdb_models.models.dapagliflozin.experiments.scans"
+
+EXPERIMENT_MODULES: Dict[str, str] = {
+    # studies
+    "Boulton2013": f"{_STUDIES}.boulton2013",
+    "Cho2021": f"{_STUDIES}.cho2021",
+    "FDAMB102002": f"{_STUDIES}.fdamb102002",
+    "FDAMB102003": f"{_STUDIES}.fdamb102003",
+    "FDAMB102006": f"{_STUDIES}.fdamb102006",
+    "FDAMB102007": f"{_STUDIES}.fdamb102007",
+    "Gould2013": f"{_STUDIES}.gould2013",
+    "Hwang2022a": f"{_STUDIES}.hwang2022a",
+    "Imamura2013": f"{_STUDIES}.imamura2013",
+    "Jang2020": f"{_STUDIES}.jang2020",
+    "Kasichayanula2011": f"{_STUDIES}.kasichayanula2011",
+    "Kasichayanula2011a": f"{_STUDIES}.kasichayanula2011a",
+    "Kasichayanula2011b": f"{_STUDIES}.kasichayanula2011b",
+    "Kasichayanula2011c": f"{_STUDIES}.kasichayanula2011c",
+    "Kasichayanula2012": f"{_STUDIES}.kasichayanula2012",
+    "Kasichayanula2013": f"{_STUDIES}.kasichayanula2013",
+    "Kasichayanula2013a": f"{_STUDIES}.kasichayanula2013a",
+    "Khomitskaya2018": f"{_STUDIES}.khomitskaya2018",
+    "Kim2023": f"{_STUDIES}.kim2023",
+    "Kim2023a": f"{_STUDIES}.kim2023a",
+    "Komoroski2009": f"{_STUDIES}.komoroski2009",
+    "LaCreta2016": f"{_STUDIES}.laCreta2016",
+    "Obermeier2010": f"{_STUDIES}.obermeier2010",
+    "Sha2015": f"{_STUDIES}.sha2015",
+    "Shah2019a": f"{_STUDIES}.shah2019a",
+    "vanderAartvanderBeek2020": f"{_STUDIES}.vanderAartvanderBeek2020",
+    "Watada2019": f"{_STUDIES}.watada2019",
+    "Yang2013": f"{_STUDIES}.yang2013",
+    # misc
+    "DoseDependencyExperiment": f"{_MISC}.dose_dependency",
+    "FoodEffect": f"{_MISC}.food_effect",
+    "HepaticRenalImpairment": f"{_MISC}.hepatic_renal_impairment",
+    # scan
+    "DapagliflozinParameterScan": f"{_SCANS}.scan_parameters",
+}
+
+EXPERIMENT_GROUPS: Dict[str, List[str]] = {
+    "studies": [
+        "Boulton2013",
+        "Cho2021",
+        "FDAMB102002",
+        "FDAMB102003",
+        "FDAMB102006",
+        "FDAMB102007",
+        "Gould2013",
+        "Hwang2022a",
+        "Imamura2013",
+        "Jang2020",
+        "Kasichayanula2011",
+        "Kasichayanula2011a",
+        "Kasichayanula2011b",
+        "Kasichayanula2011c",
+        "Kasichayanula2012",
+        "Kasichayanula2013",
+        "Kasichayanula2013a",
+        "Khomitskaya2018",
+        "Kim2023",
+        "Kim2023a",
+        "Komoroski2009",
+        "LaCreta2016",
+        "Obermeier2010",
+        "Sha2015",
+        "Shah2019a",
+        "vanderAartvanderBeek2020",
+        "Watada2019",
+        "Yang2013",
+    ],
+    "pharmacodynamics": [
+        "FDAMB102002",
+        "FDAMB102003",
+        "FDAMB102007",
+        "Gould2013",
+        "Kasichayanula2011a",
+        "Kim2023",
+        "Komoroski2009",
+        "Sha2015",
+        "Watada2019",
+        "Yang2013",
+    ],
+    "dose_dependency": [
+        "FDAMB102002",
+        "FDAMB102003",
+        "Gould2013",
+        "Kasichayanula2011a",
+        "Komoroski2009",
+        "Watada2019",
+        "Yang2013",
+    ],
+    "food": [
+        "Kasichayanula2011b",
+        "Komoroski2009",
+        "LaCreta2016",
+        "Shah2019a",
+    ],
+    "hepatic_impairment": [
+        "Kasichayanula2011",
+    ],
+    "renal_impairment": [
+        "Kasichayanula2013",
+        "FDAMB102007",
+    ],
+    "misc": [
+        "DoseDependencyExperiment",
+        "FoodEffect",
+        "HepaticRenalImpairment",
+    ],
+    "scan": [
+        "DapagliflozinParameterScan",
+    ],
+}
+
+EXPERIMENT_GROUPS["all"] = (
+    EXPERIMENT_GROUPS["studies"] + EXPERIMENT_GROUPS["misc"] + EXPERIMENT_GROUPS["scan"]
+)
+
+
+def load_experiment(name: str) -> Type["SimulationExperiment"]:
+    """Import the experiment class of the registered name."""
+    return getattr(import_module(EXPERIMENT_MODULES[name]), name)
+
+
+def load_experiments(names: Iterable[str]) -> List[Type["SimulationExperiment"]]:
+    """Import the experiment classes of the registered names."""
+    return [load_experiment(name) for name in names]
+
+
+def lazy_experiments(package: str) -> Tuple[Callable, List[str]]:
+    """Module `__getattr__` and `__all__` of an experiment package.
+
+    The experiment classes of the package are imported on first access, e.g.,
+    `from ...experiments.studies import Boulton2013` only imports the module
+    of the study.
+    """
+    names = [
+        name
+        for name, module in EXPERIMENT_MODULES.items()
+        if module.rsplit(".", 1)[0] == package
+    ]
+
+    def __getattr__(name: str):
+        if name in names:
+            return load_experiment(name)
+        raise AttributeError(f"module '{package}' has no attribute '{name}'")
+
+    return __getattr__, names
+
+
+def resolve_experiment_names(names: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """Resolve group and experiment names to the registered experiment names.
+
+    :return: experiment names and names which are not registered
+    """
+    experiment_names: List[str] = []
+    not_found: List[str] = []
+    for name in names:
+        if name in EXPERIMENT_GROUPS:
+            experiment_names.extend(EXPERIMENT_GROUPS[name])
+        elif name in EXPERIMENT_MODULES:
+            experiment_names.append(name)
+        else:
+            not_found.append(name)
+    return experiment_names, not_found
@@ -0,0 +1,119 @@
+"""Parallel serialization of the figures of simulation experiments.
+
+Serializing the figures (png at 600 dpi and svg) often takes longer than the
+simulations. The `FigurePool` saves the matplotlib figures on a process pool
+with the Agg backend, one figure per job. The figures are created in the main
+process and sent pickled to the workers. At most `max_pending` figures are
+queued, i.e., memory does not grow with the number of figures. Figures which
+cannot be pickled are saved in the main process.
+"""
+import os
+import pickle
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import List, Optional, Set
+
+import matplotlib
+from matplotlib import pyplot as plt
+from sbmlutils import log
+from sbmlutils.console import console
+
+logger = log.get_logger(__name__)
+
+
+def _init_worker() -> None:
+    """Use the non-interactive backend in the worker process."""
+    matplotlib.use("Agg")
+
+
+def _save_figure(fig_data: bytes, paths: List[str]) -> List[str]:
+    """Save the pickled figure in all formats in the worker process."""
+    fig = pickle.loads(fig_data)
+    try:
+        for path in paths:
+            fig.savefig(path, bbox_inches="tight")
+    finally:
+        plt.close(fig)
+    return paths
+
+
+class FigurePool:
+    """Process pool saving matplotlib figures."""
+
+    def __init__(self, n_jobs: Optional[int] = None, max_pending: Optional[int] = None):
+        """
+        :param n_jobs: number of worker processes
+        :param max_pending: maximal number of queued figures, defaults to
+            twice the number of workers
+        """
+        self.n_jobs: int = n_jobs if n_jobs else os.cpu_count()
+        self.max_pending: int = max_pending if max_pending else 2 * self.n_jobs
+        self.n_figures: int = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Set[Future] = set()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Process pool, workers are started on first use."""
+        if self._executor is None:
+            console.print(f"Starting figure pool with {self.n_jobs} workers")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.n_jobs, initializer=_init_worker
+            )
+        return self._executor
+
+    def _collect(self, block: bool) -> None:
+        """Remove finished jobs, raises errors of failed jobs.
+
+        :param block: wait until at least one job is finished
+        """
+        if not self._pending:
+            return
+        done, self._pending = wait(
+            self._pending, timeout=None if block else 0, return_when=FIRST_COMPLETED
+        )
+        for future in done:
+            future.result()
+
+    def submit(self, fig: plt.Figure, paths: List[Path]) -> None:
+        """Save the figure to the paths, blocks if the queue is full."""
+        try:
+            fig_data = pickle.dumps(fig)
+        except Exception as err:
+            logger.warning(f"Figure cannot be pickled, saved serially: {err}")
+            _save_figure_serial(fig, paths)
+            return
+
+        self._collect(block=False)
+        while len(self._pending) >= self.max_pending:
+            self._collect(block=True)
+        self._pending.add(
+            self.executor.submit(_save_figure, fig_data, [str(p) for p in paths])
+        )
+        self.n_figures += 1
+
+    def join(self) -> None:
+        """Wait until all figures are saved."""
+        while self._pending:
+            self._collect(block=True)
+
+    def close(self) -> None:
+        """Wait for the pending figures and shut down the worker processes."""
+        try:
+            self.join()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def __enter__(self) -> "FigurePool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def _save_figure_serial(fig: plt.Figure, paths: List[Path]) -> None:
+    """Save the figure in the main process."""
+    for path in paths:
+        fig.savefig(path, bbox_inches="tight")
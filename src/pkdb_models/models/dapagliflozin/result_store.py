@@ -0,0 +1,143 @@
+"""Columnar on-disk store of the task results of simulation experiments.
+
+The `XResult` of every task is stored as a parquet file with one column per
+selection. The values are ordered by scan point and time, i.e., a row group
+(chunk) contains the complete timecourses of a block of scan points. Columns
+are compressed (zstd), dimensions, coordinates and units are stored in the
+schema metadata. `ResultStore.load` reads and decompresses the requested
+columns completely into memory.
+
+`StoredResults` loads the complete result of a task on the first access, so
+that figures and reports can be rendered from disk without simulating (see
+`helpers.render_experiments`).
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xarray as xr
+from pint import UnitRegistry
+from sbmlsim.result import XResult
+from sbmlsim.units import UnitsInformation
+
+TIME_DIM = "_time"
+
+
+class ResultStore:
+    """Store of the task results of a simulation experiment in a directory."""
+
+    def __init__(self, path: Path, chunk_size: int = 2**20):
+        """
+        :param path: directory of the parquet files
+        :param chunk_size: approximate number of values per row group
+        """
+        self.path = Path(path)
+        self.chunk_size = chunk_size
+
+    def _path(self, task_id: str) -> Path:
+        return self.path / f"{task_id}.parquet"
+
+    def task_ids(self) -> List[str]:
+        """Ids of the stored tasks."""
+        return sorted(p.stem for p in self.path.glob("*.parquet"))
+
+    def __contains__(self, task_id: str) -> bool:
+        return self._path(task_id).exists()
+
+    def save(self, task_id: str, xres: XResult) -> Path:
+        """Store the result of a task."""
+        xds: xr.Dataset = xres.xds
+        keys = list(xds.data_vars)
+        # scan dimensions first, time last: timecourses are contiguous
+        dims = [d for d in xds[keys[0]].dims if d != TIME_DIM] + [TIME_DIM]
+        n_time = xds.sizes[TIME_DIM]
+
+        units: Dict[str, str] = {}
+        for key in keys:
+            unit = xds[key].attrs.get("units")
+            if unit is None and key in xres.uinfo:
+                unit = xres.uinfo[key]
+            if unit is not None:
+                units[key] = str(unit)
+
+        info = {
+            "dims": dims,
+            "original_dims": list(xds[keys[0]].dims),
+            "shape": [xds.sizes[d] for d in dims],
+            "coords": {d: xds[d].values.tolist() for d in dims},
+            "units": units,
+        }
+        table = pa.table(
+            {key: xds[key].transpose(*dims).values.reshape(-1) for key in keys}
+        )
+        table = table.replace_schema_metadata({"xresult": json.dumps(info)})
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        path = self._path(task_id)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        row_group_size = max(n_time, (self.chunk_size // n_time) * n_time)
+        pq.write_table(
+            table, tmp_path, row_group_size=row_group_size, compression="zstd"
+        )
+        os.replace(tmp_path, path)
+        return path
+
+    def info(self, task_id: str) -> Dict:
+        """Dimensions, coordinates and units of a stored result."""
+        metadata = pq.read_schema(self._path(task_id)).metadata
+        return json.loads(metadata[b"xresult"])
+
+    def load(
+        self,
+        task_id: str,
+        ureg: UnitRegistry,
+        columns: Optional[List[str]] = None,
+    ) -> XResult:
+        """Load the result of a task.
+
+        :param ureg: unit registry of the experiment
+        :param columns: selections to load, all selections if None
+        """
+        path = self._path(task_id)
+        info = self.info(task_id)
+        table = pq.read_table(path, columns=columns)
+        dims, shape = info["dims"], info["shape"]
+        xds = xr.Dataset(
+            {
+                key: xr.DataArray(
+                    data=table.column(key).to_numpy().reshape(shape),
+                    dims=dims,
+                    coords={d: info["coords"][d] for d in dims},
+                ).transpose(*info["original_dims"])
+                for key in table.column_names
+            }
+        )
+        udict = {k: v for k, v in info["units"].items() if k in xds}
+        for key, unit in udict.items():
+            xds[key].attrs["units"] = unit
+        return XResult(xdataset=xds, uinfo=UnitsInformation(udict=udict, ureg=ureg))
+
+
+class StoredResults(Mapping):
+    """Results of the tasks of an experiment, loaded from the store on access."""
+
+    def __init__(self, store: ResultStore, ureg: UnitRegistry):
+        self.store = store
+        self.ureg = ureg
+        self._results: Dict[str, XResult] = {}
+
+    def __getitem__(self, task_id: str) -> XResult:
+        if task_id not in self._results:
+            if task_id not in self.store:
+                raise KeyError(f"No stored result for task '{task_id}'")
+            self._results[task_id] = self.store.load(task_id, ureg=self.ureg)
+        return self._results[task_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.task_ids())
+
+    def __len__(self) -> int:
+        return len(self.store.task_ids())
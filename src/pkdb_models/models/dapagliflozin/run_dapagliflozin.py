@@ -7,7 +7,11 @@ from enum import Enum
 import optparse
 from pathlib import Path
 from pkdb_models.models.dapagliflozin import DAPAGLIFLOZIN_PATH
-from pkdb_models.models.dapagliflozin.simulations import run_simulation_experiments, EXPERIMENTS
+from pkdb_models.models.dapagliflozin.registry import (
+    EXPERIMENT_GROUPS,
+    load_experiments,
+    resolve_experiment_names,
+)
 from sbmlutils.console import console
 
 FACTORY_SCRIPT_PATH = DAPAGLIFLOZIN_PATH / "models" / "factory.py"
@@ -15,6 +19,7 @@ FACTORY_SCRIPT_PATH = DAPAGLIFLOZIN_PATH / "models" / "factory.py"
 class Action(str, Enum):
     # simulations
     SIMULATE = "simulate"
+    RENDER = "render"
     LIST_EXPERIMENTS = "list_experiments"
     # factory
     FACTORY = "factory"
@@ -30,6 +35,7 @@ def _setup_custom_results_paths(results_dir: str):
     # Override the module paths
     dapagliflozin.RESULTS_PATH = custom_path
     dapagliflozin.RESULTS_PATH_SIMULATION = custom_path / "simulation"
+    dapagliflozin.RESULTS_PATH_CACHE = custom_path / "cache"
     console.print(f"Figure output directory set to: [cyan]{custom_path}[/cyan]")
     return custom_path
 
@@ -56,46 +62,20 @@ def _list_available_experiments():
     """Display all available experiment groups and individual experiments."""
     console.rule("[bold cyan]Available Simulation Experiments[/bold cyan]", style="cyan")
     console.print("\n[bold]You can use these group names:[/bold]")
-    console.print(f"  {', '.join([g for g in EXPERIMENTS.keys()])}")
+    console.print(f"  {', '.join([g for g in EXPERIMENT_GROUPS.keys()])}")
     console.print("\n[bold]Or these individual experiment names:[/bold]")
 
     for group_name in ["studies", "misc", "scan"]:
-        if group_name in EXPERIMENTS and EXPERIMENTS[group_name]:
+        if group_name in EXPERIMENT_GROUPS and EXPERIMENT_GROUPS[group_name]:
             console.print(f"\n[yellow]{group_name}:[/yellow]")
-            for exp in EXPERIMENTS[group_name]:
-                console.print(f"  {exp.__name__}")
+            for exp_name in EXPERIMENT_GROUPS[group_name]:
+                console.print(f"  {exp_name}")
 
     console.print("\n[dim]Use '--experiments' with comma-separated names to run specific experiments.[/dim]")
     console.print('[dim]Example: run_dapagliflozin --action simulate --experiments "misc,LaCreta2016"[/dim]')
     console.print('[dim]Or use "all" to run all experiments: run_dapagliflozin --action simulate --experiments all[/dim]\n')
 
 
-def _resolve_experiment_names(experiment_names: list) -> tuple:
-    """Resolve experiment names to experiment classes."""
-    # Build dictionary of all available experiments by name
-    all_available_exp = {}
-    for category, exp_list in EXPERIMENTS.items():
-        if category != "all":
-            for exp in exp_list:
-                all_available_exp[exp.__name__] = exp
-
-    # Validate and collect requested experiments
-    experiment_classes = []
-    not_found = []
-
-    for exp_name in experiment_names:
-        # Check if it's a group name
-        if exp_name in EXPERIMENTS:
-            experiment_classes.extend(EXPERIMENTS[exp_name])
-        # Check if it's an individual experiment
-        elif exp_name in all_available_exp:
-            experiment_classes.append(all_available_exp[exp_name])
-        else:
-            not_found.append(exp_name)
-
-    return experiment_classes, not_found
-
-
 def main() -> None:
     parser = optparse.OptionParser()
     parser.add_option(
@@ -114,6 +94,48 @@ def main() -> None:
         help="Comma-separated list of simulation experiments and/or groups (for '--action simulate'). "
              "Use '--action list_experiments' to see all available options.",
     )
+    parser.add_option(
+        "-j", "--jobs",
+        dest="jobs",
+        type="int",
+        default=1,
+        help="Optional: Number of worker processes for the simulations and figures (default: 1, serial)",
+    )
+    parser.add_option(
+        "--no-cache",
+        dest="cache",
+        action="store_false",
+        default=True,
+        help="Optional: Do not use the simulation result cache (default: cache in '<results-dir>/cache')",
+    )
+    parser.add_option(
+        "--fast-forward",
+        dest="fast_forward",
+        action="store_true",
+        default=False,
+        help="Optional: Fast-forward multiple dosing to the periodic steady state (default: integrate all doses)",
+    )
+    parser.add_option(
+        "--adaptive-grid",
+        dest="adaptive_grid",
+        action="store_true",
+        default=False,
+        help="Optional: Store results on an error-controlled output grid (default: all steps)",
+    )
+    parser.add_option(
+        "--no-figures",
+        dest="figures",
+        action="store_false",
+        default=True,
+        help="Optional: Only simulate and store the results, create figures later with '--action render' (default: create figures)",
+    )
+    parser.add_option(
+        "--incremental",
+        dest="incremental",
+        action="store_true",
+        default=False,
+        help="Optional: Skip experiments whose sources, data, model and settings are unchanged since the last run (default: run all)",
+    )
 
     console.rule("[bold cyan]DAPAGLIFLOZIN PBPK/PD MODEL[/bold cyan]", style="cyan")
 
@@ -151,15 +173,15 @@ def main() -> None:
     elif action == Action.LIST_EXPERIMENTS:
         _list_available_experiments()
 
-    elif action == Action.SIMULATE:
+    elif action in (Action.SIMULATE, Action.RENDER):
         if not options.experiments:
-            _parser_message("For '--action simulate', the '--experiments' argument is required.")
+            _parser_message(f"For '--action {action.value}', the '--experiments' argument is required.")
 
         # Parse experiment names
         exp_list = [e.strip() for e in options.experiments.split(",")]
 
-        # Resolve names to experiment classes
-        experiment_classes, not_found = _resolve_experiment_names(exp_list)
+        # Resolve names, only the selected experiments are imported
+        experiment_names, not_found = resolve_experiment_names(exp_list)
 
         # Report any experiments that weren't found
         if not_found:
@@ -167,23 +189,57 @@ def main() -> None:
             console.print(f"[red]Warning: The following experiments were not found: {', '.join(not_found)}[/red]")
             console.rule(style="red bold")
 
-        if not experiment_classes:
+        if not experiment_names:
             console.rule(style="red bold")
             console.print("[red]Error: No valid experiments to run![/red]")
             console.rule(style="red bold")
             return
 
-        # Run the experiments
+        from pkdb_models.models.dapagliflozin.simulations import (
+            render_simulation_experiments,
+            run_simulation_experiments,
+        )
+
+        experiment_classes = load_experiments(experiment_names)
         results_path = _get_current_results_path()
-        console.rule("[bold cyan]Running Simulations[/bold cyan]", style="cyan")
-        run_simulation_experiments(experiment_classes=experiment_classes)
-        console.print("[bold green]Simulations finished.[/bold green]")
+        if action == Action.RENDER:
+            # Create figures from the stored results
+            console.rule("[bold cyan]Rendering Figures[/bold cyan]", style="cyan")
+            render_simulation_experiments(
+                experiment_classes=experiment_classes, n_jobs=options.jobs
+            )
+            console.print("[bold green]Rendering finished.[/bold green]")
+        else:
+            # Run the experiments
+            console.rule("[bold cyan]Running Simulations[/bold cyan]", style="cyan")
+            run_simulation_experiments(
+                experiment_classes=experiment_classes,
+                n_jobs=options.jobs,
+                use_cache=options.cache,
+                fast_forward=options.fast_forward,
+                adaptive_grid=options.adaptive_grid,
+                figures=options.figures,
+                incremental=options.incremental,
+            )
+            console.print("[bold green]Simulations finished.[/bold green]")
         console.print(f"[bold green]Results saved to: {results_path / 'simulation'}[/bold green]")
 
     elif action == Action.ALL:
         console.rule("[bold cyan]Running: Factory and all simulations.[/bold cyan]", style="cyan")
         _run_factory()
-        run_simulation_experiments(selected="all")
+        from pkdb_models.models.dapagliflozin.simulations import (
+            run_simulation_experiments,
+        )
+
+        run_simulation_experiments(
+            selected="all",
+            n_jobs=options.jobs,
+            use_cache=options.cache,
+            fast_forward=options.fast_forward,
+            adaptive_grid=options.adaptive_grid,
+            figures=options.figures,
+            incremental=options.incremental,
+        )
         console.print("\n[bold green]All scripts completed successfully![/bold green]")
 
     console.rule(style="white")
@@ -212,6 +268,22 @@ if __name__ == "__main__":
        Run all experiments:
        $ run_dapagliflozin --action simulate --experiments all
 
+       Run all experiments on 32 worker processes:
+       $ run_dapagliflozin --action simulate --experiments all --jobs 32
+
+       Fast-forward multiple dosing to the periodic steady state:
+       $ run_dapagliflozin --action simulate --experiments Komoroski2009 --fast-forward
+
+       Simulate on a compute node and create the figures and report later:
+       $ run_dapagliflozin --action simulate --experiments all --jobs 32 --no-figures
+       $ run_dapagliflozin --action render --experiments all --jobs 8
+
+       Store results on the error-controlled output grid:
+       $ run_dapagliflozin --action simulate --experiments all --adaptive-grid
+
+       Only rerun the experiments which changed since the last run:
+       $ run_dapagliflozin --action simulate --experiments all --incremental
+
     5. Run Everything:
        Runs factory and all simulations.
        $ run_dapagliflozin --action all
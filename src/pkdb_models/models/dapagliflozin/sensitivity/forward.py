@@ -0,0 +1,186 @@
+"""Forward sensitivities of the model states.
+
+Shared by the local sensitivity analysis via forward sensitivities
+(`sensitivity_analysis.ForwardSensitivityAnalysis`) and the Jacobian of the
+fit residuals (`fitting.jacobian`). The derivatives of the state variables
+with respect to the parameters are calculated by the forward sensitivity
+solver of roadrunner (CVODES) in a single augmented integration.
+Concentrations are derived from the amounts and the compartment volumes.
+
+Initial sensitivities of the solver are zero, i.e., derivatives for
+parameters which change the initial state (e.g. via initial assignments) are
+wrong and have to be calculated by finite differences
+(see `initial_state_parameters`).
+"""
+from typing import Callable, Dict, Iterable, List, Optional
+
+import libsbml
+import numpy as np
+import roadrunner
+from roadrunner._roadrunner import NamedArray
+
+
+def species_compartments(r: roadrunner.RoadRunner) -> Dict[str, str]:
+    """Compartments of the species of the model."""
+    doc: libsbml.SBMLDocument = libsbml.readSBMLFromString(r.getCurrentSBML())
+    return {s.getId(): s.getCompartment() for s in doc.getModel().getListOfSpecies()}
+
+
+def derivative_assignment(
+    r: roadrunner.RoadRunner, sid: str, parameter_ids: List[str], h: float = 1e-6
+) -> np.ndarray:
+    """Derivatives of an assigned model variable (no integration)."""
+    d = np.zeros(len(parameter_ids))
+    for k, pid in enumerate(parameter_ids):
+        value = r[pid]
+        delta = h * abs(value) if value != 0 else h
+        r[pid] = value + delta
+        up = r[sid]
+        r[pid] = value - delta
+        down = r[sid]
+        r[pid] = value
+        d[k] = (up - down) / (2 * delta)
+    return d
+
+
+def initial_state_parameters(
+    r: roadrunner.RoadRunner,
+    parameter_ids: List[str],
+    apply: Callable[[Dict[str, float]], None],
+    difference: float = 0.01,
+) -> List[str]:
+    """Parameters which change the initial state (e.g. via initial assignments).
+
+    :param apply: resets the model and applies the changes of the simulation
+        updated by the given changes
+    :param difference: relative change of the parameters
+    """
+    apply({})
+    x0 = np.array(r.model.getFloatingSpeciesAmounts())
+    values = {pid: r[pid] for pid in parameter_ids}
+    pids = []
+    for pid, value in values.items():
+        apply({pid: value * (1 + difference)})
+        x = np.array(r.model.getFloatingSpeciesAmounts())
+        if not np.allclose(x, x0, rtol=1e-12, atol=0):
+            pids.append(pid)
+    apply({})
+    return pids
+
+
+class ForwardSensitivities:
+    """Timecourse of a simulation with the forward sensitivities of the states."""
+
+    def __init__(
+        self,
+        result: NamedArray,
+        sens: np.ndarray,
+        variables: Dict[str, int],
+        volumes: Dict[str, tuple],
+        compartments: Dict[str, str],
+    ):
+        """
+        :param result: timecourse of the selections
+        :param sens: sensitivities (n_parameters, n_variables, n_time)
+        :param variables: indices of the state variables in sens
+        :param volumes: compartment volumes and their derivatives (n_parameters,)
+        :param compartments: compartments of the species
+        """
+        self.result = result
+        self.time: np.ndarray = result["time"]
+        self.sens = sens
+        self.variables = variables
+        self.volumes = volumes
+        self.compartments = compartments
+
+    def derivative(self, sid: str) -> Optional[np.ndarray]:
+        """Derivatives of a state variable or concentration (n_parameters, n_time).
+
+        :return: derivatives or None if sid is not a state variable or the
+            concentration of a species which is not selected or in a
+            compartment without volume
+        """
+        if not sid.startswith("["):
+            if sid not in self.variables:
+                return None
+            return self.sens[:, self.variables[sid], :]
+        species_id = sid[1:-1]
+        compartment_id = self.compartments.get(species_id)
+        if (
+            species_id not in self.variables
+            or compartment_id not in self.volumes
+            or sid not in self.result.colnames
+        ):
+            return None
+        volume, dvolume = self.volumes[compartment_id]
+        # c = A/V -> dc/dp = (dA/dp - c * dV/dp) / V
+        return (
+            self.sens[:, self.variables[species_id], :]
+            - np.outer(dvolume, self.result[sid])
+        ) / volume
+
+
+def forward_sensitivities(
+    r: roadrunner.RoadRunner,
+    parameter_ids: List[str],
+    start: float,
+    end: float,
+    steps: int,
+    reset: Callable[[], None],
+    compartments: Dict[str, str],
+    concentrations: Iterable[str] = (),
+) -> ForwardSensitivities:
+    """Timecourse and forward sensitivities of the states on a uniform grid.
+
+    The selections of the timecourse are the timecourse selections of r.
+
+    :param reset: resets the model and applies the changes of the simulation
+    :param compartments: compartments of the species (`species_compartments`)
+    :param concentrations: concentrations, e.g. '[Cve_dap]', for which the
+        derivatives are required
+    """
+    variable_step_size = r.integrator.getValue("variable_step_size")
+    r.integrator.setValue("variable_step_size", False)
+    try:
+        reset()
+        s = r.simulate(start=start, end=end, steps=steps)
+
+        # compartment volumes and their derivatives at t0, valid for volumes
+        # which depend only on parameters (no rate rules or species)
+        reset()
+        volumes: Dict[str, tuple] = {}
+        for sid in concentrations:
+            compartment_id = compartments.get(sid[1:-1])
+            if compartment_id is not None and compartment_id not in volumes:
+                volumes[compartment_id] = (
+                    r[compartment_id],
+                    derivative_assignment(r, compartment_id, parameter_ids),
+                )
+
+        r.setSensitivitySolver("forward")
+        solver = r.getSensitivitySolver()
+        # simultaneous corrector fails to converge for the model
+        solver.sensitivity_method = "staggered"
+        # the first integration after a change of the parameters does not use
+        # the current model state, a short warm up integration initializes it
+        solver.syncWithModel(r.model)
+        r.timeSeriesSensitivities(start, start + 1, 2, params=parameter_ids, k=0)
+        reset()
+        solver.syncWithModel(r.model)
+        _, sens, rownames, colnames = r.timeSeriesSensitivities(
+            start, end, steps + 1, params=parameter_ids, k=0
+        )
+    finally:
+        r.integrator.setValue("variable_step_size", variable_step_size)
+
+    # (time, parameter, variable) -> (parameter, variable, time)
+    sens = np.moveaxis(np.asarray(sens), 0, -1)
+    pidx = {pid: k for k, pid in enumerate(rownames)}
+    sens = sens[[pidx[pid] for pid in parameter_ids], :, :]
+    return ForwardSensitivities(
+        result=s,
+        sens=sens,
+        variables={sid: k for k, sid in enumerate(colnames)},
+        volumes=volumes,
+        compartments=compartments,
+    )
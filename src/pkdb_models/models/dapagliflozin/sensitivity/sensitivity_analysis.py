@@ -1,7 +1,9 @@
 """Sensitivity analysis."""
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
+import pandas as pd
 import xarray as xr
 from roadrunner._roadrunner import NamedArray
 
@@ -15,14 +17,25 @@ from sbmlsim.sensitivity.parameters import (
     SensitivityParameter,
     parameters_for_sensitivity_analysis,
 )
+from sbmlutils import log
 from sbmlutils.console import console
 from pkdb_analysis.pk.pharmacokinetics import TimecoursePK
 from pint import UnitRegistry
 
+from pkdb_models.models.dapagliflozin.pk import pk_kernel
+from pkdb_models.models.dapagliflozin.sensitivity.forward import (
+    forward_sensitivities,
+    initial_state_parameters,
+    species_compartments,
+)
+
+logger = log.get_logger(__name__)
 
 class DapagliflozinSensitivitySimulation(SensitivitySimulation):
     """Simulation for sensitivity calculation."""
     tend = 2 * 24 * 60  # [min]
+    steps = 1000
+    min_treshold = 1E4
 
 
     def simulate(self, changes: dict[str, float]) -> dict[str, float]:
@@ -32,7 +45,7 @@ class DapagliflozinSensitivitySimulation(SensitivitySimulation):
             **changes
         }
         self.apply_changes(all_changes, reset_all=True)
-        s: NamedArray = self.rr.simulate(start=0, end=self.tend, steps=1000)
+        s: NamedArray = self.rr.simulate(start=0, end=self.tend, steps=self.steps)
         # self._plot(s)
 
         # pharmacokinetic parameters
@@ -51,7 +64,7 @@ class DapagliflozinSensitivitySimulation(SensitivitySimulation):
                 substance="dapagliflozin",
                 ureg=ureg,
                 dose=None,
-                min_treshold=1E4,
+                min_treshold=self.min_treshold,
             )
             pk_dict = tcpk.pk.to_dict()
             for pk_key in [
@@ -70,6 +83,121 @@ class DapagliflozinSensitivitySimulation(SensitivitySimulation):
 
         return d
 
+    def simulate_timecourses(
+        self, changes: list[dict[str, float]]
+    ) -> dict[str, np.ndarray]:
+        """Timecourses of the selections for the changes of the samples.
+
+        :return: time (n_time,), timecourses (n_samples, n_time) of the
+            selections, NaN for failed simulations
+        """
+        n_time = self.steps + 1
+        sids = [sid for sid in self.selections if sid != "time"]
+        y = {sid: np.full((len(changes), n_time), np.nan) for sid in sids}
+        for k, sample_changes in enumerate(changes):
+            try:
+                self.apply_changes(
+                    {**self.changes_simulation, **sample_changes}, reset_all=True
+                )
+                s = self.rr.simulate(start=0, end=self.tend, steps=self.steps)
+                for sid in sids:
+                    y[sid][k, :] = s[sid]
+            except Exception as err:
+                logger.warning(f"Sample {k} could not be simulated: {err}")
+        y["time"] = np.linspace(0, self.tend, n_time)
+        return y
+
+    def pk_outputs(self, y: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+        """Outputs of all samples in one pass (see `simulate`).
+
+        :param y: timecourses of `simulate_timecourses`
+        :return: outputs (n_samples,) in model units
+        """
+        time = y["time"]
+        d: dict[str, np.ndarray] = {}
+        for sid in ["dap", "d3g"]:
+            pk = pk_kernel(time, y[f"[Cve_{sid}]"], min_treshold=self.min_treshold)
+            for pk_key in ["aucinf", "cmax", "thalf"]:
+                d[f"{sid}_{pk_key}"] = pk[pk_key]
+
+        t_idx = np.argmin(np.abs(time - 24 * 60))
+        d["uge24"] = y["KI__UGE"][:, t_idx]
+        return d
+
+    def simulate_forward(
+        self, parameter_ids: list[str]
+    ) -> tuple[dict[str, float], dict[str, np.ndarray]]:
+        """Outputs and derivatives of the outputs with respect to the parameters.
+
+        The derivatives of the states are calculated in a single augmented
+        integration (see `sensitivity.forward`), the derivatives of the outputs
+        follow via the chain rule through the pharmacokinetic calculation
+        (see `simulate`).
+
+        :return: outputs, derivatives of outputs (n_parameters,)
+        """
+        fs = forward_sensitivities(
+            self.rr,
+            parameter_ids,
+            start=0,
+            end=self.tend,
+            steps=self.steps,
+            reset=lambda: self.apply_changes(self.changes_simulation, reset_all=True),
+            compartments=self._species_compartments(),
+            concentrations=["[Cve_dap]", "[Cve_d3g]"],
+        )
+        s, time, derivative = fs.result, fs.time, fs.derivative
+
+        outputs: dict[str, float] = {}
+        derivatives: dict[str, np.ndarray] = {}
+        for sid in ["dap", "d3g"]:
+            values, dvalues = _pk_derivatives(
+                time=time,
+                concentration=s[f"[Cve_{sid}]"],
+                dconcentration=derivative(f"[Cve_{sid}]"),
+                min_treshold=self.min_treshold,
+            )
+            for pk_key in ["aucinf", "cmax", "thalf"]:
+                outputs[f"{sid}_{pk_key}"] = values[pk_key]
+                derivatives[f"{sid}_{pk_key}"] = dvalues[pk_key]
+
+        # UGE is an assignment rule and not part of the sensitivities,
+        # UGE = KI__glc_urine * KI__Mr_glc / KI__cf_mg_per_g
+        t_idx = np.argmin(np.abs(time - 24 * 60))
+        uge = s["KI__UGE"][t_idx]
+        mr, cf = self.rr["KI__Mr_glc"], self.rr["KI__cf_mg_per_g"]
+        direct = {"KI__Mr_glc": uge / mr, "KI__cf_mg_per_g": -uge / cf}
+        outputs["uge24"] = uge
+        derivatives["uge24"] = derivative("KI__glc_urine")[:, t_idx] * mr / cf
+        derivatives["uge24"] += np.array([direct.get(pid, 0.0) for pid in parameter_ids])
+
+        self.apply_changes(self.changes_simulation, reset_all=True)
+        return outputs, derivatives
+
+    def initial_state_parameters(
+        self, parameter_ids: list[str], difference: float = 0.01
+    ) -> list[str]:
+        """Parameters which change the initial state (e.g. via initial assignments).
+
+        Initial sensitivities of the forward sensitivity solver are zero, so
+        derivatives for these parameters are calculated by finite differences
+        (see `sensitivity.forward.initial_state_parameters`).
+        """
+        return initial_state_parameters(
+            self.rr,
+            parameter_ids,
+            apply=lambda changes: self.apply_changes(
+                {**self.changes_simulation, **changes}, reset_all=True
+            ),
+            difference=difference,
+        )
+
+    def _species_compartments(self) -> dict[str, str]:
+        """Compartments of the species."""
+        if not hasattr(self, "_compartments"):
+            self._compartments = species_compartments(self.rr)
+        return self._compartments
+
     def _plot(self, s: NamedArray) -> None:
 
         # plotting
@@ -84,10 +212,129 @@ class DapagliflozinSensitivitySimulation(SensitivitySimulation):
         plt.show()
 
 
+
+def _pk_derivatives(
+    time: np.ndarray,
+    concentration: np.ndarray,
+    dconcentration: np.ndarray,
+    min_treshold: float,
+) -> tuple[dict[str, float], dict[str, np.ndarray]]:
+    """Pharmacokinetic parameters and their derivatives.
+
+    The derivatives of the concentration (n_parameters, n_time) are propagated
+    through the AUC (trapezoid rule), the regression of the log concentrations
+    after the maximum (kel, thalf) and the extrapolation of the AUC to infinity.
+    Data points and maximum are the ones of `pk_kernel`.
+    """
+    pk = {k: v[0] for k, v in pk_kernel(time, concentration, min_treshold=min_treshold).items()}
+    c = np.array(concentration, dtype=float)
+    cmax = np.nanmax(c)
+    if min_treshold * np.nanmin(c[c != 0]) < cmax:
+        c[c * min_treshold < cmax] = np.nan
+    valid = np.where(~np.isnan(c))[0]
+
+    # auc
+    t_v, dc_v = time[valid], dconcentration[:, valid]
+    dauc = np.sum((t_v[1:] - t_v[:-1]) * (dc_v[:, 1:] + dc_v[:, :-1]) / 2.0, axis=1)
+
+    # cmax
+    max_idx = int(np.nanargmax(c))
+    dcmax = dconcentration[:, max_idx]
+
+    # kel, thalf: regression of log(c) ~ t after the maximum, d log(c) = dc/c
+    with np.errstate(invalid="ignore", divide="ignore"):
+        y = np.log(c)
+    w = (np.arange(len(c)) > max_idx) & ~np.isnan(y)
+    dx = time[w] - np.mean(time[w])
+    dslope = (dconcentration[:, w] / c[w]) @ dx / np.sum(dx**2)
+    kel = pk["kel"]
+    dkel = -dslope
+    dthalf = -np.log(2) / kel**2 * dkel
+
+    # aucinf = auc + c_last/kel
+    c_last = c[valid[-1]]
+    daucinf = dauc + dconcentration[:, valid[-1]] / kel - c_last / kel**2 * dkel
+
+    return pk, {"aucinf": daucinf, "cmax": dcmax, "thalf": dthalf}
+
+
+class ForwardSensitivityAnalysis:
+    """Local sensitivity analysis via forward sensitivities.
+
+    Alternative to the finite differences of the `LocalSensitivityAnalysis`
+    with the same `sensitivity_df`. Derivatives of all parameters are
+    calculated in one augmented integration instead of two simulations per
+    parameter. Parameters which change the initial state of the model or
+    without finite forward sensitivities are calculated with central
+    differences.
+    """
+
+    def __init__(
+        self,
+        sensitivity_simulation: DapagliflozinSensitivitySimulation,
+        parameters: list[SensitivityParameter],
+        difference: float = 0.01,
+    ):
+        self.sensitivity_simulation = sensitivity_simulation
+        self.parameters = parameters
+        self.difference = difference
+        self.sensitivity_df: Optional[pd.DataFrame] = None
+
+    def calculate_sensitivity(self) -> pd.DataFrame:
+        """Calculate the normalized sensitivities (dy/y) / (dp/p)."""
+        sim = self.sensitivity_simulation
+        output_ids = [o.uid for o in sim.outputs]
+        sim.apply_changes(sim.changes_simulation, reset_all=True)
+        values = {p.uid: sim.rr[p.uid] for p in self.parameters}
+
+        fd_ids = sim.initial_state_parameters(list(values), difference=self.difference)
+        forward_ids = [pid for pid in values if pid not in fd_ids]
+        console.print(
+            f"Forward sensitivities: {len(forward_ids)} parameters, "
+            f"finite differences: {len(fd_ids)} parameters"
+        )
+
+        outputs, derivatives = sim.simulate_forward(forward_ids)
+        df = pd.DataFrame(
+            {uid: derivatives[uid] for uid in output_ids}, index=forward_ids
+        )
+        # not finite forward sensitivities, e.g. power laws evaluated at zero
+        failed_ids = list(df.index[~np.all(np.isfinite(df.values), axis=1)])
+        if failed_ids:
+            console.print(f"Forward sensitivities not finite: {failed_ids}")
+        for pid in fd_ids + failed_ids:
+            h = self.difference * values[pid]
+            up = sim.simulate({pid: values[pid] + h})
+            down = sim.simulate({pid: values[pid] - h})
+            df.loc[pid] = [(up[uid] - down[uid]) / (2 * h) for uid in output_ids]
+
+        # normalized sensitivities in order of the parameters
+        df = df.loc[list(values)]
+        p = np.array([values[pid] for pid in df.index])
+        y = np.array([outputs[uid] for uid in output_ids])
+        self.sensitivity_df = df * p[:, np.newaxis] / y[np.newaxis, :]
+        return self.sensitivity_df
+
+    def plot_sensitivity(self) -> None:
+        """Plot heatmap of the normalized sensitivities."""
+        from matplotlib import pyplot as plt
+
+        df = self.sensitivity_df
+        names = {o.uid: o.name for o in self.sensitivity_simulation.outputs}
+        vmax = np.nanmax(np.abs(df.values))
+        f, ax = plt.subplots(figsize=(0.8 * len(df.columns) + 3, 0.25 * len(df) + 2))
+        im = ax.imshow(df.values, cmap="seismic", vmin=-vmax, vmax=vmax, aspect="auto")
+        ax.set_xticks(range(len(df.columns)))
+        ax.set_xticklabels([names.get(c, c) for c in df.columns], rotation=90)
+        ax.set_yticks(range(len(df.index)))
+        ax.set_yticklabels(df.index)
+        f.colorbar(im, ax=ax, label="normalized sensitivity")
+
+
 if __name__ == "__main__":
     from pkdb_models.models.dapagliflozin import MODEL_PATH, MODEL_BASE_PATH
 
-    sensitivity_simulation = DapagliflozinSensitivitySimulation(
+    simulation_kwargs = dict(
         model_path=MODEL_PATH,
         selections=[
             "time",
@@ -108,6 +355,7 @@ if __name__ == "__main__":
             SensitivityOutput(uid='uge24', name='UGE (24h)'),
         ]
     )
+    sensitivity_simulation = DapagliflozinSensitivitySimulation(**simulation_kwargs)
     console.print(sensitivity_simulation.outputs)
 
     # parameters for sensitivity analysis
@@ -134,28 +382,68 @@ if __name__ == "__main__":
     )
     # parameters = [parameters[k] for k in range(5)]
 
-    """ Local Sensitivity Analysis """
+    """ Sensitivity Analysis """
+    from pkdb_models.models.dapagliflozin import RESULTS_PATH
+
+    # finite differences ("difference"), forward sensitivities ("forward")
+    # or global Sobol sensitivity analysis ("sobol")
+    method = "difference"
     difference = 0.01
-    sa = LocalSensitivityAnalysis(
-        sensitivity_simulation=sensitivity_simulation,
-        parameters=parameters,
-        difference=difference,
-    )
-    sa.create_samples()
-    console.print(sa.samples)
-    sa.simulate_samples()
-    console.print(sa.results)
-    sa.calculate_sensitivity()
-    console.print(sa.sensitivity)
-    sa.plot_sensitivity()
+    if method == "sobol":
+        from pkdb_models.models.dapagliflozin.sensitivity.sobol import (
+            GlobalSobolSensitivityAnalysis,
+        )
+
+        sa = GlobalSobolSensitivityAnalysis(
+            simulation_class=DapagliflozinSensitivitySimulation,
+            simulation_kwargs=simulation_kwargs,
+            parameters=parameters,
+            outputs=simulation_kwargs["outputs"],
+            checkpoint_dir=RESULTS_PATH / "sensitivity" / "sobol_checkpoint",
+            n_samples=2048,
+            variation=0.1,
+        )
+        sa.create_samples()
+        sa.simulate_samples()
+        sa.calculate_sensitivity()
+        console.print(sa.sensitivity_df)
+        sa.plot_sensitivity()
+        sensitivity_fname = "parameter_sobol_sensitivity"
+    elif method == "forward":
+        sa = ForwardSensitivityAnalysis(
+            sensitivity_simulation=sensitivity_simulation,
+            parameters=parameters,
+            difference=difference,
+        )
+        sa.calculate_sensitivity()
+        console.print(sa.sensitivity_df)
+        sa.plot_sensitivity()
+        sensitivity_fname = "parameter_local_sensitivity_forward"
+    else:
+        sa = LocalSensitivityAnalysis(
+            sensitivity_simulation=sensitivity_simulation,
+            parameters=parameters,
+            difference=difference,
+        )
+        sa.create_samples()
+        console.print(sa.samples)
+        sa.simulate_samples()
+        console.print(sa.results)
+        sa.calculate_sensitivity()
+        console.print(sa.sensitivity)
+        sa.plot_sensitivity()
+        sensitivity_fname = f"parameter_local_sensitivity_{difference}"
     df = sa.sensitivity_df
 
-    from pkdb_models.models.dapagliflozin import RESULTS_PATH
     sensitivity_dir = RESULTS_PATH / "sensitivity"
     Path(sensitivity_dir).mkdir(parents=True, exist_ok=True)
-    sensitivity_fname = f"parameter_local_sensitivity_{difference}"
 
     df.to_csv(sensitivity_dir / f"{sensitivity_fname}.tsv", sep="\t")
+    if method == "sobol":
+        for index in ["S1", "ST"]:
+            sa.index_df(index).to_csv(
+                sensitivity_dir / f"{sensitivity_fname}_{index}.tsv", sep="\t"
+            )
 
     from matplotlib import pyplot as plt
     plt.savefig(
@@ -164,15 +452,5 @@ if __name__ == "__main__":
     plt.show()
 
 
-    #
-    # console.print(parameters)
-
-    #
-    # SamplingSensitivityAnalysis
-    # sa = GlobalSobolSensitivityAnalysis(
-    #     sensitivity_simulation=sensitivity_simulation,
-    #     parameters=list(parameters.keys()),
-    # )
-
 
 
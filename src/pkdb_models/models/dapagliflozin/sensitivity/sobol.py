@@ -0,0 +1,324 @@
+"""Global Sobol sensitivity analysis.
+
+The design is a Saltelli sampling scheme based on a scrambled Sobol sequence:
+two independent sample matrices A and B (N x P) and the P matrices AB_i, i.e.,
+A with column i taken from B. The N * (P + 2) samples are simulated on a
+process pool. Evaluated samples are checkpointed in chunks, so that an
+interrupted analysis resumes with the missing chunks.
+
+First order indices are calculated with the estimator of Saltelli2010, total
+indices with the estimator of Jansen1999. Confidence intervals are obtained
+by bootstrapping the N base samples.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+from sbmlsim.sensitivity.analysis import SensitivityOutput
+from sbmlsim.sensitivity.parameters import SensitivityParameter
+from sbmlutils import log
+from sbmlutils.console import console
+
+from pkdb_models.models.dapagliflozin.sensitivity.sensitivity_analysis import (
+    DapagliflozinSensitivitySimulation,
+)
+
+logger = log.get_logger(__name__)
+
+
+def saltelli_samples(
+    bounds: np.ndarray, n: int, seed: Optional[int] = None
+) -> np.ndarray:
+    """Saltelli design for the given parameter bounds.
+
+    :param bounds: lower and upper bounds (P, 2)
+    :param n: number of base samples N, rounded up to a power of two
+    :return: samples (N * (P + 2), P) in the order A, B, AB_1, ..., AB_P
+    """
+    n_par = bounds.shape[0]
+    m = int(np.ceil(np.log2(n)))
+    base = qmc.Sobol(d=2 * n_par, scramble=True, seed=seed).random_base2(m=m)
+    base = qmc.scale(base, np.tile(bounds[:, 0], 2), np.tile(bounds[:, 1], 2))
+    a, b = base[:, :n_par], base[:, n_par:]
+    blocks = [a, b]
+    for k in range(n_par):
+        ab = a.copy()
+        ab[:, k] = b[:, k]
+        blocks.append(ab)
+    return np.vstack(blocks)
+
+
+def sobol_indices(
+    y: np.ndarray,
+    n_parameters: int,
+    n_bootstrap: int = 1000,
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    """First order and total Sobol indices with bootstrap confidence intervals.
+
+    Base samples with failed simulations (NaN) are excluded.
+
+    :param y: outputs of the Saltelli samples (N * (P + 2),)
+    :return: dictionary of S1, ST and the bounds of their confidence intervals (P,)
+    """
+    y = y.reshape(n_parameters + 2, -1)
+    f_a, f_b, f_ab = y[0], y[1], y[2:]
+    ok = np.isfinite(f_a) & np.isfinite(f_b) & np.all(np.isfinite(f_ab), axis=0)
+    f_a, f_b, f_ab = f_a[ok], f_b[ok], f_ab[:, ok]
+
+    def estimate(idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        a, b, ab = f_a[idx], f_b[idx], f_ab[:, idx]
+        var = np.var(np.concatenate([a, b]))
+        s1 = np.mean(b * (ab - a), axis=1) / var
+        st = 0.5 * np.mean((a - ab) ** 2, axis=1) / var
+        return s1, st
+
+    n = len(f_a)
+    s1, st = estimate(np.arange(n))
+    rng = np.random.default_rng(seed)
+    boot = [estimate(rng.integers(0, n, size=n)) for _ in range(n_bootstrap)]
+    s1_boot = np.array([b[0] for b in boot])
+    st_boot = np.array([b[1] for b in boot])
+    q = [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100]
+    s1_low, s1_high = np.percentile(s1_boot, q, axis=0)
+    st_low, st_high = np.percentile(st_boot, q, axis=0)
+    return {
+        "S1": s1,
+        "S1_low": s1_low,
+        "S1_high": s1_high,
+        "ST": st,
+        "ST_low": st_low,
+        "ST_high": st_high,
+    }
+
+
+# sensitivity simulation of a worker process, created once by the pool initializer
+_worker_simulation: Optional[DapagliflozinSensitivitySimulation] = None
+
+
+def _init_worker(
+    simulation_class: Type[DapagliflozinSensitivitySimulation], kwargs: Dict
+) -> None:
+    """Load the model in the worker process."""
+    global _worker_simulation
+    _worker_simulation = simulation_class(**kwargs)
+
+
+def _simulate_chunk(
+    start: int, samples: np.ndarray, parameter_ids: List[str], output_ids: List[str]
+) -> Tuple[int, np.ndarray]:
+    """Simulate the samples of a chunk in the worker process.
+
+    The timecourses of the chunk are collected and the outputs are calculated
+    in a single pass.
+    """
+    sim = _worker_simulation
+    y = sim.simulate_timecourses(
+        [dict(zip(parameter_ids, values)) for values in samples]
+    )
+    outputs = sim.pk_outputs(y)
+    return start, np.column_stack([outputs[uid] for uid in output_ids])
+
+
+class GlobalSobolSensitivityAnalysis:
+    """Global Sobol sensitivity analysis on a process pool with checkpoints.
+
+    Parameters are sampled uniformly in [value * (1 - variation),
+    value * (1 + variation)] around the model values. The design and the
+    evaluated chunks are stored in `checkpoint_dir`; an analysis with the
+    same design, outputs and simulation resumes with the chunks which have
+    not been evaluated.
+    """
+
+    def __init__(
+        self,
+        simulation_class: Type[DapagliflozinSensitivitySimulation],
+        simulation_kwargs: Dict,
+        parameters: List[SensitivityParameter],
+        outputs: List[SensitivityOutput],
+        checkpoint_dir: Path,
+        n_samples: int = 1024,
+        variation: float = 0.1,
+        seed: int = 1234,
+        chunk_size: int = 100,
+        n_jobs: Optional[int] = None,
+    ):
+        """
+        :param simulation_kwargs: arguments to create the sensitivity simulation
+        :param n_samples: number of base samples N (power of two)
+        :param chunk_size: number of samples per checkpoint
+        """
+        self.simulation_class = simulation_class
+        self.simulation_kwargs = simulation_kwargs
+        self.parameters = parameters
+        self.outputs = outputs
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.n_samples = n_samples
+        self.variation = variation
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.n_jobs: int = n_jobs if n_jobs else os.cpu_count()
+
+        self.samples: Optional[np.ndarray] = None
+        self.results: Optional[np.ndarray] = None
+        self.sensitivity_df: Optional[pd.DataFrame] = None
+
+    @property
+    def parameter_ids(self) -> List[str]:
+        return [p.uid for p in self.parameters]
+
+    @property
+    def output_ids(self) -> List[str]:
+        return [o.uid for o in self.outputs]
+
+    def _simulation_key(self) -> str:
+        """Canonical representation of the sensitivity simulation."""
+        return json.dumps(
+            {
+                "class": self.simulation_class.__qualname__,
+                "kwargs": self.simulation_kwargs,
+            },
+            sort_keys=True,
+            default=str,
+        )
+
+    def create_samples(self) -> np.ndarray:
+        """Create the Saltelli design or load the design of the checkpoint."""
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        design_path = self.checkpoint_dir / "design.npz"
+        if design_path.exists():
+            design = np.load(design_path, allow_pickle=False)
+            if (
+                not {"output_ids", "simulation_kwargs"} <= set(design.files)
+                or list(design["parameter_ids"]) != self.parameter_ids
+                or list(design["output_ids"]) != self.output_ids
+                or str(design["simulation_kwargs"]) != self._simulation_key()
+                or int(design["n_samples"]) != self.n_samples
+                or int(design["seed"]) != self.seed
+                or float(design["variation"]) != self.variation
+            ):
+                raise ValueError(
+                    f"Checkpoint in '{self.checkpoint_dir}' was created for a "
+                    f"different design, outputs or simulation, remove it to "
+                    f"start a new analysis."
+                )
+            self.samples = design["samples"]
+            console.print(f"Resuming Sobol design from '{design_path}'")
+            return self.samples
+
+        sim = self.simulation_class(**self.simulation_kwargs)
+        sim.apply_changes(sim.changes_simulation, reset_all=True)
+        values = np.array([sim.rr[pid] for pid in self.parameter_ids])
+        bounds = np.column_stack(
+            [values * (1 - self.variation), values * (1 + self.variation)]
+        )
+        bounds.sort(axis=1)
+        self.samples = saltelli_samples(bounds, n=self.n_samples, seed=self.seed)
+
+        tmp_path = design_path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp_path,
+            samples=self.samples,
+            parameter_ids=np.array(self.parameter_ids),
+            output_ids=np.array(self.output_ids),
+            simulation_kwargs=np.array(self._simulation_key()),
+            n_samples=self.n_samples,
+            seed=self.seed,
+            variation=self.variation,
+        )
+        os.replace(tmp_path, design_path)
+        return self.samples
+
+    def _chunk_path(self, start: int) -> Path:
+        return self.checkpoint_dir / f"chunk_{start:08d}.npy"
+
+    def simulate_samples(self) -> np.ndarray:
+        """Simulate all samples which are not checkpointed."""
+        if self.samples is None:
+            self.create_samples()
+        n_total = len(self.samples)
+        starts = list(range(0, n_total, self.chunk_size))
+        pending = [s for s in starts if not self._chunk_path(s).exists()]
+        console.print(
+            f"Sobol samples: {n_total} ({len(starts) - len(pending)}/{len(starts)} "
+            f"chunks checkpointed)"
+        )
+
+        if pending:
+            with ProcessPoolExecutor(
+                max_workers=self.n_jobs,
+                initializer=_init_worker,
+                initargs=(self.simulation_class, self.simulation_kwargs),
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        _simulate_chunk,
+                        start,
+                        self.samples[start:start + self.chunk_size],
+                        self.parameter_ids,
+                        self.output_ids,
+                    )
+                    for start in pending
+                ]
+                for k, future in enumerate(as_completed(futures)):
+                    start, y = future.result()
+                    path = self._chunk_path(start)
+                    tmp_path = path.with_suffix(".tmp.npy")
+                    np.save(tmp_path, y)
+                    os.replace(tmp_path, path)
+                    console.print(f"Checkpoint {k + 1}/{len(pending)}: samples {start}")
+
+        self.results = np.vstack([np.load(self._chunk_path(s)) for s in starts])
+        return self.results
+
+    def calculate_sensitivity(
+        self, n_bootstrap: int = 1000, confidence: float = 0.95
+    ) -> pd.DataFrame:
+        """Calculate the Sobol indices with confidence intervals for all outputs."""
+        dfs = []
+        for k, uid in enumerate(self.output_ids):
+            indices = sobol_indices(
+                self.results[:, k],
+                n_parameters=len(self.parameters),
+                n_bootstrap=n_bootstrap,
+                confidence=confidence,
+                seed=self.seed,
+            )
+            df = pd.DataFrame(indices)
+            df.insert(0, "parameter", self.parameter_ids)
+            df.insert(0, "output", uid)
+            dfs.append(df)
+        self.sensitivity_df = pd.concat(dfs, ignore_index=True)
+        return self.sensitivity_df
+
+    def index_df(self, index: str = "ST") -> pd.DataFrame:
+        """Indices in the layout of the local sensitivities (parameters x outputs)."""
+        return self.sensitivity_df.pivot(
+            index="parameter", columns="output", values=index
+        ).loc[self.parameter_ids, self.output_ids]
+
+    def plot_sensitivity(self) -> None:
+        """Plot heatmaps of the first order and total indices."""
+        from matplotlib import pyplot as plt
+
+        names = {o.uid: o.name for o in self.outputs}
+        f, axes = plt.subplots(
+            nrows=1, ncols=2,
+            figsize=(1.6 * len(self.outputs) + 6, 0.25 * len(self.parameters) + 2),
+            layout="constrained",
+        )
+        for ax, index in zip(axes, ["S1", "ST"]):
+            df = self.index_df(index)
+            im = ax.imshow(df.values, cmap="Reds", vmin=0, vmax=1, aspect="auto")
+            ax.set_title(index)
+            ax.set_xticks(range(len(df.columns)))
+            ax.set_xticklabels([names.get(c, c) for c in df.columns], rotation=90)
+            ax.set_yticks(range(len(df.index)))
+            ax.set_yticklabels(df.index)
+        f.colorbar(im, ax=axes, label="Sobol index")
@@ -1,132 +1,50 @@
 """Run all simulation experiments."""
 import shutil
-from typing import List
+from typing import List, Optional, Tuple
 from pathlib import Path
 from sbmlutils.console import console
-from pkdb_models.models.dapagliflozin.helpers import run_experiments
-from pkdb_models.models.dapagliflozin.experiments.studies import *
-from pkdb_models.models.dapagliflozin.experiments.misc import *
-from pkdb_models.models.dapagliflozin.experiments.scans import *
+from pkdb_models.models.dapagliflozin.cache import SimulationCache
+from pkdb_models.models.dapagliflozin.helpers import render_experiments, run_experiments
+from pkdb_models.models.dapagliflozin.steady_state import FastForward
+from pkdb_models.models.dapagliflozin.output_grid import OutputGrid
+from pkdb_models.models.dapagliflozin.registry import EXPERIMENT_GROUPS, load_experiments
 import pkdb_models.models.dapagliflozin as dapagliflozin
 from sbmlutils import log
 from sbmlsim.plot import Figure
 
 logger = log.get_logger(__name__)
 
-EXPERIMENTS = {
-    "studies": [
-        Boulton2013,
-        Cho2021,
-        FDAMB102002,
-        FDAMB102003,
-        FDAMB102006,
-        FDAMB102007,
-        Gould2013,
-        Hwang2022a,
-        Imamura2013,
-        Jang2020,
-        Kasichayanula2011,
-        Kasichayanula2011a,
-        Kasichayanula2011b,
-        Kasichayanula2011c,
-        Kasichayanula2012,
-        Kasichayanula2013,
-        Kasichayanula2013a,
-        Khomitskaya2018,
-        Kim2023,
-        Kim2023a,
-        Komoroski2009,
-        LaCreta2016,
-        Obermeier2010,
-        Sha2015,
-        Shah2019a,
-        vanderAartvanderBeek2020,
-        Watada2019,
-        Yang2013,
-    ],
-    "pharmacodynamics": [
-        FDAMB102002,
-        FDAMB102003,
-        FDAMB102007,
-        Gould2013,
-        Kasichayanula2011a,
-        Kim2023,
-        Komoroski2009,
-        Sha2015,
-        Watada2019,
-        Yang2013,
-    ],
-    "dose_dependency": [
-        FDAMB102002,
-        FDAMB102003,
-        Gould2013,
-        Kasichayanula2011a,
-        Komoroski2009,
-        Watada2019,
-        Yang2013,
-    ],
-    "food": [
-        Kasichayanula2011b,
-        Komoroski2009,
-        LaCreta2016,
-        Shah2019a,
-    ],
-    "hepatic_impairment": [
-        Kasichayanula2011,
-    ],
-    "renal_impairment": [
-        Kasichayanula2013,
-        FDAMB102007,
-    ],
-    "misc": [
-        DoseDependencyExperiment,
-        FoodEffect,
-        HepaticRenalImpairment,
-    ],
-    "scan": [
-        DapagliflozinParameterScan,
-    ]
-}
-
-EXPERIMENTS["all"] = EXPERIMENTS["studies"] + EXPERIMENTS["misc"] + EXPERIMENTS["scan"]
 
-
-def run_simulation_experiments(
-    selected: str = None,
-    experiment_classes: List = None,
-    output_dir: Path = None
-) -> None:
-    """Run dapagliflozin simulation experiments."""
-
-    Figure.fig_dpi = 600
-    Figure.legend_fontsize = 10
-
-    # Determine which experiments to run
+def _select_experiments(
+    selected: Optional[str],
+    experiment_classes: Optional[List],
+    output_dir: Optional[Path],
+) -> Optional[Tuple[List, Path]]:
+    """Experiments and output directory of a selection, None for invalid selection."""
     if experiment_classes is not None:
-        experiments_to_run = experiment_classes
         if output_dir is None:
             output_dir = dapagliflozin.RESULTS_PATH_SIMULATION / "custom_selection"
+        return experiment_classes, output_dir
     elif selected:
         # Using the 'selected' parameter
-        if selected not in EXPERIMENTS:
+        if selected not in EXPERIMENT_GROUPS:
             console.rule(style="red bold")
             console.print(
-                f"[red]Error: Unknown group '{selected}'. Valid groups: {', '.join(EXPERIMENTS.keys())}[/red]"
+                f"[red]Error: Unknown group '{selected}'. Valid groups: {', '.join(EXPERIMENT_GROUPS.keys())}[/red]"
             )
             console.rule(style="red bold")
-            return
-        experiments_to_run = EXPERIMENTS[selected]
+            return None
         if output_dir is None:
             output_dir = dapagliflozin.RESULTS_PATH_SIMULATION / selected
+        return load_experiments(EXPERIMENT_GROUPS[selected]), output_dir
     else:
         console.print("\n[red bold]Error: No experiments specified![/red bold]")
         console.print("[yellow]Use selected='all' or selected='studies' or provide experiment_classes=[...][/yellow]\n")
-        return
+        return None
 
-    # Run the experiments
-    run_experiments(experiment_classes=experiments_to_run, output_dir=output_dir)
 
-    # Collect figures into one folder
+def _collect_figures(output_dir: Path) -> None:
+    """Collect figures into one folder."""
     figures_dir = output_dir / "_figures"
     figures_dir.mkdir(parents=True, exist_ok=True)
     for f in output_dir.glob("**/*.png"):
@@ -139,6 +57,82 @@ def run_simulation_experiments(
     console.print(f"Figures copied to: file://{figures_dir}", style="info")
 
 
+def run_simulation_experiments(
+    selected: str = None,
+    experiment_classes: List = None,
+    output_dir: Path = None,
+    n_jobs: int = 1,
+    use_cache: bool = True,
+    fast_forward: bool = False,
+    adaptive_grid: bool = False,
+    figures: bool = True,
+    incremental: bool = False,
+) -> None:
+    """Run dapagliflozin simulation experiments.
+
+    :param n_jobs: number of worker processes for the simulations.
+    :param use_cache: look up simulation results in the on-disk cache.
+    :param fast_forward: fast-forward multiple dosing to the periodic steady state.
+    :param adaptive_grid: reduce the results to the error-controlled output grid.
+    :param figures: create figures and report, otherwise only the results are
+        stored (see `render_simulation_experiments`).
+    :param incremental: only run experiments whose sources, data, model or
+        settings changed since the last run in the output directory.
+    """
+
+    Figure.fig_dpi = 600
+    Figure.legend_fontsize = 10
+
+    # Determine which experiments to run
+    selection = _select_experiments(selected, experiment_classes, output_dir)
+    if selection is None:
+        return
+    experiments_to_run, output_dir = selection
+
+    # Run the experiments
+    cache = SimulationCache(dapagliflozin.RESULTS_PATH_CACHE) if use_cache else None
+    run_experiments(
+        experiment_classes=experiments_to_run,
+        output_dir=output_dir,
+        n_jobs=n_jobs,
+        cache=cache,
+        fast_forward=FastForward() if fast_forward else None,
+        output_grid=OutputGrid() if adaptive_grid else None,
+        figures=figures,
+        incremental=incremental,
+    )
+    if figures:
+        _collect_figures(output_dir)
+
+
+def render_simulation_experiments(
+    selected: str = None,
+    experiment_classes: List = None,
+    output_dir: Path = None,
+    n_jobs: int = 1,
+) -> None:
+    """Create figures and report of dapagliflozin simulation experiments.
+
+    The results are loaded from the results stored by `run_simulation_experiments`
+    in the same output directory, no simulations are performed.
+
+    :param n_jobs: number of worker processes for saving the figures.
+    """
+
+    Figure.fig_dpi = 600
+    Figure.legend_fontsize = 10
+
+    selection = _select_experiments(selected, experiment_classes, output_dir)
+    if selection is None:
+        return
+    experiments_to_render, output_dir = selection
+
+    render_experiments(
+        experiment_classes=experiments_to_render, output_dir=output_dir, n_jobs=n_jobs
+    )
+    _collect_figures(output_dir)
+
+
 if __name__ == "__main__":
     """
     # Run experiments
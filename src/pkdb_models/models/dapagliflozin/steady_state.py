@@ -0,0 +1,204 @@
+"""Fast-forward of multiple dosing to the periodic steady state.
+
+Multiple dosing is simulated as a chain of identical timecourses, e.g., the
+once daily dosing of `Komoroski2009` integrates 12 identical 24 hr intervals
+to reach the steady state. The fast-forward simulates the intervals of a
+chain of identical timecourses until the remaining intervals can be
+extrapolated, the state is then set to the extrapolated state at the end of
+the chain, i.e., all requested output segments are returned but only the
+intervals until the steady state are integrated.
+
+The change of a state over the k-th interval, delta[k] = x[k] - x[k-1],
+converges to a constant: zero for the periodic states (concentrations) and
+the amount per interval for the cumulative amounts (urine, feces). Towards
+the steady state the change of delta decays geometrically,
+
+    d[k] = delta[k] - delta[k-1],    d[k+1] = q * d[k],
+
+with the ratio q of the slowest mode. The remaining intervals are
+extrapolated with this model, i.e., periodic states repeat the last interval
+and cumulative amounts increase linearly once the transient has decayed. The
+same extrapolation is applied to every time point of the results. The
+extrapolation is used when the estimated error over the n remaining intervals
+is within the tolerances,
+
+    n * |d[k]| <= atol + rtol * |x[k]|
+
+for all states.
+"""
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulator.simulation_serial import SimulatorSerial
+from sbmlutils import log
+
+from pkdb_models.models.dapagliflozin.cache import canonical_timecourse
+
+logger = log.get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class FastForward:
+    """Settings of the periodic steady state detection.
+
+    :param rtol: relative tolerance of the change over an interval
+    :param atol: absolute tolerance of the change over an interval
+    :param min_periods: minimal number of identical timecourses for fast-forward
+    """
+
+    rtol: float = 1e-3
+    atol: float = 1e-9
+    min_periods: int = 3
+
+
+def periodic_segments(
+    simulation: TimecourseSim, min_periods: int = 3
+) -> List[Tuple[int, int]]:
+    """Chains of identical timecourses of the simulation.
+
+    :return: list of [start, end) indices of the chains with at least
+        `min_periods` timecourses
+    """
+    segments = []
+    tcs = simulation.timecourses
+    k = 0
+    while k < len(tcs):
+        key = _periodic_key(tcs[k])
+        end = k + 1
+        if key is not None:
+            while end < len(tcs) and _periodic_key(tcs[end]) == key:
+                end += 1
+        if end - k >= min_periods:
+            segments.append((k, end))
+        k = end
+    return segments
+
+
+def _periodic_key(tc: Timecourse):
+    """Key of a timecourse which can be part of a periodic chain, otherwise None."""
+    if tc.discard or tc.model_changes or tc.model_manipulations:
+        return None
+    return canonical_timecourse(tc)
+
+
+def state_ids(r) -> List[str]:
+    """Ids of the state variables of the model which can be set.
+
+    Rate rules and floating species, species defined by assignment rules are
+    not independent states.
+    """
+    model = r.model
+    assigned = set(r.getAssignmentRuleIds())
+    n_states = model.getNumRateRules() + model.getNumFloatingSpecies()
+    return [
+        sid
+        for sid in (model.getStateVectorId(k) for k in range(n_states))
+        if sid not in assigned
+    ]
+
+
+def _extrapolate(values: Sequence[np.ndarray], n: int) -> List[np.ndarray]:
+    """Values of the next n intervals from the values of the last four intervals.
+
+    The change of the increments over an interval decays geometrically, the
+    ratio is estimated from the last increments and limited to [0, 1].
+    """
+    x0, x1, x2, x3 = values
+    delta = x3 - x2
+    d = delta - (x2 - x1)
+    d_prev = (x2 - x1) - (x1 - x0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        q = np.where(d_prev != 0, d / d_prev, 0.0)
+    q = np.clip(np.nan_to_num(q), 0.0, 1.0)
+
+    x = x3
+    results = []
+    for _ in range(n):
+        d = d * q
+        delta = delta + d
+        x = x + delta
+        results.append(x)
+    return results
+
+
+def timecourse_fast_forward(
+    simulator: SimulatorSerial, simulation: TimecourseSim, settings: FastForward
+) -> pd.DataFrame:
+    """Timecourse simulation with fast-forward of identical timecourses.
+
+    Simulations without chains of identical timecourses are simulated as by
+    the `SimulatorSerial`.
+    """
+    segments = periodic_segments(simulation, min_periods=settings.min_periods)
+    if not segments:
+        return SimulatorSerial._timecourse(simulator, simulation)
+
+    r = simulator.r
+    tcs = simulation.timecourses
+    chains = dict(segments)
+    frames: List[pd.DataFrame] = []
+    t_offset = simulation.time_offset
+
+    def simulate(tc: Timecourse, first: bool) -> pd.DataFrame:
+        """Simulate a single timecourse from the current state."""
+        reset = first and simulation.reset
+        sim = TimecourseSim([tc], reset=reset, time_offset=t_offset)
+        return SimulatorSerial._timecourse(simulator, sim)
+
+    k = 0
+    while k < len(tcs):
+        tc = tcs[k]
+        if k not in chains:
+            df = simulate(tc, first=(k == 0))
+            if not tc.discard:
+                frames.append(df)
+                t_offset += tc.end
+            k += 1
+            continue
+
+        end = chains[k]
+        n_periods = end - k
+        if k == 0 and simulation.reset:
+            r.resetToOrigin()
+        sids = state_ids(r)
+        x = [np.array([r[sid] for sid in sids])]
+        dfs: List[pd.DataFrame] = []
+        for i in range(n_periods):
+            dfs.append(simulate(tc, first=False))
+            frames.append(dfs[-1])
+            t_offset += tc.end
+            x.append(np.array([r[sid] for sid in sids]))
+
+            n_remaining = n_periods - i - 1
+            if len(dfs) < 4 or n_remaining == 0:
+                # the extrapolation requires the last four intervals
+                continue
+            d = (x[-1] - x[-2]) - (x[-2] - x[-3])
+            if np.all(
+                n_remaining * np.abs(d)
+                <= settings.atol + settings.rtol * np.abs(x[-1])
+            ):
+                # extrapolate results and state of the remaining intervals
+                columns = [c for c in dfs[-1].columns if c != "time"]
+                ys = _extrapolate(
+                    [df[columns].values for df in dfs[-4:]], n=n_remaining
+                )
+                for m, y in enumerate(ys, start=1):
+                    df = dfs[-1].copy()
+                    df[columns] = y
+                    df["time"] = dfs[-1]["time"].values + m * tc.end
+                    frames.append(df)
+                t_offset += n_remaining * tc.end
+                x_end = _extrapolate(x[-4:], n=n_remaining)[-1]
+                for sid, value in zip(sids, x_end):
+                    r[sid] = value
+                logger.debug(
+                    f"Periodic steady state after {i + 1}/{n_periods} intervals"
+                )
+                break
+        k = end
+
+    return pd.concat(frames, sort=False)
@@ -0,0 +1,59 @@
+"""Test dosing events of the model against chained timecourses."""
+import numpy as np
+import roadrunner
+
+from pkdb_models.models.dapagliflozin import MODEL_PATH
+
+SELECTIONS = ["time", "[Cve_dap]", "[Cve_d3g]", "KI__glc_urine", "KI__UGE"]
+N_DOSES = 5
+DOSE = 10.0  # [mg]
+TAU = 24 * 60  # [min]
+STEPS = 200
+
+
+def _roadrunner() -> roadrunner.RoadRunner:
+    r = roadrunner.RoadRunner(str(MODEL_PATH))
+    r.integrator.absolute_tolerance = 1e-10
+    r.integrator.relative_tolerance = 1e-10
+    r.timeCourseSelections = SELECTIONS
+    return r
+
+
+def _segmented() -> np.ndarray:
+    """One timecourse per dose, urinary glucose reset after every interval."""
+    r = _roadrunner()
+    results = []
+    for k in range(N_DOSES):
+        r["PODOSE_dap"] = r["PODOSE_dap"] + DOSE
+        if k > 0:
+            r["KI__glc_urine"] = 0.0
+        s = np.array(r.simulate(0, TAU, STEPS + 1))
+        s[:, 0] += k * TAU
+        # the last point of an interval is before the next dose
+        results.append(s[:-1])
+    return np.vstack(results)
+
+
+def _events() -> np.ndarray:
+    """Single timecourse with dosing and urine collection events."""
+    r = _roadrunner()
+    r["PODOSE_dap"] = DOSE
+    r["PODOSE_dap_dose"] = DOSE
+    r["PODOSE_dap_tau"] = TAU
+    r["PODOSE_dap_n"] = N_DOSES - 1
+    r["KI__COLLECT_tau"] = TAU
+    r["KI__COLLECT_n"] = N_DOSES - 1
+    s = np.array(r.simulate(0, N_DOSES * TAU, N_DOSES * STEPS + 1))
+    return s[:-1]
+
+
+def test_dosing_events():
+    segmented = _segmented()
+    events = _events()
+    np.testing.assert_allclose(events[:, 0], segmented[:, 0])
+    for k in range(1, len(SELECTIONS)):
+        scale = np.max(np.abs(segmented[:, k]))
+        assert scale > 0
+        np.testing.assert_allclose(
+            events[:, k], segmented[:, k], rtol=0, atol=1e-6 * scale
+        )
@@ -0,0 +1,24 @@
+"""Test reuse of the outputs of previous runs in incremental runs."""
+from pkdb_models.models.dapagliflozin.fingerprint import FingerprintManifest
+
+FINGERPRINT = {"sources": {"module": "abc"}, "model": "def"}
+
+
+def test_manifest_results_only(tmp_path):
+    manifest = FingerprintManifest(tmp_path / "Experiment")
+    store = {"task_po"}
+    manifest.save(fingerprint=FINGERPRINT, task_ids=["task_po"])
+
+    # results-only runs reuse the stored results
+    assert manifest.reusable(FINGERPRINT, store, figures=False)
+    assert not manifest.reusable(FINGERPRINT, set(), figures=False)
+    assert not manifest.reusable({**FINGERPRINT, "model": "xyz"}, store, figures=False)
+    assert manifest.report() is None
+    # runs with figures require the report fragment and the figures
+    assert not manifest.reusable(FINGERPRINT, store)
+
+    manifest.add_report({"figures": {"fig1": "Experiment_fig1"}})
+    assert manifest.report() is not None
+    assert not manifest.reusable(FINGERPRINT, store)
+    (tmp_path / "Experiment" / "Experiment_fig1.png").touch()
+    assert manifest.reusable(FINGERPRINT, store)
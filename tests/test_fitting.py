@@ -0,0 +1,97 @@
+"""Test optimization problems of the parameter fitting."""
+from functools import partial
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sbmlsim.fit.helpers")
+
+from pkdb_models.models.dapagliflozin.experiments.base_experiment import (
+    DapagliflozinSimulationExperiment,
+)
+from pkdb_models.models.dapagliflozin.fitting import bundle, fitting
+from pkdb_models.models.dapagliflozin.fitting.fitting import (
+    FitExperimentSubset,
+    create_optimization_problem,
+    fit_kwargs,
+    get_fit_experiments,
+    get_fit_parameters,
+)
+
+STUDY_IDS = ["Boulton2013"]
+
+
+def _optimization_problem(bundle: bool = False, **kwargs):
+    fit_subset = FitExperimentSubset.PK
+    op = create_optimization_problem(
+        fit_experiments=get_fit_experiments(
+            fit_subset=fit_subset, study_ids=STUDY_IDS, bundle=bundle
+        ),
+        opid="test",
+        parameters=get_fit_parameters(fit_subset=fit_subset),
+        **kwargs,
+    )
+    op.initialize(**fit_kwargs)
+    return op
+
+
+def test_jacobian_finite_differences():
+    op = _optimization_problem(jacobian=True)
+    xlog = np.log10(op.xmodel)
+    jacobian = op.jacobian(xlog)
+
+    h = 1e-4
+    expected = np.zeros_like(jacobian)
+    for k in range(len(xlog)):
+        xlog_up = np.array(xlog, dtype=float)
+        xlog_up[k] += h
+        xlog_down = np.array(xlog, dtype=float)
+        xlog_down[k] -= h
+        expected[:, k] = (op.residuals(xlog_up) - op.residuals(xlog_down)) / (2 * h)
+
+    assert jacobian.shape == (len(op.residuals(xlog)), len(xlog))
+    np.testing.assert_allclose(
+        jacobian, expected, rtol=0.02, atol=1e-3 * np.max(np.abs(expected))
+    )
+
+
+def test_pruned_residuals():
+    op_pruned = _optimization_problem(prune=True)
+    op = _optimization_problem(prune=False)
+    xlog = np.log10(op.xmodel)
+    np.testing.assert_allclose(op_pruned.residuals(xlog), op.residuals(xlog), rtol=1e-6)
+
+
+def test_fit_bundle(tmp_path, monkeypatch):
+    # bundle in a temporary directory, datasets are not registered globally
+    monkeypatch.setattr(bundle, "_bundles", {})
+    monkeypatch.setattr(DapagliflozinSimulationExperiment, "preloaded_datasets", {})
+    monkeypatch.setattr(
+        fitting, "load_fit_bundle", partial(bundle.load_fit_bundle, bundle_dir=tmp_path)
+    )
+
+    # problem from the data
+    monkeypatch.setattr(fitting, "fit_bundle_path", lambda: None)
+    op = _optimization_problem(bundle=False)
+    assert op.bundle_path is None
+
+    # build, pickle and load the bundle
+    path = bundle.build_fit_bundle(bundle_dir=tmp_path)
+    monkeypatch.setattr(fitting, "fit_bundle_path", lambda: path)
+    fit_bundle = bundle.load_fit_bundle(path, build=False)
+    assert fit_bundle.key == bundle.bundle_key()
+    assert set(STUDY_IDS) <= set(fit_bundle.fit_experiments["PK"])
+    for sid in STUDY_IDS:
+        assert sid in DapagliflozinSimulationExperiment.preloaded_datasets
+
+    # problem from the bundle
+    op_bundle = _optimization_problem(bundle=True)
+    assert op_bundle.bundle_path == path
+    assert op_bundle.mapping_keys == op.mapping_keys
+    assert op_bundle.experiment_keys == op.experiment_keys
+    for k in range(len(op.mapping_keys)):
+        np.testing.assert_array_equal(op_bundle.x_references[k], op.x_references[k])
+        np.testing.assert_array_equal(op_bundle.y_references[k], op.y_references[k])
+        np.testing.assert_array_equal(op_bundle.weights[k], op.weights[k])
+    xlog = np.log10(op.xmodel)
+    np.testing.assert_allclose(op_bundle.residuals(xlog), op.residuals(xlog))
@@ -0,0 +1,67 @@
+"""Test forward sensitivities of the states against central differences."""
+import numpy as np
+import roadrunner
+
+from pkdb_models.models.dapagliflozin import MODEL_PATH
+from pkdb_models.models.dapagliflozin.sensitivity.forward import (
+    forward_sensitivities,
+    initial_state_parameters,
+    species_compartments,
+)
+
+SELECTIONS = ["time", "[Cve_dap]", "KI__glc_urine"]
+PARAMETER_IDS = ["GU__DAPABS_k", "KI__DAPEX_k", "BW"]
+CHANGES = {"PODOSE_dap": 10.0}
+END = 24 * 60  # [min]
+STEPS = 200
+
+
+def _roadrunner() -> roadrunner.RoadRunner:
+    r = roadrunner.RoadRunner(str(MODEL_PATH))
+    r.integrator.absolute_tolerance = 1e-10
+    r.integrator.relative_tolerance = 1e-10
+    r.timeCourseSelections = SELECTIONS
+    return r
+
+
+def _apply(r: roadrunner.RoadRunner, changes: dict) -> None:
+    r.resetToOrigin()
+    for key, value in {**CHANGES, **changes}.items():
+        r[key] = value
+
+
+def test_forward_sensitivities():
+    r = _roadrunner()
+    fs = forward_sensitivities(
+        r,
+        PARAMETER_IDS,
+        start=0,
+        end=END,
+        steps=STEPS,
+        reset=lambda: _apply(r, {}),
+        compartments=species_compartments(r),
+        concentrations=["[Cve_dap]"],
+    )
+    assert fs.derivative("[Cve_d3g]") is None
+
+    _apply(r, {})
+    values = {pid: r[pid] for pid in PARAMETER_IDS}
+    for sid in SELECTIONS[1:]:
+        dy = fs.derivative(sid)
+        for kp, pid in enumerate(PARAMETER_IDS):
+            h = 1e-4 * values[pid]
+            _apply(r, {pid: values[pid] + h})
+            up = r.simulate(0, END, STEPS + 1)[sid]
+            _apply(r, {pid: values[pid] - h})
+            down = r.simulate(0, END, STEPS + 1)[sid]
+            fd = (up - down) / (2 * h)
+            np.testing.assert_allclose(
+                dy[kp], fd, rtol=0, atol=1e-4 * np.max(np.abs(fd)) + 1e-12
+            )
+
+
+def test_initial_state_parameters():
+    r = _roadrunner()
+    assert initial_state_parameters(
+        r, PARAMETER_IDS, apply=lambda changes: _apply(r, changes)
+    ) == []
@@ -0,0 +1,74 @@
+"""Test error-controlled output grid of timecourse results."""
+import numpy as np
+import pandas as pd
+
+from pkdb_models.models.dapagliflozin.output_grid import (
+    OutputGrid,
+    reduce_timecourses,
+    restore_grid,
+)
+from pkdb_models.models.dapagliflozin.pk import pk_kernel
+
+TIME = np.linspace(0, 30 * 60, 4001)  # [min]
+
+
+def _timecourses() -> list:
+    """Timecourses of a parameter scan (concentration and cumulative UGE)."""
+    dfs = []
+    for ke in [0.001, 0.002, 0.004]:
+        ka = 0.02
+        conc = np.exp(-ke * TIME) - np.exp(-ka * TIME)
+        uge = np.cumsum(conc) * (TIME[1] - TIME[0])
+        dfs.append(pd.DataFrame({"time": TIME, "[Cve_dap]": conc, "KI__UGE": uge}))
+    return dfs
+
+
+def _uge24(df: pd.DataFrame) -> float:
+    """UGE at the time point nearest to 24 hr (as in the parameter scans)."""
+    t = df["time"].values
+    return float(df["KI__UGE"].values[int(np.argmin(np.abs(t - 24 * 60)))])
+
+
+def test_uge24_output_grid():
+    dfs = _timecourses()
+    dfs_grid = reduce_timecourses(dfs, grid=OutputGrid())
+
+    assert len(dfs_grid[0]) < len(dfs[0])
+    for df, df_grid in zip(dfs, dfs_grid):
+        assert _uge24(df_grid) == _uge24(df)
+
+
+def test_output_grid_tolerance():
+    grid = OutputGrid(rtol=1e-4)
+    dfs = _timecourses()
+    dfs_grid = reduce_timecourses(dfs, grid=grid)
+    for df, df_grid in zip(dfs, dfs_grid):
+        for sid in ["[Cve_dap]", "KI__UGE"]:
+            y = df[sid].values
+            y_interp = np.interp(TIME, df_grid["time"].values, df_grid[sid].values)
+            assert np.max(np.abs(y - y_interp)) <= grid.atol + grid.rtol * np.max(
+                np.abs(y)
+            )
+
+
+def test_pk_output_grid():
+    """PK of single doses on the output grid is the PK on the full grid."""
+    time = np.linspace(0, 48 * 60, 4001)  # [min]
+    doses = np.array([1.0, 10.0, 100.0, 500.0])  # [mg]
+    # absorption, distribution and elimination phase
+    conc = doses[:, np.newaxis] * (
+        np.exp(-0.01 * time) + np.exp(-0.001 * time) - 2 * np.exp(-0.05 * time)
+    )
+    dfs = [pd.DataFrame({"time": time, "[Cve_dap]": c}) for c in conc]
+    dfs_grid = reduce_timecourses(dfs, grid=OutputGrid())
+    assert len(dfs_grid[0]) < len(time) / 10
+
+    time_grid, conc_grid = restore_grid(
+        dfs_grid[0]["time"].values,
+        np.array([df["[Cve_dap]"].values for df in dfs_grid]),
+    )
+    np.testing.assert_allclose(time_grid, time)
+    pk = pk_kernel(time, conc, dose=doses)
+    pk_grid = pk_kernel(time_grid, conc_grid, dose=doses)
+    for key in ["aucinf", "thalf", "cl"]:
+        np.testing.assert_allclose(pk_grid[key], pk[key], rtol=1e-3)
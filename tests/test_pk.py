@@ -0,0 +1,79 @@
+"""Test vectorized pharmacokinetics against TimecoursePK."""
+import warnings
+
+import numpy as np
+import pytest
+from pint import UnitRegistry
+from pkdb_analysis.pk.pharmacokinetics import TimecoursePK
+
+from pkdb_models.models.dapagliflozin.pk import (
+    PK_PARAMETERS,
+    REGRESSION_PARAMETERS,
+    pk_kernel,
+    pk_units,
+)
+
+ureg = UnitRegistry()
+Q_ = ureg.Quantity
+
+TIME = np.linspace(0, 48 * 60, 401)  # [min]
+
+
+def _bateman(ka: float, ke: float, scale: float = 1.0) -> np.ndarray:
+    return scale * (np.exp(-ke * TIME) - np.exp(-ka * TIME))
+
+
+def _curves() -> np.ndarray:
+    """Concentration curves with nan and below threshold values."""
+    curves = [
+        _bateman(ka=0.02, ke=0.002),
+        _bateman(ka=0.005, ke=0.001, scale=5.0),
+    ]
+    # missing values
+    c = _bateman(ka=0.01, ke=0.003)
+    c[[10, 100, 250]] = np.nan
+    curves.append(c)
+    # tail below cmax/min_treshold
+    c = _bateman(ka=0.03, ke=0.004)
+    c[-80:] = 1e-12
+    curves.append(c)
+    # maximum at the end, no regression
+    curves.append(np.linspace(0.0, 1.0, len(TIME)))
+    return np.array(curves)
+
+
+def _timecourse_pk(c: np.ndarray, dose) -> dict:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return TimecoursePK(
+            time=Q_(TIME, "min"),
+            concentration=Q_(c.copy(), "mM"),
+            dose=dose,
+            ureg=ureg,
+        ).pk.to_dict()
+
+
+@pytest.mark.parametrize("dose_unit", ["mmol", None])
+def test_pk_kernel_timecourse_pk(dose_unit):
+    curves = _curves()
+    dose = np.linspace(1.0, 5.0, len(curves)) if dose_unit else None
+    pk = pk_kernel(TIME, curves, dose=dose)
+    units = pk_units(ureg, "min", "mM", dose_unit)
+
+    for k, c in enumerate(curves):
+        ref = _timecourse_pk(c, Q_(dose[k], dose_unit) if dose_unit else None)
+        for key in PK_PARAMETERS + REGRESSION_PARAMETERS:
+            expected = ref[key]
+            expected = getattr(expected, "magnitude", expected)
+            value = pk[key][k] * units[key][0] if key in units else pk[key][k]
+            np.testing.assert_allclose(
+                value, expected, rtol=1e-8, equal_nan=True, err_msg=f"{k}: {key}"
+            )
+
+
+def test_pk_kernel_units():
+    c = _bateman(ka=0.02, ke=0.002)
+    ref = _timecourse_pk(c, Q_(1.0, "mmol"))
+    units = pk_units(ureg, "min", "mM", "mmol")
+    for key in PK_PARAMETERS:
+        assert units[key][1] == ureg.Unit(str(ref[f"{key}_unit"])), key
@@ -0,0 +1,42 @@
+"""Test truncation of timecourse simulations."""
+import numpy as np
+import pytest
+from sbmlsim.simulation import Timecourse, TimecourseSim
+
+from pkdb_models.models.dapagliflozin.fitting.pruning import truncate_simulation
+
+
+def _time(simulation: TimecourseSim) -> np.ndarray:
+    """Time points of the concatenated results."""
+    times = []
+    t_offset = simulation.time_offset
+    for tc in simulation.timecourses:
+        if tc.discard:
+            continue
+        times.append(t_offset + np.linspace(tc.start, tc.end, tc.steps + 1))
+        t_offset += tc.end
+    return np.concatenate(times)
+
+
+def _simulation() -> TimecourseSim:
+    return TimecourseSim(
+        [
+            Timecourse(start=0, end=60, steps=1, discard=True),
+            Timecourse(start=0, end=24 * 60, steps=600),
+            Timecourse(start=0, end=24 * 60, steps=600),
+        ],
+        time_offset=-60,
+    )
+
+
+@pytest.mark.parametrize("t_end", [3.0, 100.0, 1380.0, 1380.1, 1500.0, 2820.0])
+def test_truncate_simulation(t_end):
+    simulation = _simulation()
+    time = _time(simulation)
+    pruned = truncate_simulation(simulation, t_end=t_end)
+    time_pruned = _time(pruned)
+
+    # results contain t_end on the grid of the complete simulation
+    assert time_pruned[-1] >= t_end
+    np.testing.assert_allclose(time_pruned, time[: len(time_pruned)], rtol=1e-12)
+    assert np.sum(time_pruned >= t_end) <= 2
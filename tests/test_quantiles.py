@@ -0,0 +1,54 @@
+"""Test streaming quantile sketch of population timecourses."""
+import numpy as np
+import pytest
+
+from pkdb_models.models.dapagliflozin.population.quantiles import (
+    QUANTILES,
+    QuantileSketch,
+)
+
+
+def _values(n: int = 5000, n_time: int = 7, seed: int = 42) -> np.ndarray:
+    """Log-normal values spanning several orders of magnitude."""
+    rng = np.random.default_rng(seed)
+    scale = np.logspace(-6, 2, n_time)
+    return rng.lognormal(mean=0.0, sigma=1.5, size=(n, n_time)) * scale
+
+
+@pytest.mark.parametrize("alpha", [0.01, 0.05])
+def test_quantiles_within_alpha(alpha):
+    values = _values()
+    sketch = QuantileSketch(n_time=values.shape[1], alpha=alpha)
+    sketch.add(values)
+
+    # sketch returns the lower order statistic of a quantile
+    expected = np.quantile(values, QUANTILES, axis=0, method="lower")
+    quantiles = sketch.quantiles(QUANTILES)
+    assert np.all(np.abs(quantiles - expected) <= alpha * expected)
+
+    np.testing.assert_allclose(sketch.mean, values.mean(axis=0), rtol=1e-10)
+    np.testing.assert_allclose(sketch.std(), values.std(axis=0, ddof=1), rtol=1e-10)
+
+
+def test_merge_equals_single_sketch():
+    values = _values()
+    values[::13, 2] = np.nan
+    single = QuantileSketch(n_time=values.shape[1])
+    single.add(values)
+
+    merged = QuantileSketch(n_time=values.shape[1])
+    other = QuantileSketch(n_time=values.shape[1])
+    merged.add(values[:1234])
+    other.add(values[1234:])
+    merged.merge(other)
+
+    np.testing.assert_array_equal(merged.counts, single.counts)
+    np.testing.assert_array_equal(merged.n, single.n)
+    np.testing.assert_array_equal(merged.quantiles(), single.quantiles())
+    np.testing.assert_allclose(merged.mean, single.mean, rtol=1e-12)
+    np.testing.assert_allclose(merged.std(), single.std(), rtol=1e-10)
+
+
+def test_merge_different_buckets():
+    with pytest.raises(ValueError):
+        QuantileSketch(n_time=3, alpha=0.01).merge(QuantileSketch(n_time=3, alpha=0.02))
@@ -0,0 +1,102 @@
+"""Test forward sensitivities against finite differences."""
+import numpy as np
+import pytest
+
+pytest.importorskip("sbmlsim.sensitivity")
+
+from sbmlsim.sensitivity.analysis import LocalSensitivityAnalysis, SensitivityOutput
+from sbmlsim.sensitivity.parameters import parameters_for_sensitivity_analysis
+
+from pkdb_models.models.dapagliflozin import MODEL_PATH
+from pkdb_models.models.dapagliflozin.sensitivity.sensitivity_analysis import (
+    DapagliflozinSensitivitySimulation,
+    ForwardSensitivityAnalysis,
+)
+from pkdb_models.models.dapagliflozin.sensitivity.sobol import (
+    GlobalSobolSensitivityAnalysis,
+)
+
+PARAMETER_IDS = [
+    "GU__DAPABS_k",  # absorption
+    "KI__DAPEX_k",  # renal excretion
+    "KI__GFR_healthy",  # glucose filtration
+    "KI__RTG_max_inhibition",  # glucose reabsorption
+]
+
+
+OUTPUT_IDS = [
+    "dap_aucinf",
+    "dap_cmax",
+    "dap_thalf",
+    "d3g_aucinf",
+    "d3g_cmax",
+    "d3g_thalf",
+    "uge24",
+]
+
+
+def _simulation_kwargs(dose: float = 10.0, output_ids=OUTPUT_IDS) -> dict:
+    return dict(
+        model_path=MODEL_PATH,
+        selections=["time", "[Cve_dap]", "[Cve_d3g]", "KI__UGE"],
+        changes_simulation={"PODOSE_dap": dose},
+        outputs=[SensitivityOutput(uid=uid, name=uid) for uid in output_ids],
+    )
+
+
+def _sensitivity_simulation() -> DapagliflozinSensitivitySimulation:
+    return DapagliflozinSensitivitySimulation(**_simulation_kwargs())
+
+
+def test_forward_local_sensitivity():
+    parameters = [
+        p
+        for p in parameters_for_sensitivity_analysis(sbml_path=MODEL_PATH)
+        if p.uid in PARAMETER_IDS
+    ]
+    assert len(parameters) == len(PARAMETER_IDS)
+
+    forward = ForwardSensitivityAnalysis(
+        sensitivity_simulation=_sensitivity_simulation(),
+        parameters=parameters,
+    ).calculate_sensitivity()
+
+    local = LocalSensitivityAnalysis(
+        sensitivity_simulation=_sensitivity_simulation(),
+        parameters=parameters,
+        difference=0.01,
+    )
+    local.create_samples()
+    local.simulate_samples()
+    local.calculate_sensitivity()
+    expected = local.sensitivity_df.loc[forward.index, forward.columns]
+
+    # normalized sensitivities, finite differences at the integrator tolerances
+    np.testing.assert_allclose(forward.values, expected.values, rtol=0.05, atol=0.02)
+
+
+def test_sobol_checkpoint(tmp_path):
+    parameters = [
+        p
+        for p in parameters_for_sensitivity_analysis(sbml_path=MODEL_PATH)
+        if p.uid in PARAMETER_IDS
+    ]
+
+    def analysis(**kwargs) -> GlobalSobolSensitivityAnalysis:
+        simulation_kwargs = _simulation_kwargs(**kwargs)
+        return GlobalSobolSensitivityAnalysis(
+            simulation_class=DapagliflozinSensitivitySimulation,
+            simulation_kwargs=simulation_kwargs,
+            parameters=parameters,
+            outputs=simulation_kwargs["outputs"],
+            checkpoint_dir=tmp_path,
+            n_samples=8,
+        )
+
+    samples = analysis().create_samples()
+    np.testing.assert_array_equal(analysis().create_samples(), samples)
+    # checkpoints of other outputs or simulations are rejected
+    with pytest.raises(ValueError):
+        analysis(output_ids=OUTPUT_IDS[:3]).create_samples()
+    with pytest.raises(ValueError):
+        analysis(dose=20.0).create_samples()
@@ -0,0 +1,57 @@
+"""Test fast-forward of multiple dosing against the full chain of timecourses."""
+import numpy as np
+from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulator.simulation_serial import SimulatorSerial
+
+from pkdb_models.models.dapagliflozin import MODEL_PATH
+from pkdb_models.models.dapagliflozin.cache import SimulatorCached
+from pkdb_models.models.dapagliflozin.steady_state import FastForward
+
+SELECTIONS = ["time", "[Cve_dap]", "[Cve_d3g]", "Aurine_dap", "KI__UGE"]
+N_DOSES = 30
+
+
+def _simulation() -> TimecourseSim:
+    """Once daily dosing of 10 mg."""
+    return TimecourseSim(
+        [
+            Timecourse(
+                start=0, end=24 * 60, steps=240, changes={"PODOSE_dap": 10.0}
+            )
+            for _ in range(N_DOSES)
+        ]
+    )
+
+
+def _timecourse(fast_forward=None):
+    simulator = SimulatorCached(
+        model=MODEL_PATH,
+        fast_forward=fast_forward,
+        absolute_tolerance=1e-10,
+        relative_tolerance=1e-10,
+    )
+    simulator.set_timecourse_selections(SELECTIONS)
+    return simulator._timecourses([_simulation()])[0]
+
+
+def test_fast_forward(monkeypatch):
+    df = _timecourse()
+
+    n_intervals = []
+    timecourse = SimulatorSerial._timecourse
+
+    def _timecourse_counted(simulator, simulation):
+        n_intervals.append(len(simulation.timecourses))
+        return timecourse(simulator, simulation)
+
+    monkeypatch.setattr(SimulatorSerial, "_timecourse", _timecourse_counted)
+    df_ff = _timecourse(fast_forward=FastForward(rtol=1e-2))
+
+    # remaining intervals are extrapolated
+    assert sum(n_intervals) < N_DOSES
+    np.testing.assert_allclose(df_ff["time"].values, df["time"].values)
+    for sid in SELECTIONS[1:]:
+        y = df[sid].values
+        np.testing.assert_allclose(
+            df_ff[sid].values, y, rtol=0, atol=1e-3 * np.max(np.abs(y))
+        )
@@ -0,0 +1,62 @@
+"""Test the selections of the tasks from the dry run of the figures."""
+from typing import Dict
+
+import pytest
+from sbmlsim.plot import Figure
+from sbmlsim.simulation import Timecourse, TimecourseSim
+
+from pkdb_models.models.dapagliflozin import DAPAGLIFLOZIN_PATH
+from pkdb_models.models.dapagliflozin.experiments.base_experiment import (
+    DapagliflozinSimulationExperiment,
+)
+
+
+class FigureExperiment(DapagliflozinSimulationExperiment):
+    """Figures without access to the results."""
+
+    def simulations(self) -> Dict[str, TimecourseSim]:
+        return {"po": TimecourseSim([Timecourse(start=0, end=60, steps=10)])}
+
+    def figures(self) -> Dict[str, Figure]:
+        fig = Figure(experiment=self, sid="fig")
+        plots = fig.create_plots(xaxis=None, yaxis=None)
+        plots[0].add_data(task="task_po", xid="time", yid="[Cve_dap]", label=None)
+        return {fig.sid: fig}
+
+
+class ResultsExperiment(FigureExperiment):
+    """Figures which access the results."""
+
+    def figures(self) -> Dict[str, Figure]:
+        self.results["task_po"]
+        return {}
+
+
+class BrokenExperiment(FigureExperiment):
+    """Figures with an error."""
+
+    def figures(self) -> Dict[str, Figure]:
+        raise ValueError("error in figures")
+
+
+def _experiment(cls, tmp_path) -> DapagliflozinSimulationExperiment:
+    experiment = cls(base_path=DAPAGLIFLOZIN_PATH, data_path=tmp_path)
+    experiment.initialize()
+    return experiment
+
+
+def test_task_selections_figures(tmp_path):
+    experiment = _experiment(FigureExperiment, tmp_path)
+    assert experiment.task_selections() == {"task_po": {"time", "[Cve_dap]"}}
+
+
+def test_task_selections_results(tmp_path):
+    experiment = _experiment(ResultsExperiment, tmp_path)
+    selections = experiment.task_selections()
+    assert selections["task_po"] == {"time"} | set(experiment.selections_all)
+
+
+def test_task_selections_error(tmp_path):
+    experiment = _experiment(BrokenExperiment, tmp_path)
+    with pytest.raises(ValueError):
+        experiment.task_selections()